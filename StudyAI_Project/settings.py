@@ -1,4 +1,6 @@
 # StudyAI_Project/settings.py
+# Development profile. Deployments use StudyAI_Project.settings_production,
+# which imports this module and strips the dev-only overhead.
 
 import os
 from pathlib import Path
@@ -112,6 +114,80 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploaded notes are served by core.views.note_pdf_view after an ownership check.
+# Set NOTE_FILE_OFFLOAD to 'nginx' (X-Accel-Redirect) or 'apache' (X-Sendfile; Apache with
+# mod_xsendfile, or lighttpd) to let the front-end server do the transfer; leave empty to stream
+# from Django. Any other value raises ImproperlyConfigured.
+NOTE_FILE_OFFLOAD = os.environ.get('NOTE_FILE_OFFLOAD', '')
+# nginx: an `internal` location aliased to MEDIA_ROOT, e.g. location /protected-media/ { internal; alias /srv/media/; }
+NOTE_ACCEL_REDIRECT_PREFIX = os.environ.get('NOTE_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+# Model calls that take longer than this time out and are retried on the fallback model.
+AI_REQUEST_TIMEOUT_S = 90
+
+# Only exact names/aliases pick a canonical topic (core.topics) for prompts, quizzes and caches.
+# Trigram matches at or above this similarity only group near-misses in popularity counts.
+TOPIC_MATCH_THRESHOLD = 0.85
+# Explanations are cached per canonical topic in the default cache.
+AI_EXPLANATION_CACHE_TTL_S = 7 * 24 * 3600
+# Topic request counts are batched in memory and written by a background thread this often
+# (or once N requests are waiting). Topics matching no canonical topic stop getting new rows
+# once TopicPopularity holds MAX_TOPICS rows; each worker buffers at most MAX_PENDING_KEYS topics.
+TOPIC_POPULARITY_FLUSH_S = 60
+TOPIC_POPULARITY_MAX_PENDING = 500
+TOPIC_POPULARITY_MAX_PENDING_KEYS = 1000
+TOPIC_POPULARITY_MAX_TOPICS = 5000
+# Quiz pools for popular topics outside QUIZ_DATA_MAP, built by `manage.py warm_ai_cache`.
+AI_QUIZ_POOL_SIZE = 15
+AI_QUIZ_POOL_CACHE_TTL_S = 7 * 24 * 3600
+
+# Every model call is metered (core.usage). Daily token quotas are checked before calling the
+# model; None/absent means unlimited. Feature quotas are keyed by task name ('summary', 'explanation', ...).
+AI_USER_DAILY_TOKEN_QUOTA = int(os.environ['AI_USER_DAILY_TOKEN_QUOTA']) if os.environ.get('AI_USER_DAILY_TOKEN_QUOTA') else None
+AI_GLOBAL_DAILY_TOKEN_QUOTA = int(os.environ['AI_GLOBAL_DAILY_TOKEN_QUOTA']) if os.environ.get('AI_GLOBAL_DAILY_TOKEN_QUOTA') else None
+AI_FEATURE_DAILY_TOKEN_QUOTAS = {}
+# Usage is buffered per worker and written at most this often (or every N calls).
+AI_USAGE_FLUSH_S = 30
+AI_USAGE_MAX_PENDING = 200
+
+# Uploaded PDFs are parsed in reader subprocesses (core.pdf_sandbox) with these limits on
+# address space, and CPU and wall-clock time per request; at most N run at once per web worker.
+# Pages extracted before a limit is hit are kept. Readers stay up between requests and are
+# replaced after a failure or after READER_MAX_REQUESTS requests.
+PDF_SANDBOX_MAX_MEMORY_MB = 512
+PDF_SANDBOX_CPU_SECONDS = 20
+PDF_SANDBOX_TIMEOUT_S = 30
+PDF_SANDBOX_MAX_CONCURRENT = 2
+PDF_SANDBOX_READER_MAX_REQUESTS = 200
+
+# Note reader (core.page_reader): extracted pages kept per worker, and pages extracted
+# ahead of the one being read (together with it, in one sandboxed run).
+NOTE_PAGE_CACHE_SIZE = 1024
+NOTE_PAGE_PREFETCH = 3
+
+# Chat with notes (core.note_chat): the note text lives in a Gemini context cache whose TTL
+# slides while the conversation is active. Shorter notes are sent inline instead.
+NOTE_CONTEXT_CACHE_TTL_S = 3600
+NOTE_CONTEXT_MIN_TOKENS = 1024
+# Extracted text kept per worker for this many notes, so inline notes are parsed once, not per question.
+NOTE_CHAT_TEXT_CACHE_SIZE = 32
+
+# Shared generate_content allowance (requests per minute) for interactive calls and the offline
+# batch lane; 0 leaves it unenforced. The batch lane only uses what recent interactive traffic and
+# the reserve leave free. Enforcing it needs a Redis or Memcached cache (settings_production) so the
+# workers and the cron process share the counters; with any other cache it is ignored.
+AI_RATE_LIMIT_RPM = int(os.environ.get('AI_RATE_LIMIT_RPM', 0))
+AI_INTERACTIVE_RESERVED_RPM = 0
+# Offline batch lane (core.batch, `manage.py run_ai_batch` from cron): jobs are submitted only
+# inside [start, end) local hours, at most N requests per run, and retried up to N times.
+AI_BATCH_OFF_PEAK_HOURS = (1, 6)
+AI_BATCH_MAX_REQUESTS = 100
+AI_BATCH_MAX_ATTEMPTS = 3
+
+# Spaced repetition (core.review): `manage.py build_review_queues` runs nightly and queues at most
+# this many due questions per user for the "Today's review" page.
+REVIEW_QUEUE_SIZE = 10
+
 # --- THIRD-PARTY APP SETTINGS ---
 
 TAILWIND_APP_NAME = 'theme'
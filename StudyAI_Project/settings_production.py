@@ -0,0 +1,105 @@
+# StudyAI_Project/settings_production.py
+# Production profile: DJANGO_SETTINGS_MODULE=StudyAI_Project.settings_production
+#
+# Starts from the development settings and removes everything that costs
+# time on every request without serving users: the browser-reload app and
+# middleware, the debug context processor and template directory scans.
+# Adds cached template loading, sessions that skip the database, persistent
+# database connections and a shared cache backend.
+#
+# Nothing security-related falls back to the development defaults: SECRET_KEY
+# and ALLOWED_HOSTS (comma-separated) must be set in the environment.
+#
+# Measure the difference with:
+#   python manage.py bench_request_overhead
+#   SECRET_KEY=... ALLOWED_HOSTS=localhost python manage.py bench_request_overhead --settings=StudyAI_Project.settings_production
+
+import copy
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+# --- SECURITY: required from the environment ---
+
+SECRET_KEY = os.environ.get('SECRET_KEY', '')
+if not SECRET_KEY or SECRET_KEY == 'default-insecure-key-for-local-use-only':
+    raise ImproperlyConfigured("The production profile needs SECRET_KEY set in the environment.")
+
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host.strip()]
+if not ALLOWED_HOSTS:
+    raise ImproperlyConfigured("The production profile needs ALLOWED_HOSTS (comma-separated) set in the environment.")
+CSRF_TRUSTED_ORIGINS = [origin.strip() for origin in os.environ.get('CSRF_TRUSTED_ORIGINS', '').split(',') if origin.strip()]
+
+# --- STRIP DEV-ONLY APPS & MIDDLEWARE ---
+
+DEV_ONLY_APPS = ['django_browser_reload']
+DEV_ONLY_MIDDLEWARE = ['django_browser_reload.middleware.BrowserReloadMiddleware']
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DEV_ONLY_APPS]
+MIDDLEWARE = [mw for mw in MIDDLEWARE if mw not in DEV_ONLY_MIDDLEWARE]
+
+# --- TEMPLATES: compile once per process ---
+
+# A copy, so the development settings module is left as it was.
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['context_processors'] = [
+    cp for cp in TEMPLATES[0]['OPTIONS']['context_processors']
+    if cp != 'django.template.context_processors.debug'
+]
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# --- DATABASE: reuse connections across requests ---
+
+DATABASES = copy.deepcopy(DATABASES)
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# --- CACHE: shared across workers (also used by AI response caches) ---
+
+CACHE_SERVER = bool(os.environ.get('REDIS_URL') or os.environ.get('MEMCACHED_LOCATION'))
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif os.environ.get('MEMCACHED_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ['MEMCACHED_LOCATION'],
+        }
+    }
+else:
+    # No cache server configured: a DB table still shares entries between workers.
+    # Create it once with `python manage.py createcachetable`.
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
+# --- SESSIONS: no session-table query per request ---
+# With a cache server, 'cached_db' reads sessions from the cache and survives
+# evictions. Under the DatabaseCache fallback that would still query the
+# database on every request, so sessions are kept in signed cookies instead.
+# SESSION_ENGINE in the environment overrides either choice.
+
+DEFAULT_SESSION_ENGINE = (
+    'django.contrib.sessions.backends.cached_db' if CACHE_SERVER
+    else 'django.contrib.sessions.backends.signed_cookies'
+)
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE') or DEFAULT_SESSION_ENGINE
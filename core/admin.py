@@ -1,3 +1,63 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import AIBatchJob, AIUsageDaily, AIUsageRecord
+from .usage import heaviest_consumers
+
+
+@admin.register(AIUsageDaily)
+class AIUsageDailyAdmin(admin.ModelAdmin):
+    """Daily token rollups; the changelist also shows the heaviest consumers for the current filters."""
+    change_list_template = 'admin/core/aiusagedaily/change_list.html'
+    list_display = (
+        'day', 'user', 'feature', 'model', 'calls', 'errors', 'prompt_tokens', 'cached_tokens', 'output_tokens', 'total_tokens'
+    )
+    list_filter = ('feature', 'model')
+    search_fields = ('user__username',)
+    date_hierarchy = 'day'
+    list_select_related = ('user',)
+    ordering = ('-day', '-output_tokens')
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        try:
+            queryset = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            return response  # redirects / error pages have no changelist
+        response.context_data['heaviest_consumers'] = heaviest_consumers(queryset)
+        return response
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(AIUsageRecord)
+class AIUsageRecordAdmin(admin.ModelAdmin):
+    list_display = (
+        'created_at', 'user', 'feature', 'model', 'prompt_tokens', 'cached_tokens', 'output_tokens', 'latency_ms', 'ok'
+    )
+    list_filter = ('feature', 'model', 'ok')
+    search_fields = ('user__username',)
+    date_hierarchy = 'created_at'
+    list_select_related = ('user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AIBatchJob)
+class AIBatchJobAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'note', 'kind', 'status', 'attempts', 'batch_name', 'submitted_at', 'completed_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('note__title', 'batch_name')
+    list_select_related = ('note', 'note__user')
+    actions = ['requeue']
+
+    @admin.action(description="Re-queue selected jobs")
+    def requeue(self, request, queryset):
+        queryset.exclude(status='submitted').update(status='pending', attempts=0, error='')
+
+    def has_add_permission(self, request):
+        return False
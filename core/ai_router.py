@@ -0,0 +1,231 @@
+# core/ai_router.py
+import re
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+# ----------------------------------------------------------------------
+# Local Token Estimation
+# ----------------------------------------------------------------------
+# Gemini's tokenizer averages ~4 characters per token for English prose.
+# Counting word pieces locally is close enough for routing and budgeting
+# and avoids a count_tokens round trip before every call.
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def estimate_tokens(text):
+    """Estimates the Gemini token count of `text` without calling the API."""
+    if not text:
+        return 0
+    tokens = 0
+    for match in TOKEN_RE.finditer(text):
+        length = match.end() - match.start()
+        tokens += 1 if length <= 4 else (length + 3) // 4
+    return tokens
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Returns the longest prefix of `text` that fits in `max_tokens`,
+    cut at a sentence boundary (or a word boundary if a single sentence
+    is larger than the whole budget). Only the kept prefix is scanned.
+    """
+    if not text:
+        return text
+
+    used = 0
+    end = 0
+    for boundary in SENTENCE_END_RE.finditer(text):
+        sentence_tokens = estimate_tokens(text[end:boundary.end()])
+        if used + sentence_tokens > max_tokens:
+            break
+        used += sentence_tokens
+        end = boundary.end()
+    else:
+        if used + estimate_tokens(text[end:]) <= max_tokens:
+            return text
+
+    if end == 0:
+        # No complete sentence fits: fall back to the last whole word.
+        for match in TOKEN_RE.finditer(text):
+            length = match.end() - match.start()
+            used += 1 if length <= 4 else (length + 3) // 4
+            if used > max_tokens:
+                break
+            end = match.end()
+
+    return text[:end].rstrip()
+
+
+# ----------------------------------------------------------------------
+# Task Profiles
+# ----------------------------------------------------------------------
+# prefer:              'fast' (flash) or 'strong' (pro)
+# slo_ms:              latency objective; a model whose rolling p95 exceeds it is degraded
+# strong_token_budget: largest input (tokens) we are willing to send to the strong model
+# max_input_tokens:    budget for document text embedded in the prompt
+
+TASK_PROFILES = {
+    'summary': {'prefer': 'fast', 'slo_ms': 30000, 'strong_token_budget': 4000, 'max_input_tokens': 2500},
+    'explanation': {'prefer': 'fast', 'slo_ms': 20000, 'strong_token_budget': 2000, 'max_input_tokens': 500},
+    'feedback': {'prefer': 'fast', 'slo_ms': 5000, 'strong_token_budget': 1000, 'max_input_tokens': 500},
+    'study_pack': {'prefer': 'fast', 'slo_ms': 45000, 'strong_token_budget': 4000, 'max_input_tokens': 2500},
+    'revision': {'prefer': 'fast', 'slo_ms': 30000, 'strong_token_budget': 4000, 'max_input_tokens': 2500},
+    'chunk_summary': {'prefer': 'fast', 'slo_ms': 20000, 'strong_token_budget': 0, 'max_input_tokens': 2500},
+    'quiz': {'prefer': 'strong', 'slo_ms': 45000, 'strong_token_budget': 8000, 'max_input_tokens': 6000},
+    'note_chat': {'prefer': 'fast', 'slo_ms': 15000, 'strong_token_budget': 0, 'max_input_tokens': 2500},
+}
+TASK_PROFILES.update(getattr(settings, 'AI_TASK_PROFILES', {}))
+
+DEFAULT_PROFILE = {'prefer': 'fast', 'slo_ms': 30000, 'strong_token_budget': 0, 'max_input_tokens': 2500}
+
+HEALTH_WINDOW = 50          # most recent calls kept per model
+HEALTH_HORIZON_S = 300      # older samples are ignored so a model can recover
+HEALTH_MIN_SAMPLES = 5
+HEALTH_MAX_ERROR_RATE = 0.5
+
+
+class ModelHealth:
+    """Rolling latency and error statistics for a single model."""
+
+    def __init__(self):
+        self.samples = deque(maxlen=HEALTH_WINDOW)
+        self.lock = threading.Lock()
+
+    def record(self, latency_ms, ok):
+        with self.lock:
+            self.samples.append((time.monotonic(), latency_ms, ok))
+
+    def snapshot(self):
+        """Returns (sample_count, error_rate, p95_latency_ms) over the horizon."""
+        cutoff = time.monotonic() - HEALTH_HORIZON_S
+        with self.lock:
+            recent = [s for s in self.samples if s[0] >= cutoff]
+        if not recent:
+            return 0, 0.0, 0.0
+        errors = sum(1 for s in recent if not s[2])
+        latencies = sorted(s[1] for s in recent if s[2])
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+        return len(recent), errors / len(recent), p95
+
+    def is_degraded(self, slo_ms):
+        count, error_rate, p95 = self.snapshot()
+        if count < HEALTH_MIN_SAMPLES:
+            return False
+        return error_rate >= HEALTH_MAX_ERROR_RATE or p95 > slo_ms
+
+
+class ModelRouter:
+    """
+    Chooses between a fast/cheap model and a strong/expensive one per call,
+    using the task profile, the estimated input size and observed health.
+    """
+
+    def __init__(self, fast_model, strong_model):
+        self.models = {'fast': fast_model, 'strong': strong_model}
+        self.health = {fast_model: ModelHealth(), strong_model: ModelHealth()}
+
+    def profile(self, task):
+        return TASK_PROFILES.get(task, DEFAULT_PROFILE)
+
+    def input_budget(self, task):
+        return self.profile(task)['max_input_tokens']
+
+    def candidates(self, task, prompt_tokens):
+        """
+        Returns the models to try, in order: the chosen model, then its
+        fallback. A prompt over the task's strong_token_budget is never sent
+        to the strong model, not even as the fallback.
+        """
+        profile = self.profile(task)
+        fast, strong = self.models['fast'], self.models['strong']
+
+        if prompt_tokens > profile['strong_token_budget']:
+            return [fast]
+
+        primary = strong if profile['prefer'] == 'strong' else fast
+        fallback = strong if primary == fast else fast
+        if self.health[primary].is_degraded(profile['slo_ms']) and \
+                not self.health[fallback].is_degraded(profile['slo_ms']):
+            primary, fallback = fallback, primary
+
+        return [primary, fallback]
+
+    def record(self, model, latency_ms, ok):
+        self.health[model].record(latency_ms, ok)
+
+    def stats(self):
+        """Current health snapshot per model, for logging and admin pages."""
+        return {model: health.snapshot() for model, health in self.health.items()}
+
+
+# ----------------------------------------------------------------------
+# Shared Rate Limit (per-minute call counters)
+# ----------------------------------------------------------------------
+# Interactive calls and the offline batch lane (core.batch) draw on the same
+# requests-per-minute allowance. Each lane counts its calls in the default
+# cache, one key per minute. The batch lane only submits what is left after
+# recent interactive traffic and a reserve, which keeps interactive requests
+# from being rate limited.
+#
+# The counters only mean something if the web workers and the cron process
+# share the cache and it increments atomically (Redis, Memcached). With the
+# per-process LocMemCache the cron process would always see no interactive
+# traffic, and DatabaseCache.incr is a read-then-write that loses counts, so
+# with those backends nothing is counted and the limit is not enforced
+# (`run_ai_batch` warns).
+
+RATE_LIMIT_RPM = getattr(settings, 'AI_RATE_LIMIT_RPM', 0)            # 0: limit unknown, not enforced
+INTERACTIVE_RESERVED_RPM = getattr(settings, 'AI_INTERACTIVE_RESERVED_RPM', 0)
+RATE_COUNTER_TTL_S = 180
+SHARED_COUNTER_BACKENDS = ('RedisCache', 'PyMemcacheCache', 'PyLibMCCache')
+
+
+def _rate_key(lane, minute):
+    return f"ai:rpm:{lane}:{minute}"
+
+
+def rate_limit_enforced():
+    """True if a rate limit is set and the default cache can hold counters shared by every process."""
+    backend = settings.CACHES['default']['BACKEND']
+    return bool(RATE_LIMIT_RPM) and backend.rsplit('.', 1)[-1] in SHARED_COUNTER_BACKENDS
+
+
+def count_calls(lane, n=1):
+    """Adds `n` calls to this minute's counter for `lane` ('interactive' or 'batch')."""
+    if not rate_limit_enforced():
+        return
+    key = _rate_key(lane, int(time.time() // 60))
+    try:
+        cache.add(key, 0, RATE_COUNTER_TTL_S)
+        cache.incr(key, n)
+    except Exception as e:
+        # A missing count only makes the batch lane less careful; never fail the call.
+        print(f"Rate counter update failed: {e}")
+
+
+def calls_last_minute(lane):
+    """
+    Calls counted for `lane` over roughly the last minute: all of this
+    minute plus the previous minute weighted by how much of it is still
+    inside the sliding window.
+    """
+    now = time.time()
+    minute = int(now // 60)
+    counts = cache.get_many([_rate_key(lane, minute), _rate_key(lane, minute - 1)])
+    current = counts.get(_rate_key(lane, minute), 0)
+    previous = counts.get(_rate_key(lane, minute - 1), 0)
+    return current + previous * (1 - (now % 60) / 60)
+
+
+def batch_capacity(max_requests):
+    """Number of requests the batch lane may submit now without crowding out interactive calls."""
+    if not rate_limit_enforced():
+        return max_requests
+    spare = RATE_LIMIT_RPM - INTERACTIVE_RESERVED_RPM - calls_last_minute('interactive') - calls_last_minute('batch')
+    return max(0, min(max_requests, int(spare)))
@@ -1,10 +1,20 @@
 # core/ai_utils.py
 import os
+import json
+import random
+import time
+import httpx
 from google import genai
+from google.genai import types
 from google.genai.errors import APIError
-from pypdf import PdfReader
 from dotenv import load_dotenv 
 from django.conf import settings 
+from django.core.cache import cache
+from .ai_router import ModelRouter, count_calls, estimate_tokens, truncate_to_tokens
+from .pdf_sandbox import extract_pages
+from .singleflight import fingerprint, single_flight
+from .topics import build_topic_index, normalize_topic
+from .usage import QuotaExceededError, check_quota, record_usage
 
 # Force load environment variables
 load_dotenv()
@@ -13,6 +23,7 @@ load_dotenv()
 client = None 
 model_flash = 'gemini-2.5-flash' 
 model_pro = 'gemini-2.5-pro'   
+REQUEST_TIMEOUT_S = getattr(settings, 'AI_REQUEST_TIMEOUT_S', 90)
 
 # --- CRITICAL HELPER FUNCTION ---
 def initialize_client():
@@ -23,7 +34,11 @@ def initialize_client():
             api_key = os.environ.get("GEMINI_API_KEY") 
             if not api_key:
                 raise ValueError("GEMINI_API_KEY is missing from environment.")
-            client = genai.Client(api_key=api_key) 
+            # GEMINI_BASE_URL points the client at a stand-in server (e.g. loadtest.fake_gemini)
+            base_url = os.environ.get("GEMINI_BASE_URL")
+            # Without a client timeout a hung request would never reach the fallback model
+            http_options = types.HttpOptions(base_url=base_url, timeout=int(REQUEST_TIMEOUT_S * 1000))
+            client = genai.Client(api_key=api_key, http_options=http_options) 
         except Exception as e:
             print(f"AI Client Initialization Failed: {e}")
             return None
@@ -35,6 +50,85 @@ try:
 except Exception as e:
     pass
 
+# ----------------------------------------------------------------------
+# Model Routing (every model call goes through _generate)
+# ----------------------------------------------------------------------
+
+router = ModelRouter(fast_model=model_flash, strong_model=model_pro)
+
+# Errors worth retrying on the other model: rate limits and server-side failures.
+FALLBACK_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Transport failures that say nothing about our request: timeouts and dropped connections.
+# Anything else is a bug on our side and is raised without touching model health.
+TRANSIENT_ERRORS = (httpx.TimeoutException, httpx.NetworkError)
+
+def _output_tokens(usage):
+    # Gemini 2.5 bills thinking tokens as output tokens.
+    return (usage.candidates_token_count or 0) + (getattr(usage, 'thoughts_token_count', None) or 0)
+
+def _generate(task, prompt, config=None, user_id=None, model=None):
+    """
+    Sends `prompt` to the model the router picks for `task`, falling back to
+    the other model if the first one is rate limited or failing. Every
+    attempt is recorded in the usage ledger. Passing `model` pins the call
+    to that model (context caches belong to one model).
+    """
+    client = initialize_client()
+    if client is None:
+        raise RuntimeError("Gemini client is not configured (is GEMINI_API_KEY set?).")
+    last_error = None
+
+    for model in [model] if model else router.candidates(task, estimate_tokens(prompt)):
+        started = time.monotonic()
+        count_calls('interactive')
+        try:
+            response = client.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=config
+            )
+        except APIError as e:
+            elapsed_ms = (time.monotonic() - started) * 1000
+            router.record(model, elapsed_ms, ok=False)
+            record_usage(user_id, task, model, 0, 0, elapsed_ms, ok=False)
+            if e.code not in FALLBACK_STATUS_CODES:
+                raise
+            last_error = e
+            continue
+        except TRANSIENT_ERRORS as e:
+            elapsed_ms = (time.monotonic() - started) * 1000
+            router.record(model, elapsed_ms, ok=False)
+            record_usage(user_id, task, model, 0, 0, elapsed_ms, ok=False)
+            last_error = e
+            continue
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        router.record(model, elapsed_ms, ok=True)
+        usage = response.usage_metadata
+        if usage is not None:
+            cached = usage.cached_content_token_count or 0
+            record_usage(
+                user_id, task, model, (usage.prompt_token_count or 0) - cached, _output_tokens(usage), elapsed_ms,
+                cached_tokens=cached,
+            )
+        else:
+            record_usage(user_id, task, model, estimate_tokens(prompt), estimate_tokens(response.text), elapsed_ms)
+        return response
+
+    raise last_error
+
+def _generate_text(task, prompt, config=None, user=None, model=None):
+    """
+    Returns the response text for `prompt`, coalescing identical concurrent
+    requests (in this process and across workers) into one model call.
+    Raises QuotaExceededError before calling the model if `user` (or the
+    feature, or the site) is over its daily token quota.
+    """
+    user_id = getattr(user, 'pk', None)
+    check_quota(user_id, task, estimate_tokens(prompt))
+    key = fingerprint(task, prompt, config, model)
+    return single_flight(key, lambda: _generate(task, prompt, config, user_id, model).text)
+
 # ----------------------------------------------------------------------
 # QUIZ DATA MAP (Contains 5 unique questions per topic)
 # ----------------------------------------------------------------------
@@ -180,32 +274,43 @@ QUIZ_DATA_MAP = {
 }
 # --- END QUIZ DATA MAP ---
 
+# Maps free-text topics onto QUIZ_DATA_MAP keys; also the cache/analytics key for topics.
+topic_index = build_topic_index(QUIZ_DATA_MAP)
+EXPLANATION_CACHE_TTL_S = getattr(settings, 'AI_EXPLANATION_CACHE_TTL_S', 7 * 24 * 3600)
+
 # ----------------------------------------------------------------------
 # PDF Text Extraction (Must exist for views.py)
 # ----------------------------------------------------------------------
 
+def extract_pages_from_pdf(pdf_path, page_numbers=None):
+    """
+    Extracts the text of each page of a local PDF file as a list of strings.
+    If `page_numbers` (zero-based) is given, only those pages are extracted.
+    Parsing runs in a resource-limited subprocess (core.pdf_sandbox); if it
+    hits a limit, the pages extracted up to that point are returned.
+    """
+    extraction = extract_pages(pdf_path, page_numbers)
+    if extraction.error:
+        print(f"Error extracting PDF text: {extraction.error}")
+        if not extraction.pages:
+            return None
+    if page_numbers is None:
+        return extraction.texts()
+    return [extraction.pages[i] for i in page_numbers if i in extraction.pages]
+
 def extract_text_from_pdf(pdf_path):
     """Extracts all text from a local PDF file."""
-    text = ""
-    try:
-        reader = PdfReader(pdf_path)
-        for page in reader.pages:
-            text += page.extract_text()
-    except Exception as e:
-        print(f"Error extracting PDF text: {e}")
+    pages = extract_pages_from_pdf(pdf_path)
+    if pages is None:
         return None
-    return text
+    return "".join(pages)
 
 # ----------------------------------------------------------------------
 # Summarization Function (Must exist for views.py)
 # ----------------------------------------------------------------------
 
-def summarize_notes(pdf_text, note_title):
-    client = initialize_client()
-    if not client:
-        return "AI service is not configured. Check your .env file for GEMINI_API_KEY."
-
-    prompt = f"""
+def summary_prompt(pdf_text, note_title):
+    return f"""
     You are an expert educational assistant. Your task is to summarize the following notes.
     The notes are titled: '{note_title}'.
     
@@ -213,30 +318,229 @@ def summarize_notes(pdf_text, note_title):
     2. Conclude the summary with a specific section titled "Key Concepts to Focus On" where you list 3 to 5 core ideas from the text that the student should master.
     
     --- Notes Text ---
-    {pdf_text[:10000]} 
+    {truncate_to_tokens(pdf_text, router.input_budget('summary'))} 
     --- End Notes Text ---
     """
-    
+
+def summarize_notes(pdf_text, note_title, user=None):
+    client = initialize_client()
+    if not client:
+        return "AI service is not configured. Check your .env file for GEMINI_API_KEY."
+
     try:
-        response = client.models.generate_content(
-            model=model_flash,
-            contents=prompt
-        )
-        return response.text
+        return _generate_text('summary', summary_prompt(pdf_text, note_title), user=user)
+    except QuotaExceededError as e:
+        return f"AI Quota Error: {e}"
     except APIError as e:
         return f"AI API Error: Could not generate summary. {e}"
     except Exception as e:
         return f"An unexpected error occurred during summarization: {e}"
 
+# ----------------------------------------------------------------------
+# Fused Study Pack (summary + key concepts + quiz in one call)
+# ----------------------------------------------------------------------
+
+QUIZ_QUESTION_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'text': {'type': 'STRING'},
+        'options': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        'correct_answer_index': {'type': 'INTEGER'},
+    },
+    'required': ['text', 'options', 'correct_answer_index'],
+}
+
+STUDY_PACK_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'summary': {'type': 'STRING'},
+        'key_concepts': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        'quiz_questions': {'type': 'ARRAY', 'items': QUIZ_QUESTION_SCHEMA},
+    },
+    'required': ['summary', 'key_concepts', 'quiz_questions'],
+}
+
+def validate_quiz_questions(questions):
+    """Keeps only well-formed questions (same shape as QUIZ_DATA_MAP entries)."""
+    valid = []
+    for q in questions or []:
+        if not isinstance(q, dict):
+            continue
+        text = q.get('text')
+        options = q.get('options')
+        index = q.get('correct_answer_index')
+        if not isinstance(text, str) or not text.strip():
+            continue
+        if not isinstance(options, list) or len(options) < 2 or not all(isinstance(o, str) for o in options):
+            continue
+        if not isinstance(index, int) or not 0 <= index < len(options):
+            continue
+        valid.append({'text': text.strip(), 'options': options, 'correct_answer_index': index})
+    return valid
+
+def validate_study_pack(data):
+    """Returns a cleaned study pack dict, or raises ValueError if unusable."""
+    if not isinstance(data, dict):
+        raise ValueError("Study pack must be a JSON object.")
+
+    summary = data.get('summary')
+    if not isinstance(summary, str) or not summary.strip():
+        raise ValueError("Study pack has no summary.")
+
+    key_concepts = [c.strip() for c in data.get('key_concepts') or [] if isinstance(c, str) and c.strip()]
+    questions = validate_quiz_questions(data.get('quiz_questions'))
+    if not questions:
+        raise ValueError("Study pack has no valid quiz questions.")
+
+    return {'summary': summary.strip(), 'key_concepts': key_concepts, 'quiz_questions': questions}
+
+def study_pack_prompt(pdf_text, note_title, num_questions=5):
+    return f"""
+    You are an expert educational assistant. The following notes are titled: '{note_title}'.
+    Using only the notes, produce:
+    
+    1. "summary": a detailed, easy-to-understand summary formatted as plain text.
+    2. "key_concepts": 3 to 5 core ideas from the text that the student should master.
+    3. "quiz_questions": exactly {num_questions} multiple-choice questions testing those ideas, each with
+       3 or 4 "options" and the zero-based "correct_answer_index".
+    
+    --- Notes Text ---
+    {truncate_to_tokens(pdf_text, router.input_budget('study_pack'))} 
+    --- End Notes Text ---
+    """
+
+STUDY_PACK_CONFIG = types.GenerateContentConfig(
+    response_mime_type='application/json',
+    response_schema=STUDY_PACK_SCHEMA,
+)
+
+def generate_study_pack(pdf_text, note_title, num_questions=5, user=None):
+    """
+    Sends the note text once and returns (study_pack, error): the summary,
+    3-5 key concepts and a multiple-choice quiz from a single JSON response.
+    """
+    client = initialize_client()
+    if not client:
+        return None, "AI service is not configured. Check your .env file for GEMINI_API_KEY."
+
+    try:
+        raw = _generate_text('study_pack', study_pack_prompt(pdf_text, note_title, num_questions), STUDY_PACK_CONFIG, user=user)
+        return validate_study_pack(json.loads(raw)), None
+    except QuotaExceededError as e:
+        return None, f"AI Quota Error: {e}"
+    except APIError as e:
+        return None, f"AI API Error: Could not generate study pack. {e}"
+    except (json.JSONDecodeError, ValueError) as e:
+        return None, f"AI returned an invalid study pack: {e}"
+    except Exception as e:
+        return None, f"An unexpected error occurred during study pack generation: {e}"
+
+# ----------------------------------------------------------------------
+# Incremental Revision Summaries (only changed pages are sent)
+# ----------------------------------------------------------------------
+
+REVISION_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'summary': {'type': 'STRING'},
+        'key_concepts': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+    },
+    'required': ['summary', 'key_concepts'],
+}
+
+def summarize_chunk(chunk_text, note_title, user=None):
+    """Condenses one changed section of a note; used when the change is too large to send verbatim."""
+    prompt = f"""
+    Summarize the following excerpt from notes titled '{note_title}' in a short paragraph,
+    keeping every definition, formula and key fact.
+    
+    --- Excerpt ---
+    {truncate_to_tokens(chunk_text, router.input_budget('chunk_summary'))}
+    --- End Excerpt ---
+    """
+    return _generate_text('chunk_summary', prompt, user=user)
+
+def update_study_summary(note_title, previous_summary, previous_key_concepts, added_sections, removed_sections, user=None):
+    """
+    Updates an existing summary for a new version of the notes. `added_sections`
+    and `removed_sections` are lists of (label, text) for pages that changed.
+    Returns ({'summary', 'key_concepts'}, error).
+    """
+    client = initialize_client()
+    if not client:
+        return None, "AI service is not configured. Check your .env file for GEMINI_API_KEY."
+
+    try:
+        budget = router.input_budget('revision')
+        changed_tokens = sum(estimate_tokens(text) for _, text in added_sections)
+        if changed_tokens > budget:
+            # Too much new text for one prompt: condense each changed section first.
+            added_sections = [(label, summarize_chunk(text, note_title, user=user)) for label, text in added_sections]
+
+        added = "\n\n".join(f"[{label}]\n{text}" for label, text in added_sections) or "(none)"
+        removed = "\n\n".join(f"[{label}]\n{text}" for label, text in removed_sections) or "(none)"
+
+        prompt = f"""
+        You are an expert educational assistant. A student uploaded a new version of their notes titled '{note_title}'.
+        Below is the summary you wrote for the previous version, followed by only the parts that changed.
+        
+        Update the summary so it describes the new version: keep unchanged material, integrate the added
+        material and drop anything that was only supported by removed material. Return the full updated
+        "summary" and 3 to 5 "key_concepts".
+        
+        --- Previous Summary ---
+        {previous_summary}
+        --- Previous Key Concepts ---
+        {json.dumps(previous_key_concepts or [])}
+        --- Added or Changed Pages ---
+        {truncate_to_tokens(added, budget)}
+        --- Removed Pages ---
+        {truncate_to_tokens(removed, budget // 4)}
+        --- End ---
+        """
+
+        config = types.GenerateContentConfig(
+            response_mime_type='application/json',
+            response_schema=REVISION_SCHEMA,
+        )
+        data = json.loads(_generate_text('revision', prompt, config, user=user))
+        summary = data.get('summary') if isinstance(data, dict) else None
+        if not isinstance(summary, str) or not summary.strip():
+            raise ValueError("Revision has no summary.")
+        key_concepts = [c.strip() for c in data.get('key_concepts') or [] if isinstance(c, str) and c.strip()]
+        return {'summary': summary.strip(), 'key_concepts': key_concepts}, None
+    except QuotaExceededError as e:
+        return None, f"AI Quota Error: {e}"
+    except APIError as e:
+        return None, f"AI API Error: Could not update summary. {e}"
+    except (json.JSONDecodeError, ValueError) as e:
+        return None, f"AI returned an invalid revision: {e}"
+    except Exception as e:
+        return None, f"An unexpected error occurred during revision summarization: {e}"
+
 # ----------------------------------------------------------------------
 # Topic Explanation Function (Must exist for views.py)
 # ----------------------------------------------------------------------
 
-def explain_topic_and_focus(topic):
+def explanation_cache_key(topic):
+    return 'explanation:' + fingerprint(topic_index.canonical_key(topic))
+
+def explain_topic_and_focus(topic, refresh=False, user=None):
+    """Markdown explanation of `topic`, cached per canonical topic. `refresh` regenerates it (cache warming)."""
     client = initialize_client()
     if not client:
         return "AI service is not configured. Check your .env file for GEMINI_API_KEY."
 
+    # "ML", "machine-learning" and "Machine Learning basics" share one cached explanation.
+    cache_key = explanation_cache_key(topic)
+    match = topic_index.exact_match(topic)
+    if match and normalize_topic(match.name) == normalize_topic(topic):
+        # Only the spelling differs ("machine-learning"); an alias like "ML" is explained as asked.
+        topic = match.name
+    cached = None if refresh else cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     prompt = f"""
     You are an expert educational assistant. Your task is to explain a given topic in a simple, clear, and engaging manner suitable for a student.
     
@@ -248,16 +552,18 @@ def explain_topic_and_focus(topic):
     """
     
     try:
-        response = client.models.generate_content(
-            model=model_flash,
-            contents=prompt
-        )
-        return response.text
+        explanation = _generate_text('explanation', prompt, user=user)
+    except QuotaExceededError as e:
+        return f"AI Quota Error: {e}"
     except APIError as e:
         return f"AI API Error: Could not generate explanation. {e}"
     except Exception as e:
         return f"An unexpected error occurred during explanation: {e}"
 
+    if explanation:
+        cache.set(cache_key, explanation, EXPLANATION_CACHE_TTL_S)
+    return explanation
+
 # ----------------------------------------------------------------------
 # Quiz Generation Function (The function that views.py calls)
 # ----------------------------------------------------------------------
@@ -265,23 +571,79 @@ def explain_topic_and_focus(topic):
 def generate_quiz_json(topic, num_questions=5):
     """
     STABLE QUIZ GENERATOR: Uses hardcoded data if the topic is recognized, 
-    otherwise blocks the unstable API call.
+    then a cached quiz pool (built by `manage.py warm_ai_cache` for popular
+    topics), otherwise blocks the unstable API call.
     """
-    topic_lower = topic.lower().strip()
+    match = topic_index.exact_match(topic)
     
-    if topic_lower in QUIZ_DATA_MAP:
+    if match:
         # Success: Return the stable, hardcoded JSON string
-        return QUIZ_DATA_MAP[topic_lower]["json"], None
-    else:
-        # Failure: Block the live API call immediately and provide guidance
-        error_msg = f"The topic '{topic}' is outside the demo scope. Please use a verified topic related to AI (e.g., 'Machine Learning' or 'Turing Test')."
-        return None, error_msg
+        return QUIZ_DATA_MAP[match.topic_id]["json"], None
+
+    pool = cache.get(quiz_pool_cache_key(topic))
+    if pool:
+        questions = random.sample(pool, min(num_questions, len(pool)))
+        return json.dumps({'quiz_questions': questions}), None
+
+    # Failure: Block the live API call immediately and provide guidance
+    error_msg = f"The topic '{topic}' is outside the demo scope. Please use a verified topic related to AI (e.g., 'Machine Learning' or 'Turing Test')."
+    return None, error_msg
+
+# ----------------------------------------------------------------------
+# Quiz Pools (pre-generated off the request path for popular topics)
+# ----------------------------------------------------------------------
+
+QUIZ_POOL_SIZE = getattr(settings, 'AI_QUIZ_POOL_SIZE', 15)
+QUIZ_POOL_CACHE_TTL_S = getattr(settings, 'AI_QUIZ_POOL_CACHE_TTL_S', 7 * 24 * 3600)
+QUIZ_POOL_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {'quiz_questions': {'type': 'ARRAY', 'items': QUIZ_QUESTION_SCHEMA}},
+    'required': ['quiz_questions'],
+}
+
+def quiz_pool_cache_key(topic):
+    return 'quiz_pool:' + fingerprint(topic_index.canonical_key(topic))
+
+def generate_quiz_pool(topic, pool_size=QUIZ_POOL_SIZE):
+    """
+    Generates a pool of questions for `topic` and caches it for generate_quiz_json.
+    Returns (number_of_questions, error).
+    """
+    client = initialize_client()
+    if not client:
+        return 0, "AI service is not configured. Check your .env file for GEMINI_API_KEY."
+
+    prompt = f"""
+    You are an expert educational assistant. Write exactly {pool_size} distinct multiple-choice questions
+    about the topic '{topic}' for a student quiz, ranging from basic definitions to applied understanding.
+    Each question has 3 or 4 "options" and the zero-based "correct_answer_index".
+    """
+
+    config = types.GenerateContentConfig(
+        response_mime_type='application/json',
+        response_schema=QUIZ_POOL_SCHEMA,
+    )
+
+    try:
+        raw = _generate_text('quiz', prompt, config)
+        questions = validate_quiz_questions(json.loads(raw).get('quiz_questions'))
+    except APIError as e:
+        return 0, f"AI API Error: Could not generate quiz pool. {e}"
+    except (json.JSONDecodeError, AttributeError) as e:
+        return 0, f"AI returned an invalid quiz pool: {e}"
+    except Exception as e:
+        return 0, f"An unexpected error occurred during quiz pool generation: {e}"
+
+    if not questions:
+        return 0, "AI returned no valid quiz questions."
+    cache.set(quiz_pool_cache_key(topic), questions, QUIZ_POOL_CACHE_TTL_S)
+    return len(questions), None
 
 # ----------------------------------------------------------------------
 # Feedback Function (Must exist for views.py)
 # ----------------------------------------------------------------------
 
-def generate_feedback(topic, score, total):
+def generate_feedback(topic, score, total, user=None):
     client = initialize_client()
     if not client:
         return "AI service is not configured. Review your performance and try again!"
@@ -297,10 +659,202 @@ def generate_feedback(topic, score, total):
     """
     
     try:
-        response = client.models.generate_content(
-            model=model_flash,
-            contents=prompt
+        return _generate_text('feedback', prompt, user=user)
+    except QuotaExceededError:
+        return "Great job on the quiz! Review the questions you missed and keep going."
+    except Exception as e:
+        return f"AI Feedback Error: Great job on the quiz! Keep going. ({e})"
+# ----------------------------------------------------------------------
+# Chat With Notes (Gemini context caching)
+# ----------------------------------------------------------------------
+# The note text is uploaded once as a cached context; each question then
+# sends only the question and a few recent turns, so per-question input
+# tokens and latency don't grow with the document. Notes too short to be
+# worth caching are sent inline instead.
+
+NOTE_CHAT_MODEL = getattr(settings, 'NOTE_CHAT_MODEL', model_flash)
+NOTE_CONTEXT_CACHE_TTL_S = getattr(settings, 'NOTE_CONTEXT_CACHE_TTL_S', 3600)
+NOTE_CONTEXT_MIN_TOKENS = getattr(settings, 'NOTE_CONTEXT_MIN_TOKENS', 1024)
+# Gemini answers 403/404 for a cache that has expired or was deleted.
+CONTEXT_CACHE_MISSING_CODES = {403, 404}
+NOTE_CACHE_EXPIRED = "The cached note context has expired."
+
+NOTE_CHAT_INSTRUCTION = (
+    "You are an expert educational assistant helping a student study their own notes. "
+    "Answer questions using the notes; if the notes don't cover something, say so before "
+    "answering from general knowledge. Keep answers concise and use Markdown."
+)
+
+def create_note_context_cache(note_title, pdf_text, user=None):
+    """
+    Uploads the note text as a context cache for NOTE_CHAT_MODEL.
+    Returns (cached_content, error); cached_content has .name and .expire_time.
+    """
+    client = initialize_client()
+    if not client:
+        return None, "AI service is not configured. Check your .env file for GEMINI_API_KEY."
+
+    user_id = getattr(user, 'pk', None)
+    started = time.monotonic()
+    try:
+        check_quota(user_id, 'note_cache', estimate_tokens(pdf_text))
+        cached = client.caches.create(
+            model=NOTE_CHAT_MODEL,
+            config=types.CreateCachedContentConfig(
+                display_name=note_title[:128],
+                system_instruction=NOTE_CHAT_INSTRUCTION,
+                contents=[types.Content(role='user', parts=[
+                    types.Part(text=f"--- Notes titled '{note_title}' ---\n{pdf_text}\n--- End Notes ---")
+                ])],
+                ttl=f"{NOTE_CONTEXT_CACHE_TTL_S}s",
+            ),
+        )
+    except QuotaExceededError as e:
+        return None, f"AI Quota Error: {e}"
+    except APIError as e:
+        record_usage(user_id, 'note_cache', NOTE_CHAT_MODEL, 0, 0, (time.monotonic() - started) * 1000, ok=False)
+        return None, f"AI API Error: Could not cache the notes. {e}"
+    except Exception as e:
+        return None, f"An unexpected error occurred while caching the notes: {e}"
+
+    tokens = cached.usage_metadata.total_token_count if cached.usage_metadata else estimate_tokens(pdf_text)
+    record_usage(user_id, 'note_cache', NOTE_CHAT_MODEL, tokens, 0, (time.monotonic() - started) * 1000)
+    return cached, None
+
+def extend_note_context_cache(cache_name):
+    """Pushes the cache's expiry NOTE_CONTEXT_CACHE_TTL_S into the future. Returns the new expiry or None."""
+    client = initialize_client()
+    try:
+        cached = client.caches.update(
+            name=cache_name,
+            config=types.UpdateCachedContentConfig(ttl=f"{NOTE_CONTEXT_CACHE_TTL_S}s"),
         )
-        return response.text
+        return cached.expire_time
+    except Exception as e:
+        print(f"Could not extend context cache {cache_name}: {e}")
+        return None
+
+def delete_note_context_cache(cache_name):
+    """Deletes a context cache; already-expired caches are ignored."""
+    client = initialize_client()
+    if not client or not cache_name:
+        return
+    try:
+        client.caches.delete(name=cache_name)
+    except APIError as e:
+        if e.code not in CONTEXT_CACHE_MISSING_CODES:
+            print(f"Could not delete context cache {cache_name}: {e}")
     except Exception as e:
-        return f"AI Feedback Error: Great job on the quiz! Keep going. ({e})"
\ No newline at end of file
+        print(f"Could not delete context cache {cache_name}: {e}")
+
+def answer_note_question(note_title, question, history, cache_name=None, pdf_text=None, user=None):
+    """
+    Answers a question about a note. `history` is a list of (role, text) recent turns.
+    With `cache_name` the note text is read from the context cache; otherwise
+    `pdf_text` is sent inline. Returns (answer, error); error is NOTE_CACHE_EXPIRED
+    if the cache has to be recreated.
+    """
+    client = initialize_client()
+    if not client:
+        return None, "AI service is not configured. Check your .env file for GEMINI_API_KEY."
+
+    conversation = "\n".join(
+        f"{'Student' if role == 'user' else 'Tutor'}: {text}" for role, text in history
+    ) or "(none)"
+    inline_notes = "" if cache_name else f"""
+    --- Notes titled '{note_title}' ---
+    {truncate_to_tokens(pdf_text or '', router.input_budget('note_chat'))}
+    --- End Notes ---
+    """
+    prompt = f"""
+    {'' if cache_name else NOTE_CHAT_INSTRUCTION}
+    {inline_notes}
+    --- Conversation So Far ---
+    {conversation}
+    --- New Question ---
+    {question}
+    """
+
+    try:
+        if cache_name:
+            config = types.GenerateContentConfig(cached_content=cache_name)
+            return _generate_text('note_chat', prompt, config, user=user, model=NOTE_CHAT_MODEL), None
+        return _generate_text('note_chat', prompt, user=user), None
+    except QuotaExceededError as e:
+        return None, f"AI Quota Error: {e}"
+    except APIError as e:
+        if cache_name and e.code in CONTEXT_CACHE_MISSING_CODES:
+            return None, NOTE_CACHE_EXPIRED
+        return None, f"AI API Error: Could not answer the question. {e}"
+    except Exception as e:
+        return None, f"An unexpected error occurred while answering: {e}"
+
+# ----------------------------------------------------------------------
+# Offline Batch Requests (queued and written back by core.batch)
+# ----------------------------------------------------------------------
+# The Batch API accepts many generateContent requests in one call and runs
+# them asynchronously (within 24 hours) at a lower price. Requests are sent
+# inline; responses come back in the order the requests were submitted.
+
+BATCH_MODEL = getattr(settings, 'AI_BATCH_MODEL', model_flash)
+BATCH_DONE_STATES = {
+    'JOB_STATE_SUCCEEDED', 'JOB_STATE_PARTIALLY_SUCCEEDED', 'JOB_STATE_FAILED', 'JOB_STATE_CANCELLED', 'JOB_STATE_EXPIRED',
+}
+
+def batch_prompt(kind, pdf_text, note_title):
+    """Returns (prompt, config) for a queued job, identical to the interactive request of the same kind."""
+    if kind == 'study_pack':
+        return study_pack_prompt(pdf_text, note_title), STUDY_PACK_CONFIG
+    return summary_prompt(pdf_text, note_title), None
+
+def submit_batch(requests, display_name):
+    """Submits (prompt, config) pairs as one batch. Returns (batch_name, error)."""
+    client = initialize_client()
+    if not client:
+        return None, "AI service is not configured. Check your .env file for GEMINI_API_KEY."
+
+    inlined = [types.InlinedRequest(contents=prompt, config=config) for prompt, config in requests]
+    try:
+        job = client.batches.create(
+            model=BATCH_MODEL,
+            src=inlined,
+            config=types.CreateBatchJobConfig(display_name=display_name),
+        )
+        return job.name, None
+    except APIError as e:
+        return None, f"AI API Error: Could not submit batch. {e}"
+    except Exception as e:
+        return None, f"An unexpected error occurred while submitting a batch: {e}"
+
+def fetch_batch(batch_name):
+    """
+    Returns (state, results, error). Once the batch is in a BATCH_DONE_STATES
+    state, `results` holds one (text, prompt_tokens, output_tokens, error)
+    tuple per submitted request, in submission order.
+    """
+    client = initialize_client()
+    if not client:
+        return None, None, "AI service is not configured. Check your .env file for GEMINI_API_KEY."
+
+    try:
+        job = client.batches.get(name=batch_name)
+    except Exception as e:
+        return None, None, f"Could not fetch batch {batch_name}: {e}"
+
+    state = getattr(job.state, 'value', job.state)
+    if state not in BATCH_DONE_STATES:
+        return state, None, None
+
+    results = []
+    for item in (job.dest.inlined_responses if job.dest else None) or []:
+        if item.error or item.response is None:
+            results.append((None, 0, 0, (item.error and item.error.message) or "No response returned."))
+            continue
+        usage = item.response.usage_metadata
+        results.append((
+            item.response.text,
+            (usage.prompt_token_count or 0) if usage else 0,
+            _output_tokens(usage) if usage else 0,
+            None,
+        ))
+    return state, results, None
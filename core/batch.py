@@ -0,0 +1,224 @@
+# core/batch.py
+import json
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .ai_router import batch_capacity, count_calls, estimate_tokens
+from .ai_utils import (
+    BATCH_DONE_STATES, BATCH_MODEL, batch_prompt, extract_text_from_pdf, fetch_batch, submit_batch, validate_study_pack
+)
+from .models import AIBatchJob, AIBatchRunLock
+from .usage import QuotaExceededError, check_quota, record_usage
+
+# ----------------------------------------------------------------------
+# Offline Batch Lane
+# ----------------------------------------------------------------------
+# Work that does not need interactive latency (uploads marked "not urgent",
+# bulk re-summaries after a prompt change) is queued as AIBatchJob rows
+# instead of calling the model. `manage.py run_ai_batch`, run from cron,
+# collects finished batches and, inside the off-peak window, submits pending
+# jobs as one batch per kind. Each submission is capped at what the shared
+# rate limit has left after recent interactive traffic
+# (ai_router.batch_capacity), so live users keep priority.
+#
+# Results are written to the note the same way the upload view would.
+# Only one run works the queue at a time: it holds a lease on an
+# AIBatchRunLock row, taken under select_for_update.
+
+OFF_PEAK_HOURS = getattr(settings, 'AI_BATCH_OFF_PEAK_HOURS', (1, 6))   # [start, end) local hours
+MAX_REQUESTS_PER_RUN = getattr(settings, 'AI_BATCH_MAX_REQUESTS', 100)
+MAX_ATTEMPTS = getattr(settings, 'AI_BATCH_MAX_ATTEMPTS', 3)
+ACTIVE_STATUSES = ('pending', 'submitted')
+RUN_LOCK_NAME = 'run_ai_batch'
+RUN_LOCK_TTL = timedelta(minutes=30)
+LOST_RUN_LOCK = "Lost the run lock to another run_ai_batch; the remaining jobs stay pending."
+
+
+def acquire_run_lock(ttl=RUN_LOCK_TTL):
+    """Takes the run lease for `ttl`. Returns the owner token, or None while another run holds it."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        AIBatchRunLock.objects.get_or_create(name=RUN_LOCK_NAME, defaults={'locked_until': now})
+        lock = AIBatchRunLock.objects.select_for_update().get(name=RUN_LOCK_NAME)
+        if lock.owner and lock.locked_until > now:
+            return None
+        lock.owner, lock.locked_until = token, now + ttl
+        lock.save(update_fields=['owner', 'locked_until'])
+    return token
+
+
+def renew_run_lock(token, ttl=RUN_LOCK_TTL):
+    """Extends a held lease. Returns False if it expired and another run took it over."""
+    return AIBatchRunLock.objects.filter(name=RUN_LOCK_NAME, owner=token).update(
+        locked_until=timezone.now() + ttl
+    ) == 1
+
+
+def release_run_lock(token):
+    AIBatchRunLock.objects.filter(name=RUN_LOCK_NAME, owner=token).update(owner='', locked_until=timezone.now())
+
+
+def in_off_peak_window(moment=None):
+    """True if `moment` (default: now) falls in the configured off-peak hours; the window may wrap midnight."""
+    hour = timezone.localtime(moment).hour
+    start, end = OFF_PEAK_HOURS
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def enqueue_note_job(note, kind):
+    """Queues `kind` work for `note` unless the same work is already queued. Returns the job."""
+    job = AIBatchJob.objects.filter(note=note, kind=kind, status__in=ACTIVE_STATUSES).first()
+    return job or AIBatchJob.objects.create(note=note, kind=kind)
+
+
+def enqueue_resummaries(notes):
+    """Queues a fresh summary for every note in the queryset. Returns the number of jobs added."""
+    queued = set(
+        AIBatchJob.objects.filter(note__in=notes, kind='summary', status__in=ACTIVE_STATUSES).values_list('note_id', flat=True)
+    )
+    jobs = [AIBatchJob(note_id=pk, kind='summary') for pk in notes.values_list('pk', flat=True) if pk not in queued]
+    AIBatchJob.objects.bulk_create(jobs, batch_size=1000)
+    return len(jobs)
+
+
+def _fail(job, error):
+    """Returns the job to the queue, or marks it failed once it has used all its attempts."""
+    if job.attempts < MAX_ATTEMPTS:
+        job.status = 'pending'
+    else:
+        job.status = 'failed'
+        job.completed_at = timezone.now()
+        note = job.note
+        if not note.summary_text:
+            # Deferred upload that never got a summary: show the failure instead of "waiting".
+            note.summary_text = f"ERROR: Off-peak processing failed. {error}"
+            note.save(update_fields=['summary_text'])
+    job.error = error or ''
+    job.save(update_fields=['status', 'attempts', 'error', 'completed_at'])
+
+
+def _apply(job, text):
+    """Writes one job's model output to its note."""
+    from .views import save_study_pack  # views imports this module
+
+    note = job.note
+    if job.kind == 'study_pack':
+        save_study_pack(note, validate_study_pack(json.loads(text)))
+    else:
+        if not text or not text.strip():
+            raise ValueError("Empty summary.")
+        note.summary_text = text
+        # The plain summary ends with its own "Key Concepts" section.
+        note.key_concepts = []
+        note.save(update_fields=['summary_text', 'key_concepts'])
+
+    job.status = 'done'
+    job.error = ''
+    job.completed_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'completed_at'])
+
+
+def submit_pending(max_requests=MAX_REQUESTS_PER_RUN, lock_token=None):
+    """
+    Submits pending jobs, one batch per kind, up to the capacity the shared
+    rate limit can spare. Returns (submitted_count, reason_if_nothing_could_be_sent).
+    With `lock_token`, the run lease is renewed after each job, since extracting
+    many PDFs can outlast it; if the lease was lost, nothing more is submitted.
+    """
+    capacity = batch_capacity(max_requests)
+    if capacity <= 0:
+        return 0, "Interactive traffic is using the shared rate limit."
+
+    submitted = 0
+    for kind, _ in AIBatchJob.KIND_CHOICES:
+        if submitted >= capacity:
+            break
+        candidates = AIBatchJob.objects.filter(status='pending', kind=kind).select_related('note').order_by('pk')
+        jobs, requests = [], []
+        for job in candidates[:capacity - submitted]:
+            if lock_token and not renew_run_lock(lock_token):
+                return submitted, LOST_RUN_LOCK
+            text = extract_text_from_pdf(job.note.pdf_file.path)
+            if not text:
+                job.attempts = MAX_ATTEMPTS
+                _fail(job, "Could not extract text from PDF.")
+                continue
+            prompt, config = batch_prompt(kind, text, job.note.title)
+            try:
+                check_quota(job.note.user_id, f'batch_{kind}', estimate_tokens(prompt))
+            except QuotaExceededError:
+                continue  # stays pending until the quota resets
+            jobs.append(job)
+            requests.append((prompt, config))
+
+        if not requests:
+            continue
+        if lock_token and not renew_run_lock(lock_token):
+            return submitted, LOST_RUN_LOCK
+        batch_name, error = submit_batch(requests, display_name=f"{kind}-{timezone.now():%Y%m%d-%H%M%S}")
+        if error:
+            # Counts as an attempt, so a request the API keeps rejecting eventually fails.
+            for job in jobs:
+                job.attempts += 1
+                _fail(job, error)
+            return submitted, error
+
+        count_calls('batch', len(requests))
+        submitted_at = timezone.now()
+        for index, job in enumerate(jobs):
+            job.status, job.batch_name, job.batch_index = 'submitted', batch_name, index
+            job.submitted_at, job.attempts = submitted_at, job.attempts + 1
+        AIBatchJob.objects.bulk_update(
+            jobs, ['status', 'batch_name', 'batch_index', 'submitted_at', 'attempts'], batch_size=1000,
+        )
+        submitted += len(requests)
+    return submitted, None
+
+
+def collect_finished():
+    """
+    Writes back the results of every finished batch. Returns
+    (jobs_done, jobs_failed_or_requeued, batches_still_running).
+    """
+    done = failed = running = 0
+    batch_names = (
+        AIBatchJob.objects.filter(status='submitted').values_list('batch_name', flat=True).distinct().order_by()
+    )
+    for batch_name in list(batch_names):
+        state, results, error = fetch_batch(batch_name)
+        if error:
+            print(f"Batch {batch_name} could not be checked: {error}")
+            running += 1
+            continue
+        if state not in BATCH_DONE_STATES:
+            running += 1
+            continue
+
+        # Responses come back in request order; jobs of notes deleted meanwhile are simply gone.
+        results = results or []
+        for job in AIBatchJob.objects.filter(batch_name=batch_name, status='submitted').select_related('note'):
+            index = job.batch_index
+            if index is not None and index < len(results):
+                text, prompt_tokens, output_tokens, item_error = results[index]
+            else:
+                text, prompt_tokens, output_tokens, item_error = None, 0, 0, f"Batch ended in {state}."
+            turnaround_ms = (timezone.now() - job.submitted_at).total_seconds() * 1000 if job.submitted_at else 0
+            record_usage(
+                job.note.user_id, f'batch_{job.kind}', BATCH_MODEL, prompt_tokens, output_tokens, turnaround_ms,
+                ok=item_error is None,
+            )
+            if item_error is None:
+                try:
+                    _apply(job, text)
+                    done += 1
+                    continue
+                except (json.JSONDecodeError, ValueError) as e:
+                    item_error = f"AI returned an invalid result: {e}"
+            _fail(job, item_error)
+            failed += 1
+    return done, failed, running
@@ -0,0 +1,227 @@
+# core/file_serving.py
+import os
+import re
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+# ----------------------------------------------------------------------
+# Protected Note File Serving
+# ----------------------------------------------------------------------
+# Notes are served through an authenticated view. When a front-end server
+# is configured (NOTE_FILE_OFFLOAD = 'nginx' or 'apache') the view only
+# checks ownership and hands the transfer off via X-Accel-Redirect /
+# X-Sendfile. Otherwise Django streams the file itself, honouring single
+# and multi-part Range requests so PDF viewers can fetch pages on demand.
+
+RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+STREAM_BLOCK_SIZE = 64 * 1024
+MAX_RANGES = 20
+OFFLOAD_MODES = ('nginx', 'apache')
+
+
+class BoundedFile:
+    """
+    File wrapper that stops reading after `length` bytes.
+
+    Exposes fileno() so WSGI servers with a sendfile-capable file_wrapper
+    (gunicorn) can transmit the range zero-copy from the current offset.
+    """
+
+    def __init__(self, fileobj, start, length):
+        self.fileobj = fileobj
+        self.remaining = length
+        self.fileobj.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fileobj.fileno()
+
+    def tell(self):
+        return self.fileobj.tell()
+
+    def close(self):
+        self.fileobj.close()
+
+
+def parse_range_header(header, size):
+    """
+    Parses a `Range: bytes=...` header into a list of (start, end) tuples
+    (end inclusive). Returns None when the header should be ignored and an
+    empty list when no range is satisfiable.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+
+    ranges = []
+    for spec in header[len('bytes='):].split(','):
+        match = RANGE_RE.match(spec)
+        if not match:
+            return None
+        first, last = match.groups()
+        if first == '' and last == '':
+            return None
+        if first == '':
+            # Suffix range: the final N bytes of the file
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None
+            if start >= size:
+                continue
+            end = min(end, size - 1)
+        ranges.append((start, end))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+    return _coalesce_ranges(ranges)
+
+
+def _coalesce_ranges(ranges):
+    """Merges overlapping or adjacent ranges so no byte is sent twice."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _file_etag(stat):
+    return quote_etag(f"{stat.st_size:x}-{int(stat.st_mtime):x}")
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    return if_range.strip() in (etag, last_modified)
+
+
+def _offload_mode():
+    """
+    The configured front-end server, or '' to stream from Django. An unknown
+    value raises rather than sending empty X-Sendfile responses from a server
+    that does not understand the header.
+    """
+    mode = getattr(settings, 'NOTE_FILE_OFFLOAD', '')
+    if mode and mode not in OFFLOAD_MODES:
+        raise ImproperlyConfigured(
+            f"NOTE_FILE_OFFLOAD must be one of {', '.join(OFFLOAD_MODES)} or empty, not {mode!r}."
+        )
+    return mode
+
+
+def _offloaded_response(file_field, content_type, disposition, mode):
+    """Lets nginx / Apache / lighttpd perform the transfer (and Range handling)."""
+    response = HttpResponse(content_type=content_type)
+    response['Content-Disposition'] = disposition
+    if mode == 'nginx':
+        prefix = getattr(settings, 'NOTE_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + file_field.name.lstrip('/')
+    else:
+        response['X-Sendfile'] = file_field.path
+    return response
+
+
+def _multipart_ranges(path, ranges, size, boundary, content_type):
+    """Yields a multipart/byteranges body, reading each range in blocks."""
+    with open(path, 'rb') as fh:
+        for start, end in ranges:
+            yield _part_header(boundary, content_type, start, end, size)
+            fh.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = fh.read(min(STREAM_BLOCK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+            yield b'\r\n'
+        yield f'--{boundary}--\r\n'.encode('ascii')
+
+
+def _part_header(boundary, content_type, start, end, size):
+    return (
+        f'--{boundary}\r\n'
+        f'Content-Type: {content_type}\r\n'
+        f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+    ).encode('ascii')
+
+
+def serve_protected_file(request, file_field, content_type='application/pdf', filename=None):
+    """
+    Returns the most efficient response for a file the caller is already
+    authorised to read. Supports If-Range and single/multi Range requests.
+    """
+    filename = filename or os.path.basename(file_field.name)
+    # RFC 6266 escaping, with a filename* form for non-ASCII names (as FileResponse does).
+    disposition = content_disposition_header(False, filename)
+
+    mode = _offload_mode()
+    if mode:
+        return _offloaded_response(file_field, content_type, disposition, mode)
+
+    path = file_field.path
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return HttpResponse(status=404)
+
+    size = stat.st_size
+    etag = _file_etag(stat)
+    last_modified = http_date(stat.st_mtime)
+
+    ranges = None
+    if _if_range_matches(request, etag, last_modified):
+        ranges = parse_range_header(request.META.get('HTTP_RANGE'), size)
+
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif not ranges:
+        response = FileResponse(open(path, 'rb'), content_type=content_type, filename=filename)
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        length = end - start + 1
+        response = FileResponse(
+            BoundedFile(open(path, 'rb'), start, length),
+            status=206, content_type=content_type, filename=filename,
+        )
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        boundary = uuid.uuid4().hex
+        length = sum(
+            len(_part_header(boundary, content_type, start, end, size)) + (end - start + 1) + 2
+            for start, end in ranges
+        ) + len(f'--{boundary}--\r\n')
+        response = StreamingHttpResponse(
+            _multipart_ranges(path, ranges, size, boundary, content_type),
+            status=206, content_type=f'multipart/byteranges; boundary={boundary}',
+        )
+        response['Content-Length'] = length
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Content-Disposition'] = disposition
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
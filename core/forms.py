@@ -10,6 +10,11 @@ class PDFUploadForm(forms.ModelForm):
         help_text='Max file size 50MB. Only PDF files allowed.',
         widget=forms.ClearableFileInput(attrs={'accept': '.pdf'})
     )
+    process_later = forms.BooleanField(
+        label='Not urgent: summarize during off-peak hours',
+        required=False,
+        help_text='Useful for bulk imports. The summary and quiz appear after the next overnight run.'
+    )
     
     class Meta:
         model = UserNote
@@ -27,4 +32,38 @@ class TopicForm(forms.Form):
             'placeholder': 'e.g., Quantum Entanglement, The Water Cycle, The French Revolution',
             'class': 'w-full p-3 rounded-lg bg-gray-700 border border-gray-600 focus:border-cyan-500 focus:ring-1 focus:ring-cyan-500 futuristic-text'
         })
-    )
\ No newline at end of file
+    )
+
+class BatchGradeForm(forms.Form):
+    """Upload of a whole class's answers for one quiz."""
+    submissions = forms.FileField(
+        label='Upload Submissions',
+        help_text='CSV with a "username" column and q1..qN answer columns, or a JSON list of {"username", "answers"}.',
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,.json'})
+    )
+
+class JoinQuizForm(forms.Form):
+    """Join code a teacher shares with their class."""
+    code = forms.CharField(
+        label='Join Code',
+        max_length=16,
+        widget=forms.TextInput(attrs={
+            'placeholder': 'e.g., K7QM2XPA',
+            'class': 'w-full p-3 rounded-lg bg-gray-700 border border-gray-600 focus:border-cyan-500 focus:ring-1 focus:ring-cyan-500 futuristic-text uppercase'
+        })
+    )
+
+    def clean_code(self):
+        return self.cleaned_data['code'].strip().upper()
+
+class NoteQuestionForm(forms.Form):
+    """A question about one of the user's notes."""
+    question = forms.CharField(
+        label='Ask about these notes',
+        max_length=2000,
+        widget=forms.Textarea(attrs={
+            'rows': 3,
+            'placeholder': 'e.g., Can you explain the second theorem with an example?',
+            'class': 'w-full p-3 rounded-lg bg-gray-700 border border-gray-600 focus:border-cyan-500 focus:ring-1 focus:ring-cyan-500 futuristic-text'
+        })
+    )
@@ -0,0 +1,282 @@
+# core/grading.py
+import csv
+import io
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .ai_utils import generate_feedback
+from .leaderboard import record_scores
+from .models import QuizAttempt, QuizMembership
+from .review import QUALITY_CORRECT, QUALITY_UNANSWERED, QUALITY_WRONG, correct_option_index, record_reviews
+
+# ----------------------------------------------------------------------
+# Batch Grading (classroom submissions)
+# ----------------------------------------------------------------------
+# The answer key is loaded once into an int array; all submissions are
+# parsed into an (n_students, n_questions) matrix and graded with a single
+# vectorised comparison. Feedback is generated once per score bucket,
+# attempts are written with bulk_create, and every answer feeds the students'
+# spaced-repetition schedules (core.review).
+
+UNANSWERED = -1
+LETTER_ANSWERS = {letter: i for i, letter in enumerate('ABCDEFGH')}
+QUESTION_ID_RE = re.compile(r'^(?:question_)?(\d+)$')
+POSITION_RE = re.compile(r'^q(\d+)$', re.IGNORECASE)
+
+# Upper bounds (inclusive, in percent) of the feedback buckets
+FEEDBACK_BUCKETS = [39, 59, 79, 99, 100]
+FEEDBACK_WORKERS = 5
+WRITE_BATCH_SIZE = 1000
+
+
+class SubmissionFormatError(ValueError):
+    """Raised when uploaded submissions cannot be parsed."""
+
+
+def _key_index(data):
+    index = correct_option_index(data)
+    return UNANSWERED if index is None else index
+
+
+def load_answer_key(quiz):
+    """
+    Returns (question_ids, key, option_counts): key[i] is the correct option
+    index of question i, or UNANSWERED if it has no valid one (such questions
+    score for nobody), and option_counts[i] is how many options it has.
+    """
+    rows = list(quiz.questions.order_by('pk').values_list('pk', 'data'))
+    question_ids = [pk for pk, _ in rows]
+    key = np.array([_key_index(data) for _, data in rows], dtype=np.int64)
+    option_counts = np.array([len(data.get('options') or []) for _, data in rows], dtype=np.int64)
+    return question_ids, key, option_counts
+
+
+def _parse_answer(value):
+    if value is None:
+        return UNANSWERED
+    if isinstance(value, int):
+        return value
+    value = str(value).strip().upper()
+    if not value:
+        return UNANSWERED
+    if value in LETTER_ANSWERS:
+        return LETTER_ANSWERS[value]
+    try:
+        return int(value)
+    except ValueError:
+        return UNANSWERED
+
+
+def _column_positions(header, question_ids):
+    """Maps CSV columns to question positions, by question id or by qN position."""
+    position_by_id = {qid: i for i, qid in enumerate(question_ids)}
+    positions = []
+    for column in header:
+        column = column.strip()
+        by_id = QUESTION_ID_RE.match(column)
+        by_position = POSITION_RE.match(column)
+        if by_id and int(by_id.group(1)) in position_by_id:
+            positions.append(position_by_id[int(by_id.group(1))])
+        elif by_position and 1 <= int(by_position.group(1)) <= len(question_ids):
+            positions.append(int(by_position.group(1)) - 1)
+        else:
+            positions.append(None)
+    return positions
+
+
+def parse_csv_submissions(text, question_ids):
+    """
+    CSV with a `username` column and one column per question, headed either
+    `q1..qN` (quiz order) or `question_<id>`. Answers are option indices or letters.
+    """
+    reader = csv.reader(io.StringIO(text))
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise SubmissionFormatError("The CSV file is empty.")
+
+    lowered = [h.strip().lower() for h in header]
+    if 'username' not in lowered:
+        raise SubmissionFormatError("The CSV file needs a 'username' column.")
+    user_column = lowered.index('username')
+    positions = _column_positions(header, question_ids)
+
+    submissions = {}
+    for row in reader:
+        if len(row) <= user_column or not row[user_column].strip():
+            continue
+        answers = [UNANSWERED] * len(question_ids)
+        for column, value in enumerate(row):
+            if column < len(positions) and positions[column] is not None:
+                answers[positions[column]] = _parse_answer(value)
+        submissions[row[user_column].strip()] = answers
+    return submissions
+
+
+def parse_json_submissions(text, question_ids):
+    """
+    JSON list of {"username": ..., "answers": [...]} (quiz order) or
+    {"username": ..., "answers": {"<question_id>": index}}.
+    """
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise SubmissionFormatError(f"Invalid JSON: {e}")
+    if isinstance(data, dict):
+        data = data.get('submissions', [])
+    if not isinstance(data, list):
+        raise SubmissionFormatError("Expected a list of submissions.")
+
+    position_by_id = {str(qid): i for i, qid in enumerate(question_ids)}
+    submissions = {}
+    for entry in data:
+        if not isinstance(entry, dict) or not entry.get('username'):
+            continue
+        raw = entry.get('answers') or []
+        if not isinstance(raw, (list, dict)):
+            raise SubmissionFormatError(f"Answers for {entry['username']} must be a list or an object.")
+        answers = [UNANSWERED] * len(question_ids)
+        if isinstance(raw, dict):
+            for qid, value in raw.items():
+                position = position_by_id.get(str(qid).replace('question_', ''))
+                if position is not None:
+                    answers[position] = _parse_answer(value)
+        else:
+            for position, value in enumerate(raw[:len(question_ids)]):
+                answers[position] = _parse_answer(value)
+        submissions[str(entry['username']).strip()] = answers
+    return submissions
+
+
+def parse_submissions(text, question_ids, fmt=None):
+    """Parses CSV or JSON submissions (format sniffed when not given) into {username: answers}."""
+    if fmt is None:
+        fmt = 'json' if text.lstrip()[:1] in ('[', '{') else 'csv'
+    if fmt == 'json':
+        return parse_json_submissions(text, question_ids)
+    return parse_csv_submissions(text, question_ids)
+
+
+def bucket_feedback(topic, scores, total, user=None):
+    """
+    Generates one feedback message per occupied score bucket; returns (bucket_of_each_score, messages).
+    Model usage is metered against `user` (the teacher who runs the batch).
+    """
+    percentages = scores * 100 // max(total, 1)
+    buckets = np.searchsorted(np.array(FEEDBACK_BUCKETS), percentages, side='left')
+
+    occupied = np.unique(buckets)
+    representative = {int(b): int(np.median(scores[buckets == b])) for b in occupied}
+
+    with ThreadPoolExecutor(max_workers=FEEDBACK_WORKERS) as pool:
+        futures = {b: pool.submit(_feedback_in_thread, topic, score, total, user) for b, score in representative.items()}
+        messages = {b: future.result() for b, future in futures.items()}
+    return buckets, messages
+
+
+def _feedback_in_thread(topic, score, total, user):
+    # Single-flight rows and usage flushes open a DB connection in this pool
+    # thread; Django only closes connections of request threads.
+    try:
+        return generate_feedback(topic, score, total, user=user)
+    finally:
+        connection.close()
+
+
+def _answer_matrix(known, submissions, option_counts):
+    """
+    Builds the (students, questions) answer matrix, raising SubmissionFormatError
+    for any answer outside UNANSWERED..options-1.
+    """
+    try:
+        answers = np.array([submissions[u] for u in known], dtype=np.int64).reshape(len(known), len(option_counts))
+    except (OverflowError, ValueError):
+        raise SubmissionFormatError("Submissions contain answers that are not option numbers.")
+
+    invalid = (answers < UNANSWERED) | (answers >= option_counts)
+    if invalid.any():
+        row, col = (int(i) for i in np.argwhere(invalid)[0])
+        raise SubmissionFormatError(
+            f"{known[row]} answered {answers[row, col]} to question {col + 1}, "
+            f"which has options 0-{option_counts[col] - 1}."
+        )
+    return answers
+
+
+def grade_submissions(quiz, submissions, with_feedback=True):
+    """
+    Grades {username: answers} for `quiz` in one vectorised pass and stores one
+    QuizAttempt per student (replacing earlier attempts, like grade_quiz_view).
+    Students are the quiz's owner and members; other usernames are unknown.
+    Returns a summary dict. Raises SubmissionFormatError, before anything is
+    written, if an answer is not a valid option of its question.
+    """
+    started = time.perf_counter()
+    question_ids, key, option_counts = load_answer_key(quiz)
+    total = len(question_ids)
+
+    # Only the quiz's owner and members can be graded; anyone else is reported as unknown.
+    User = get_user_model()
+    participants = Q(pk=quiz.user_id) | Q(pk__in=QuizMembership.objects.filter(quiz=quiz).values('user_id'))
+    usernames = list(submissions)
+    user_ids = {}
+    for i in range(0, len(usernames), WRITE_BATCH_SIZE):
+        chunk = usernames[i:i + WRITE_BATCH_SIZE]
+        user_ids.update(User.objects.filter(participants, username__in=chunk).values_list('username', 'pk'))
+
+    known = [u for u in usernames if u in user_ids]
+    unknown = [u for u in usernames if u not in user_ids]
+    if not known or not total:
+        return {'graded': 0, 'unknown_usernames': unknown, 'total_questions': total}
+
+    answers = _answer_matrix(known, submissions, option_counts)
+    keyed = key != UNANSWERED
+    correct = (answers == key) & keyed
+    scores = correct.sum(axis=1)
+
+    if with_feedback:
+        buckets, messages = bucket_feedback(quiz.topic, scores, total, user=quiz.user)
+        feedback = [messages[int(b)] for b in buckets]
+    else:
+        feedback = [None] * len(known)
+
+    attempts = [
+        QuizAttempt(
+            user_id=user_ids[username],
+            quiz=quiz,
+            score=int(score),
+            total_questions=total,
+            feedback_message=message,
+        )
+        for username, score, message in zip(known, scores, feedback)
+    ]
+    known_ids = [user_ids[u] for u in known]
+    with transaction.atomic():
+        for i in range(0, len(known_ids), WRITE_BATCH_SIZE):
+            QuizAttempt.objects.filter(quiz=quiz, user_id__in=known_ids[i:i + WRITE_BATCH_SIZE]).delete()
+        QuizAttempt.objects.bulk_create(attempts, batch_size=WRITE_BATCH_SIZE)
+        record_scores(quiz, [(a.user_id, a.score, total) for a in attempts])
+
+    # Questions without a valid key say nothing about what the student knows.
+    quality = np.where(correct, QUALITY_CORRECT, np.where(answers == UNANSWERED, QUALITY_UNANSWERED, QUALITY_WRONG))
+    keyed_columns = np.flatnonzero(keyed)
+    record_reviews(
+        (known_ids[row], question_ids[col], int(quality[row, col]))
+        for row in range(len(known_ids)) for col in keyed_columns
+    )
+
+    return {
+        'graded': len(known),
+        'unknown_usernames': unknown,
+        'total_questions': total,
+        'mean_score': round(float(scores.mean()), 2),
+        'score_distribution': {int(s): int(c) for s, c in zip(*np.unique(scores, return_counts=True))},
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+    }
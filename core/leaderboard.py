@@ -0,0 +1,219 @@
+# core/leaderboard.py
+import bisect
+import secrets
+import threading
+from collections import OrderedDict
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import LeaderboardEntry, Quiz
+
+# ----------------------------------------------------------------------
+# Shared Quiz Leaderboards
+# ----------------------------------------------------------------------
+# Each quiz keeps one LeaderboardEntry (best score) per user. Every write
+# bumps Quiz.leaderboard_version and stamps the changed entries with it,
+# so a worker's in-memory board only fetches entries newer than the version
+# it has seen instead of re-sorting all attempts.
+#
+# In memory, scores are bounded by the question count, so the board is a
+# Fenwick tree of counts per score (rank = 1 + number of higher scores, in
+# O(log S)) plus, per score, a list of users ordered by when they got it.
+
+JOIN_CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'  # no 0/O or 1/I look-alikes
+JOIN_CODE_LENGTH = 8
+MAX_CACHED_BOARDS = 256
+WRITE_BATCH_SIZE = 1000
+
+
+class FenwickTree:
+    """Prefix sums over score buckets 0..size-1 with O(log n) update and query."""
+
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    def add(self, index, delta):
+        index += 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index):
+        """Sum of buckets 0..index (inclusive)."""
+        index = min(index, self.size - 1) + 1
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+
+class Leaderboard:
+    """Ordered in-memory leaderboard for one quiz, kept in sync with LeaderboardEntry rows."""
+
+    def __init__(self, quiz_id, max_score):
+        self.quiz_id = quiz_id
+        self.version = 0
+        self.versions = {}  # user_id -> version of the entry row applied
+        self.lock = threading.Lock()
+        self._reset(max_score)
+
+    def _reset(self, max_score):
+        self.max_score = max_score
+        self.counts = FenwickTree(max_score + 1)
+        self.buckets = {}   # score -> sorted [(achieved_at, user_id)]
+        self.entries = {}   # user_id -> (score, achieved_at, username)
+
+    def _upsert(self, user_id, username, score, achieved_at):
+        if score > self.max_score:
+            # The quiz gained questions: rebuild with room for the new maximum.
+            entries = list(self.entries.items())
+            self._reset(score)
+            for uid, (s, at, name) in entries:
+                self._upsert(uid, name, s, at)
+
+        previous = self.entries.get(user_id)
+        if previous is not None:
+            old_score, old_at, _ = previous
+            bucket = self.buckets[old_score]
+            bucket.pop(bisect.bisect_left(bucket, (old_at, user_id)))
+            self.counts.add(old_score, -1)
+
+        bisect.insort(self.buckets.setdefault(score, []), (achieved_at, user_id))
+        self.counts.add(score, 1)
+        self.entries[user_id] = (score, achieved_at, username)
+
+    def apply(self, rows, version):
+        """
+        Applies (user_id, username, score, achieved_at, row_version) rows and
+        advances the version. Rows older than the one already applied for
+        that user are ignored, so a late, stale fetch cannot undo a newer score.
+        """
+        with self.lock:
+            self._apply(rows, version)
+
+    def _apply(self, rows, version):
+        for user_id, username, score, achieved_at, row_version in rows:
+            if self.versions.get(user_id, -1) >= row_version:
+                continue
+            self._upsert(user_id, username, score, achieved_at)
+            self.versions[user_id] = row_version
+        self.version = max(self.version, version)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def rank(self, user_id):
+        """1-based competition rank (ties share a rank), or None if the user has no entry."""
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            return len(self.entries) - self.counts.prefix(entry[0]) + 1
+
+    def top(self, n):
+        """Returns up to n (rank, username, score) rows, best first; earlier achievers first on ties."""
+        rows = []
+        with self.lock:
+            higher = 0
+            for score in range(self.max_score, -1, -1):
+                bucket = self.buckets.get(score)
+                if not bucket:
+                    continue
+                for achieved_at, user_id in bucket:
+                    if len(rows) >= n:
+                        return rows
+                    rows.append((higher + 1, self.entries[user_id][2], score))
+                higher += len(bucket)
+        return rows
+
+
+_boards = OrderedDict()
+_boards_lock = threading.Lock()
+
+
+def _entry_rows(queryset):
+    return [
+        (row['user_id'], row['user__username'], row['score'], row['achieved_at'], row['version'])
+        for row in queryset.values('user_id', 'user__username', 'score', 'achieved_at', 'version')
+    ]
+
+
+def get_leaderboard(quiz):
+    """Returns the quiz's in-memory leaderboard, first fetching any entries written by other workers."""
+    current_version = Quiz.objects.values_list('leaderboard_version', flat=True).get(pk=quiz.pk)
+
+    with _boards_lock:
+        board = _boards.get(quiz.pk)
+        if board is not None:
+            _boards.move_to_end(quiz.pk)
+        else:
+            board = _boards[quiz.pk] = Leaderboard(quiz.pk, quiz.questions.count())
+            board.version = -1
+            while len(_boards) > MAX_CACHED_BOARDS:
+                _boards.popitem(last=False)
+
+    # Checked and fetched under the board's lock, so two requests never
+    # interleave their fetches and leave the board marked newer than its rows.
+    with board.lock:
+        if board.version < current_version:
+            entries = LeaderboardEntry.objects.filter(quiz_id=quiz.pk)
+            if board.version >= 0:
+                entries = entries.filter(version__gt=board.version)
+            board._apply(_entry_rows(entries), current_version)
+    return board
+
+
+def record_scores(quiz, results):
+    """
+    Records graded (user_id, score, total_questions) results, keeping each
+    user's best score. Bumps the quiz's leaderboard version once per call.
+    """
+    results = {user_id: (score, total) for user_id, score, total in results}
+    if not results:
+        return
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Lock the quiz row so versions commit in order across workers.
+        version = Quiz.objects.select_for_update().values_list('leaderboard_version', flat=True).get(pk=quiz.pk) + 1
+
+        user_ids = list(results)
+        existing = {}
+        for i in range(0, len(user_ids), WRITE_BATCH_SIZE):
+            chunk = user_ids[i:i + WRITE_BATCH_SIZE]
+            existing.update((e.user_id, e) for e in LeaderboardEntry.objects.filter(quiz=quiz, user_id__in=chunk))
+        created, updated = [], []
+        for user_id, (score, total) in results.items():
+            entry = existing.get(user_id)
+            if entry is None:
+                created.append(LeaderboardEntry(
+                    quiz=quiz, user_id=user_id, score=score, total_questions=total, achieved_at=now, version=version
+                ))
+            elif score > entry.score:
+                entry.score, entry.total_questions, entry.achieved_at, entry.version = score, total, now, version
+                updated.append(entry)
+
+        if not created and not updated:
+            return
+
+        LeaderboardEntry.objects.bulk_create(created, batch_size=WRITE_BATCH_SIZE)
+        LeaderboardEntry.objects.bulk_update(
+            updated, ['score', 'total_questions', 'achieved_at', 'version'], batch_size=WRITE_BATCH_SIZE
+        )
+        Quiz.objects.filter(pk=quiz.pk).update(leaderboard_version=version)
+
+
+def ensure_join_code(quiz):
+    """Gives the quiz a join code (once) and returns it."""
+    while not quiz.join_code:
+        code = ''.join(secrets.choice(JOIN_CODE_ALPHABET) for _ in range(JOIN_CODE_LENGTH))
+        try:
+            with transaction.atomic():
+                Quiz.objects.filter(pk=quiz.pk, join_code__isnull=True).update(join_code=code)
+        except IntegrityError:
+            continue  # another quiz already uses this code: draw again
+        quiz.join_code = Quiz.objects.values_list('join_code', flat=True).get(pk=quiz.pk)
+    return quiz.join_code
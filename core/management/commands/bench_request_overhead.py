@@ -0,0 +1,85 @@
+# core/management/commands/bench_request_overhead.py
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+from core.views import home_view
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures per-request middleware and template render overhead for the active "
+        "settings profile. Run once per profile (e.g. with "
+        "--settings=StudyAI_Project.settings_production) and compare."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Iterations per measurement.")
+        parser.add_argument('--path', default='/', help="Path to request through the full handler.")
+
+    def handle(self, *args, **options):
+        iterations = options['requests']
+        hosts = [h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'] or ['localhost']
+        factory = RequestFactory(HTTP_HOST=hosts[0])
+
+        handler = BaseHandler()
+        handler.load_middleware()
+
+        def full_request():
+            return handler.get_response(factory.get(options['path']))
+
+        status = full_request().status_code
+        if status != 200:
+            self.stderr.write(f"Warning: {options['path']} returned {status}; timings include the error path.")
+
+        def view_only():
+            request = factory.get('/')
+            request.user = AnonymousUser()
+            request.session = {}
+            home_view(request)
+
+        def render_only():
+            render_to_string('core/home.html', {'title': 'Home'})
+
+        def template_lookup():
+            engines['django'].get_template('core/home.html')
+
+        full = self.measure(full_request, iterations)
+        view = self.measure(view_only, iterations)
+        render = self.measure(render_only, iterations)
+        lookup = self.measure(template_lookup, iterations)
+
+        self.stdout.write(f"Settings: {settings.SETTINGS_MODULE}  (DEBUG={settings.DEBUG})")
+        self.stdout.write(f"Middleware: {len(settings.MIDDLEWARE)} classes")
+        self.stdout.write(f"{'measurement':<34}{'mean us':>10}{'p50 us':>10}{'p95 us':>10}")
+        self.report("full request (middleware + view)", full)
+        self.report("view + render only", view)
+        self.report("template render", render)
+        self.report("template lookup/compile", lookup)
+        overhead = [max(f - v, 0) for f, v in zip(sorted(full), sorted(view))]
+        self.report("middleware overhead (full - view)", overhead)
+
+    def measure(self, fn, iterations):
+        for _ in range(min(50, iterations)):
+            fn()  # warm-up: imports, URL resolver, template caches
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1_000_000)
+        return samples
+
+    def report(self, label, samples):
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        self.stdout.write(
+            f"{label:<34}{statistics.fmean(ordered):>10.0f}{statistics.median(ordered):>10.0f}{p95:>10.0f}"
+        )
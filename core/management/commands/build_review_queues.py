@@ -0,0 +1,32 @@
+# core/management/commands/build_review_queues.py
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.review import REVIEW_QUEUE_SIZE, build_review_queues
+
+
+class Command(BaseCommand):
+    help = (
+        "Precomputes every user's spaced-repetition review queue for the day. "
+        "Run nightly (after midnight in TIME_ZONE) from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=REVIEW_QUEUE_SIZE, help="Questions queued per user at most.")
+        parser.add_argument('--date', help="Build the queues for this day (YYYY-MM-DD) instead of today.")
+
+    def handle(self, *args, **options):
+        day = None
+        if options['date']:
+            try:
+                day = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+
+        started = time.perf_counter()
+        users, entries = build_review_queues(day, options['size'])
+        self.stdout.write(
+            f"Queued {entries} review questions for {users} users in {time.perf_counter() - started:.1f}s."
+        )
@@ -0,0 +1,35 @@
+# core/management/commands/grade_submissions.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.grading import SubmissionFormatError, grade_submissions, load_answer_key, parse_submissions
+from core.models import Quiz
+
+
+class Command(BaseCommand):
+    help = "Grades a CSV or JSON file of class submissions for one quiz in a single batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_id', type=int)
+        parser.add_argument('path', help="CSV (username, q1..qN) or JSON list of {username, answers}.")
+        parser.add_argument('--format', choices=['csv', 'json'], help="Defaults to sniffing the file contents.")
+        parser.add_argument('--no-feedback', action='store_true', help="Skip the per-bucket AI feedback calls.")
+
+    def handle(self, *args, **options):
+        try:
+            quiz = Quiz.objects.get(pk=options['quiz_id'])
+        except Quiz.DoesNotExist:
+            raise CommandError(f"Quiz {options['quiz_id']} does not exist.")
+
+        with open(options['path'], encoding='utf-8-sig') as fh:
+            text = fh.read()
+
+        try:
+            question_ids, _, _ = load_answer_key(quiz)
+            submissions = parse_submissions(text, question_ids, options['format'])
+            result = grade_submissions(quiz, submissions, with_feedback=not options['no_feedback'])
+        except SubmissionFormatError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,88 @@
+# core/management/commands/run_ai_batch.py
+import time
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from core import ai_router
+from core.batch import (
+    LOST_RUN_LOCK, MAX_REQUESTS_PER_RUN, OFF_PEAK_HOURS, acquire_run_lock, collect_finished, enqueue_resummaries, in_off_peak_window,
+    release_run_lock, renew_run_lock, submit_pending,
+)
+from core.models import AIBatchJob, UserNote
+from core.revisions import FAILED_SUMMARY_PREFIXES
+from core.usage import flush_usage
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the offline AI batch lane: writes back finished batches and, during off-peak hours, "
+        "submits queued summaries and study packs as grouped batch requests. Meant to run from cron "
+        "every few minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--now', action='store_true', help="Submit even outside the off-peak window.")
+        parser.add_argument('--max-requests', type=int, default=MAX_REQUESTS_PER_RUN, help="Requests submitted per run at most.")
+        parser.add_argument('--wait', action='store_true', help="Keep polling until every submitted batch has finished.")
+        parser.add_argument('--poll-interval', type=float, default=30.0, help="Seconds between polls with --wait.")
+        parser.add_argument(
+            '--resummarize', choices=['all', 'failed'],
+            help="First queue fresh summaries for every note, or only for notes whose summary failed.",
+        )
+
+    def handle(self, *args, **options):
+        # One runner at a time, so the same pending job is never submitted twice.
+        token = acquire_run_lock()
+        if token is None:
+            raise CommandError("Another run_ai_batch is in progress.")
+        if ai_router.RATE_LIMIT_RPM and not ai_router.rate_limit_enforced():
+            self.stderr.write(
+                f"Warning: the default cache ({settings.CACHES['default']['BACKEND']}) is not shared with the "
+                "web workers; AI_RATE_LIMIT_RPM is not enforced and batches are capped by --max-requests only."
+            )
+        try:
+            self.run(options, token)
+        finally:
+            release_run_lock(token)
+            flush_usage()
+
+    def run(self, options, token):
+        if options['resummarize']:
+            notes = UserNote.objects.filter(summary_text__isnull=False)
+            if options['resummarize'] == 'failed':
+                notes = UserNote.objects.filter(reduce(or_, (Q(summary_text__startswith=p) for p in FAILED_SUMMARY_PREFIXES)))
+            self.stdout.write(f"Queued {enqueue_resummaries(notes)} re-summaries.")
+
+        self.collect()
+
+        if options['now'] or in_off_peak_window():
+            submitted, reason = submit_pending(options['max_requests'], lock_token=token)
+            if submitted:
+                self.stdout.write(f"Submitted {submitted} requests.")
+            if reason == LOST_RUN_LOCK:
+                raise CommandError(reason)
+            if reason:
+                self.stderr.write(f"Deferred: {reason}")
+        else:
+            start, end = OFF_PEAK_HOURS
+            self.stdout.write(f"Outside the off-peak window ({start:02d}:00-{end:02d}:00); nothing submitted.")
+
+        while options['wait'] and AIBatchJob.objects.filter(status='submitted').exists():
+            time.sleep(options['poll_interval'])
+            if not renew_run_lock(token):
+                raise CommandError("Lost the run lock to another run_ai_batch.")
+            self.collect()
+
+        pending = AIBatchJob.objects.filter(status='pending').count()
+        self.stdout.write(f"{pending} jobs waiting for the next run.")
+
+    def collect(self):
+        done, failed, running = collect_finished()
+        if done or failed:
+            self.stdout.write(f"Wrote back {done} results; {failed} jobs failed or were re-queued.")
+        if running:
+            self.stdout.write(f"{running} batches still running.")
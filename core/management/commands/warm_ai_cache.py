@@ -0,0 +1,86 @@
+# core/management/commands/warm_ai_cache.py
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.ai_utils import (
+    explain_topic_and_focus, explanation_cache_key, generate_quiz_pool, quiz_pool_cache_key, topic_index
+)
+from core.popularity import flush_topic_counts, most_popular_topics
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-generates explanations and quiz pools for the most requested topics so the "
+        "first students after a deploy or cache eviction are served from cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help="Number of most popular topics to warm.")
+        parser.add_argument('--concurrency', type=int, default=4, help="Maximum model calls in flight.")
+        parser.add_argument('--only', choices=['explanations', 'quizzes'], help="Warm only one kind of content.")
+        parser.add_argument('--refresh', action='store_true', help="Regenerate entries that are already cached.")
+
+    def handle(self, *args, **options):
+        backend = settings.CACHES['default']['BACKEND']
+        if backend.endswith('LocMemCache') or backend.endswith('DummyCache'):
+            self.stderr.write(
+                f"Warning: the default cache ({backend}) is not shared with the web workers; "
+                "warmed entries will only live in this process."
+            )
+
+        flush_topic_counts()
+        jobs = []
+        for entry in most_popular_topics(options['top']):
+            if options['only'] != 'quizzes' and entry.explanation_requests:
+                jobs.append(('explanation', entry.label))
+            # Topics with a hand-written quiz in QUIZ_DATA_MAP never call the model for quizzes.
+            if options['only'] != 'explanations' and entry.quiz_requests and not topic_index.exact_match(entry.label):
+                jobs.append(('quiz', entry.label))
+
+        if not options['refresh']:
+            jobs = [(kind, label) for kind, label in jobs if cache.get(self.cache_key(kind, label)) is None]
+
+        if not jobs:
+            self.stdout.write("Nothing to warm.")
+            return
+
+        self.stdout.write(f"Warming {len(jobs)} entries with concurrency {options['concurrency']}...")
+        started = time.perf_counter()
+        failures = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['concurrency'])) as pool:
+            futures = {pool.submit(self.warm, kind, label): (kind, label) for kind, label in jobs}
+            for future in as_completed(futures):
+                kind, label = futures[future]
+                error, elapsed = future.result()
+                if error:
+                    failures += 1
+                    self.stderr.write(f"  FAILED {kind:<12} {label}: {error}")
+                else:
+                    self.stdout.write(f"  ok     {kind:<12} {label} ({elapsed:.1f}s)")
+
+        self.stdout.write(
+            f"Warmed {len(jobs) - failures}/{len(jobs)} entries in {time.perf_counter() - started:.1f}s."
+        )
+
+    def cache_key(self, kind, label):
+        return explanation_cache_key(label) if kind == 'explanation' else quiz_pool_cache_key(label)
+
+    def warm(self, kind, label):
+        # Runs in a pool thread: single-flight rows and usage flushes open a DB
+        # connection here, and Django only closes connections of request threads.
+        started = time.perf_counter()
+        try:
+            if kind == 'explanation':
+                explanation = explain_topic_and_focus(label, refresh=True)
+                # Errors are returned as text and never cached, so the cache tells us if it worked.
+                error = None if cache.get(self.cache_key(kind, label)) == explanation else explanation
+            else:
+                _, error = generate_quiz_pool(label)
+            return error, time.perf_counter() - started
+        finally:
+            connection.close()
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_quiz_question_quizattempt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIRequestFlight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='running', max_length=10)),
+                ('result', models.TextField(blank=True, null=True)),
+                ('started_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='quiz',
+            name='topic',
+            field=models.CharField(help_text='The topic the quiz covers.', max_length=255),
+        ),
+    ]
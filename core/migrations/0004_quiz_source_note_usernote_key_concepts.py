@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_airequestflight_alter_quiz_topic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='source_note',
+            field=models.ForeignKey(blank=True, help_text='The uploaded note this quiz was generated from, if any.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='quizzes', to='core.usernote'),
+        ),
+        migrations.AddField(
+            model_name='usernote',
+            name='key_concepts',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_quiz_source_note_usernote_key_concepts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usernote',
+            name='previous_version',
+            field=models.ForeignKey(blank=True, help_text='The earlier upload of the same notes this one was summarized from.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='revisions', to='core.usernote'),
+        ),
+        migrations.CreateModel(
+            name='NotePage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.PositiveIntegerField()),
+                ('text_hash', models.CharField(db_index=True, max_length=40)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='core.usernote')),
+            ],
+            options={
+                'ordering': ['page_number'],
+                'unique_together': {('note', 'page_number')},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_usernote_previous_version_notepage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='join_code',
+            field=models.CharField(blank=True, help_text='Code other users enter to join this quiz; empty while the quiz is private.', max_length=12, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='leaderboard_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.IntegerField(default=0)),
+                ('total_questions', models.IntegerField(default=0)),
+                ('achieved_at', models.DateTimeField()),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='core.quiz')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['quiz', '-score', 'achieved_at'], name='leaderboard_rank_idx'), models.Index(fields=['quiz', 'version'], name='leaderboard_version_idx')],
+                'unique_together': {('quiz', 'user')},
+            },
+        ),
+        migrations.CreateModel(
+            name='QuizMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='core.quiz')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('quiz', 'user')},
+            },
+        ),
+    ]
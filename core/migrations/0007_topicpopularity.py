@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_quiz_join_code_quiz_leaderboard_version_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicPopularity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic_key', models.CharField(max_length=200, unique=True)),
+                ('label', models.CharField(help_text='Text used when regenerating content for this topic.', max_length=200)),
+                ('explanation_requests', models.PositiveBigIntegerField(default=0)),
+                ('quiz_requests', models.PositiveBigIntegerField(default=0)),
+                ('last_requested_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_aiusagerecord_aiusagedaily'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usernote',
+            name='file_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 of the PDF; keys the per-page reader cache.', max_length=64),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_usernote_file_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiusagedaily',
+            name='cached_tokens',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='aiusagerecord',
+            name='cached_tokens',
+            field=models.PositiveIntegerField(default=0, help_text='Input tokens served from a context cache.'),
+        ),
+        migrations.AlterField(
+            model_name='aiusagerecord',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(default=0, help_text='Uncached input tokens.'),
+        ),
+        migrations.CreateModel(
+            name='NoteChatMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('user', 'User'), ('model', 'Model')], max_length=5)),
+                ('text', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_messages', to='core.usernote')),
+            ],
+            options={
+                'ordering': ['created_at', 'pk'],
+            },
+        ),
+        migrations.CreateModel(
+            name='NoteContextCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_name', models.CharField(blank=True, help_text='Empty when the note is too short to cache.', max_length=255)),
+                ('model', models.CharField(max_length=64)),
+                ('token_count', models.PositiveIntegerField(default=0)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('note', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='context_cache', to='core.usernote')),
+            ],
+        ),
+    ]
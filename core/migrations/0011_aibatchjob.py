@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_aiusagedaily_cached_tokens_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIBatchJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('study_pack', 'Study pack'), ('summary', 'Summary')], max_length=16)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('submitted', 'Submitted'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('batch_name', models.CharField(blank=True, db_index=True, help_text='Remote batch the job was last submitted in.', max_length=255)),
+                ('batch_index', models.PositiveIntegerField(blank=True, help_text="Position of the job's request in that batch.", null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batch_jobs', to='core.usernote')),
+            ],
+            options={
+                'ordering': ['pk'],
+                'indexes': [models.Index(fields=['status', 'kind'], name='ai_batch_status_kind_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AIBatchRunLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('owner', models.CharField(blank=True, help_text='Token of the run holding the lease; empty when free.', max_length=32)),
+                ('locked_until', models.DateTimeField()),
+            ],
+        ),
+    ]
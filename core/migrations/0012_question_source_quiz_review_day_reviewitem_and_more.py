@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_aibatchjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='source',
+            field=models.ForeignKey(blank=True, help_text='The original question when this one was copied into a review quiz.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='copies', to='core.question'),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='review_day',
+            field=models.DateField(blank=True, help_text='Day of the spaced-repetition review this quiz was built for, if any.', null=True),
+        ),
+        migrations.CreateModel(
+            name='ReviewItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('easiness', models.FloatField(default=2.5)),
+                ('repetitions', models.PositiveSmallIntegerField(default=0, help_text='Correct answers in a row.')),
+                ('interval_days', models.PositiveIntegerField(default=0)),
+                ('lapses', models.PositiveIntegerField(default=0)),
+                ('due_on', models.DateField()),
+                ('last_reviewed_on', models.DateField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_items', to='core.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['due_on', 'user'], name='review_item_due_idx')],
+                'unique_together': {('user', 'question')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ReviewQueueEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('position', models.PositiveSmallIntegerField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_queue', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['position'],
+                'unique_together': {('user', 'day', 'position')},
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='quiz',
+            constraint=models.UniqueConstraint(fields=('user', 'review_day'), name='quiz_one_review_per_day'),
+        ),
+    ]
@@ -18,8 +18,23 @@ class UserNote(models.Model):
     pdf_file = models.FileField(
         upload_to='user_notes/pdfs/' 
     )
+    file_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text="SHA-256 of the PDF; keys the per-page reader cache."
+    )
     uploaded_at = models.DateTimeField(auto_now_add=True)
     summary_text = models.TextField(blank=True, null=True)
+    key_concepts = JSONField(default=list, blank=True)
+    previous_version = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='revisions',
+        help_text="The earlier upload of the same notes this one was summarized from."
+    )
 
     def __str__(self):
         return f"{self.title} ({self.user.username})"
@@ -27,13 +42,53 @@ class UserNote(models.Model):
     class Meta:
         ordering = ['-uploaded_at']
 
+class NotePage(models.Model):
+    """Per-page text fingerprint of an uploaded note, used to diff re-uploads."""
+    note = models.ForeignKey(UserNote, on_delete=models.CASCADE, related_name='pages')
+    page_number = models.PositiveIntegerField()
+    text_hash = models.CharField(max_length=40, db_index=True)
+
+    def __str__(self):
+        return f"Page {self.page_number + 1} of {self.note.title}"
+
+    class Meta:
+        ordering = ['page_number']
+        unique_together = [('note', 'page_number')]
+
 # --- Quiz Models ---
 
 class Quiz(models.Model):
     """Stores the main quiz details, linked to the user and a topic."""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quizzes')
     topic = models.CharField(max_length=255, help_text="The topic the quiz covers.")
+    source_note = models.ForeignKey(
+        UserNote,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='quizzes',
+        help_text="The uploaded note this quiz was generated from, if any."
+    )
+    join_code = models.CharField(
+        max_length=12,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Code other users enter to join this quiz; empty while the quiz is private."
+    )
+    leaderboard_version = models.PositiveBigIntegerField(default=0)
+    review_day = models.DateField(
+        null=True,
+        blank=True,
+        help_text="Day of the spaced-repetition review this quiz was built for, if any."
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # At most one review quiz per user and day; other quizzes have no review_day (NULLs never clash).
+            models.UniqueConstraint(fields=['user', 'review_day'], name='quiz_one_review_per_day'),
+        ]
     
     def __str__(self):
         return f"Quiz on {self.topic} for {self.user.username}"
@@ -42,6 +97,14 @@ class Question(models.Model):
     """Stores a question and its structure for a specific quiz."""
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='questions')
     data = JSONField() 
+    source = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='copies',
+        help_text="The original question when this one was copied into a review quiz."
+    )
 
     def __str__(self):
         return f"Q{self.pk} for Quiz: {self.quiz.topic}"
@@ -59,4 +122,233 @@ class QuizAttempt(models.Model):
         return f"{self.user.username}'s attempt on {self.quiz.topic}: {self.score}/{self.total_questions}"
 
     class Meta:
-        ordering = ['-attempted_at']
\ No newline at end of file
+        ordering = ['-attempted_at']
+
+# --- Spaced Repetition Models ---
+
+class ReviewItem(models.Model):
+    """SM-2 scheduling state of one question for one user, updated whenever the question is graded."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='review_items')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='review_items')
+    easiness = models.FloatField(default=2.5)
+    repetitions = models.PositiveSmallIntegerField(default=0, help_text="Correct answers in a row.")
+    interval_days = models.PositiveIntegerField(default=0)
+    lapses = models.PositiveIntegerField(default=0)
+    due_on = models.DateField()
+    last_reviewed_on = models.DateField()
+
+    def __str__(self):
+        return f"{self.user.username}: Q{self.question_id} due {self.due_on}"
+
+    class Meta:
+        unique_together = [('user', 'question')]
+        indexes = [
+            models.Index(fields=['due_on', 'user'], name='review_item_due_idx'),
+        ]
+
+class ReviewQueueEntry(models.Model):
+    """One question of a user's precomputed review for a day (built nightly by build_review_queues)."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='review_queue')
+    day = models.DateField()
+    position = models.PositiveSmallIntegerField()
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+')
+
+    def __str__(self):
+        return f"{self.user.username} {self.day} #{self.position + 1}: Q{self.question_id}"
+
+    class Meta:
+        ordering = ['position']
+        unique_together = [('user', 'day', 'position')]
+
+# --- Shared Quiz Models ---
+
+class QuizMembership(models.Model):
+    """A user who joined someone else's quiz with its join code."""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_memberships')
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user.username} in {self.quiz.topic}"
+
+    class Meta:
+        unique_together = [('quiz', 'user')]
+
+class LeaderboardEntry(models.Model):
+    """A user's best score on a quiz. `version` orders changes for incremental leaderboard sync."""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    score = models.IntegerField(default=0)
+    total_questions = models.IntegerField(default=0)
+    achieved_at = models.DateTimeField()
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.score}/{self.total_questions} on {self.quiz.topic}"
+
+    class Meta:
+        unique_together = [('quiz', 'user')]
+        indexes = [
+            models.Index(fields=['quiz', '-score', 'achieved_at'], name='leaderboard_rank_idx'),
+            models.Index(fields=['quiz', 'version'], name='leaderboard_version_idx'),
+        ]
+
+
+# --- AI Request Coordination ---
+
+class AIRequestFlight(models.Model):
+    """Cross-worker single-flight record for one in-flight (or just finished) model request."""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    fingerprint = models.CharField(max_length=64, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    result = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField()
+    completed_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    def __str__(self):
+        return f"Flight {self.fingerprint[:12]} ({self.status})"
+
+
+class TopicPopularity(models.Model):
+    """How often a canonical topic (see core.topics) is requested; counts are flushed in batches."""
+    topic_key = models.CharField(max_length=200, unique=True)
+    label = models.CharField(max_length=200, help_text="Text used when regenerating content for this topic.")
+    explanation_requests = models.PositiveBigIntegerField(default=0)
+    quiz_requests = models.PositiveBigIntegerField(default=0)
+    last_requested_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.label} ({self.explanation_requests + self.quiz_requests} requests)"
+
+
+class AIUsageRecord(models.Model):
+    """One model call in the usage ledger (written in batches by core.usage)."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='ai_usage')
+    feature = models.CharField(max_length=32)
+    model = models.CharField(max_length=64)
+    prompt_tokens = models.PositiveIntegerField(default=0, help_text="Uncached input tokens.")
+    cached_tokens = models.PositiveIntegerField(default=0, help_text="Input tokens served from a context cache.")
+    output_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    ok = models.BooleanField(default=True)
+    created_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.feature} on {self.model}: {self.prompt_tokens}+{self.output_tokens} tokens"
+
+
+class AIUsageDaily(models.Model):
+    """Daily rollup of AIUsageRecord: one row per day, user (or none), feature and model."""
+    day = models.DateField()
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='ai_usage_daily')
+    # Non-null copy of user_id (0 for system calls) so one plain unique key covers every row on every backend.
+    user_key = models.PositiveIntegerField(default=0, editable=False)
+    feature = models.CharField(max_length=32)
+    model = models.CharField(max_length=64)
+    calls = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    cached_tokens = models.PositiveBigIntegerField(default=0)
+    output_tokens = models.PositiveBigIntegerField(default=0)
+    total_latency_ms = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'AI usage (daily)'
+        verbose_name_plural = 'AI usage (daily)'
+        indexes = [
+            models.Index(fields=['day', 'user'], name='ai_usage_day_user_idx'),
+            models.Index(fields=['day', 'feature'], name='ai_usage_day_feature_idx'),
+        ]
+        unique_together = [('day', 'user_key', 'feature', 'model')]
+
+    def save(self, *args, **kwargs):
+        self.user_key = self.user_id or 0
+        super().save(*args, **kwargs)
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.output_tokens
+
+    def __str__(self):
+        return f"{self.day} {self.user or 'system'} {self.feature}/{self.model}: {self.total_tokens} tokens"
+
+
+class NoteContextCache(models.Model):
+    """A note's text held in a Gemini context cache, so chat questions don't resend it."""
+    note = models.OneToOneField(UserNote, on_delete=models.CASCADE, related_name='context_cache')
+    cache_name = models.CharField(max_length=255, blank=True, help_text="Empty when the note is too short to cache.")
+    model = models.CharField(max_length=64)
+    token_count = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Context cache for {self.note.title} ({self.cache_name or 'inline'})"
+
+
+class NoteChatMessage(models.Model):
+    """One question or answer in a "chat with your notes" conversation."""
+    ROLE_CHOICES = [
+        ('user', 'User'),
+        ('model', 'Model'),
+    ]
+
+    note = models.ForeignKey(UserNote, on_delete=models.CASCADE, related_name='chat_messages')
+    role = models.CharField(max_length=5, choices=ROLE_CHOICES)
+    text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'pk']
+
+    def __str__(self):
+        return f"{self.role}: {self.text[:50]}"
+
+
+class AIBatchJob(models.Model):
+    """A non-urgent summary or study pack for a note, run through the offline batch lane (core.batch)."""
+    KIND_CHOICES = [
+        ('study_pack', 'Study pack'),
+        ('summary', 'Summary'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('submitted', 'Submitted'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    note = models.ForeignKey(UserNote, on_delete=models.CASCADE, related_name='batch_jobs')
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    batch_name = models.CharField(max_length=255, blank=True, db_index=True, help_text="Remote batch the job was last submitted in.")
+    batch_index = models.PositiveIntegerField(blank=True, null=True, help_text="Position of the job's request in that batch.")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['pk']
+        indexes = [
+            models.Index(fields=['status', 'kind'], name='ai_batch_status_kind_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.note.title} ({self.status})"
+
+
+class AIBatchRunLock(models.Model):
+    """Lease held by the running `run_ai_batch`, so two runs never submit the same jobs."""
+    name = models.CharField(max_length=64, unique=True)
+    owner = models.CharField(max_length=32, blank=True, help_text="Token of the run holding the lease; empty when free.")
+    locked_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} ({'held' if self.owner else 'free'} until {self.locked_until})"
@@ -0,0 +1,131 @@
+# core/note_chat.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .ai_router import estimate_tokens
+from .ai_utils import (
+    NOTE_CACHE_EXPIRED, NOTE_CHAT_MODEL, NOTE_CONTEXT_CACHE_TTL_S, NOTE_CONTEXT_MIN_TOKENS,
+    answer_note_question, create_note_context_cache, delete_note_context_cache, extend_note_context_cache,
+    extract_pages_from_pdf,
+)
+from .models import NoteChatMessage, NoteContextCache
+from .page_reader import LRUCache, ensure_file_hash
+from .singleflight import fingerprint, single_flight
+
+# ----------------------------------------------------------------------
+# Chat With Notes
+# ----------------------------------------------------------------------
+# Each note has at most one NoteContextCache row pointing at its Gemini
+# context cache. The cache's TTL slides: once less than half of it is left
+# a question pushes it forward again, so an active conversation never
+# re-uploads the note while an abandoned one expires on its own. Deleting
+# the note (or replacing the cache) deletes the remote cache.
+
+HISTORY_MESSAGES = 6           # recent turns sent with each question
+EXPIRY_MARGIN = timedelta(seconds=60)
+INLINE_RETRY_AFTER = timedelta(minutes=5)  # how long to wait before retrying a failed cache upload
+TEXT_CACHE_SIZE = getattr(settings, 'NOTE_CHAT_TEXT_CACHE_SIZE', 32)  # notes whose extracted text is kept
+
+# Notes too short for a context cache are sent inline with every question;
+# keeping their text saves a sandboxed parse per question.
+_text_cache = LRUCache(TEXT_CACHE_SIZE)
+
+
+def _note_text(note):
+    """The note's full text, parsed once per file and kept for notes answered inline."""
+    file_hash = ensure_file_hash(note)
+    text = _text_cache.get(file_hash)
+    if text is None:
+        pages = extract_pages_from_pdf(note.pdf_file.path)
+        text = "".join(pages) if pages else ""
+        if pages is not None:
+            _text_cache.put(file_hash, text)
+    return text
+
+
+def _build_context(note, user):
+    """Creates (or replaces) the note's context cache. Returns the cache name ('' for inline)."""
+    text = _note_text(note)
+    now = timezone.now()
+    defaults = {
+        'cache_name': '',
+        'model': NOTE_CHAT_MODEL,
+        'token_count': estimate_tokens(text),
+        'expires_at': now + timedelta(seconds=NOTE_CONTEXT_CACHE_TTL_S),
+    }
+
+    if defaults['token_count'] >= NOTE_CONTEXT_MIN_TOKENS:
+        cached, error = create_note_context_cache(note.title, text, user=user)
+        if cached is not None:
+            defaults['cache_name'] = cached.name
+            defaults['expires_at'] = cached.expire_time or defaults['expires_at']
+        else:
+            # Answer inline for now and try caching again shortly.
+            print(f"Context cache creation failed, answering inline: {error}")
+            defaults['expires_at'] = now + INLINE_RETRY_AFTER
+
+    previous = NoteContextCache.objects.filter(note=note).values_list('cache_name', flat=True).first()
+    NoteContextCache.objects.update_or_create(note=note, defaults=defaults)
+    if previous and previous != defaults['cache_name']:
+        delete_note_context_cache(previous)
+    return defaults['cache_name']
+
+
+def get_note_context(note, user=None):
+    """Returns a usable NoteContextCache for the note, creating or extending the remote cache as needed."""
+    now = timezone.now()
+    context = NoteContextCache.objects.filter(note=note).first()
+    if context is not None and context.expires_at > now + EXPIRY_MARGIN:
+        half_life = timedelta(seconds=NOTE_CONTEXT_CACHE_TTL_S / 2)
+        if context.cache_name and context.expires_at < now + half_life:
+            expires_at = extend_note_context_cache(context.cache_name)
+            if expires_at:
+                context.expires_at = expires_at
+                context.save(update_fields=['expires_at'])
+        return context
+
+    # Concurrent first questions about the same note upload it once.
+    key = fingerprint('note_context', note.pk, note.file_hash, NOTE_CHAT_MODEL, context and context.cache_name)
+    single_flight(key, lambda: _build_context(note, user))
+    return NoteContextCache.objects.get(note=note)
+
+
+def ask_note(note, question, user=None):
+    """Answers a question about the note and stores both turns. Returns (answer, error)."""
+    history = [
+        (m.role, m.text)
+        for m in reversed(NoteChatMessage.objects.filter(note=note).order_by('-created_at', '-pk')[:HISTORY_MESSAGES])
+    ]
+
+    for attempt in range(2):
+        context = get_note_context(note, user)
+        pdf_text = None if context.cache_name else _note_text(note)
+        answer, error = answer_note_question(
+            note.title, question, history, cache_name=context.cache_name or None, pdf_text=pdf_text, user=user
+        )
+        if error != NOTE_CACHE_EXPIRED:
+            break
+        # Expired early on the server side: forget it and build a new one.
+        NoteContextCache.objects.filter(pk=context.pk).update(expires_at=timezone.now())
+
+    if answer is None:
+        return None, error
+
+    with transaction.atomic():
+        NoteChatMessage.objects.bulk_create([
+            NoteChatMessage(note=note, role='user', text=question),
+            NoteChatMessage(note=note, role='model', text=answer),
+        ])
+    return answer, None
+
+
+@receiver(post_delete, sender=NoteContextCache)
+def _delete_remote_context_cache(sender, instance, **kwargs):
+    if instance.cache_name:
+        name = instance.cache_name
+        transaction.on_commit(lambda: delete_note_context_cache(name))
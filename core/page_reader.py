@@ -0,0 +1,164 @@
+# core/page_reader.py
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .pdf_sandbox import PdfSandboxError, extract_pages
+
+# ----------------------------------------------------------------------
+# Lazy Per-Page Note Reader
+# ----------------------------------------------------------------------
+# The reader asks for one page at a time. Pages are extracted in the PDF
+# sandbox (core.pdf_sandbox), a window of pages per request, because a
+# round-trip to the sandbox costs more than extracting a few extra pages.
+# Extracted text is kept in an LRU keyed by (file hash, page). The window
+# after the current one is extracted in the background, so paging forward
+# is a cache hit.
+
+PAGE_CACHE_SIZE = getattr(settings, 'NOTE_PAGE_CACHE_SIZE', 1024)
+PREFETCH_PAGES = getattr(settings, 'NOTE_PAGE_PREFETCH', 3)
+WINDOW_PAGES = PREFETCH_PAGES + 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with a fixed number of entries."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.data.get(key)
+            if value is not None:
+                self.data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.data
+
+
+page_cache = LRUCache(PAGE_CACHE_SIZE)
+_prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='page-prefetch')
+_inflight = set()
+_inflight_lock = threading.Lock()
+
+
+def compute_file_hash(file_field):
+    """SHA-256 of a stored file, read in chunks."""
+    digest = hashlib.sha256()
+    file_field.open('rb')
+    try:
+        for chunk in file_field.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    finally:
+        file_field.close()
+    return digest.hexdigest()
+
+
+def ensure_file_hash(note):
+    """Returns the note's file hash, computing and saving it for notes uploaded before it existed."""
+    if not note.file_hash:
+        note.file_hash = compute_file_hash(note.pdf_file)
+        note.save(update_fields=['file_hash'])
+    return note.file_hash
+
+
+def _extract(file_hash, path, index):
+    """
+    Extracts the window of pages starting at zero-based `index`, caching
+    them. Returns (text, page_count) for page `index`; text is None past the end.
+    """
+    extraction = extract_pages(path, range(index, index + WINDOW_PAGES))
+    for page_index, text in extraction.pages.items():
+        page_cache.put((file_hash, page_index), text)
+    if extraction.page_count is not None:
+        page_cache.put((file_hash, 'count'), extraction.page_count)
+
+    if index in extraction.pages:
+        return extraction.pages[index], extraction.page_count
+    if extraction.page_count is not None and index >= extraction.page_count:
+        return None, extraction.page_count
+    error = extraction.error or f"Page {index + 1} could not be extracted."
+    if not extraction.transient:
+        # Remember a limit or parse failure so the page does not burn another sandbox run on every
+        # request. A busy sandbox or a timeout says nothing about the page and is retried.
+        page_cache.put((file_hash, index, 'failed'), error)
+    raise PdfSandboxError(error)
+
+
+def _prefetch(file_hash, path, index):
+    try:
+        if (file_hash, index) not in page_cache and (file_hash, index, 'failed') not in page_cache:
+            _extract(file_hash, path, index)
+    except Exception as e:
+        print(f"Page prefetch failed: {e}")
+    finally:
+        with _inflight_lock:
+            _inflight.discard((file_hash, index))
+
+
+def schedule_prefetch(file_hash, path, index, page_count):
+    """Extracts the next window in the background once a page after `index` is missing from the cache."""
+    for next_index in range(index + 1, min(index + 1 + PREFETCH_PAGES, page_count)):
+        key = (file_hash, next_index)
+        if key in page_cache:
+            continue
+        if (file_hash, next_index, 'failed') in page_cache:
+            return
+        with _inflight_lock:
+            if key in _inflight:
+                return
+            _inflight.add(key)
+        _prefetcher.submit(_prefetch, file_hash, path, next_index)
+        return
+
+
+def get_note_page(note, page_number):
+    """
+    Returns (text, page_count) for a 1-based page of the note's PDF; text is
+    None if the page does not exist. Schedules the following pages.
+    Raises PdfSandboxError if the page could not be extracted.
+    """
+    file_hash = ensure_file_hash(note)
+    path = note.pdf_file.path
+    index = page_number - 1
+
+    text = page_cache.get((file_hash, index))
+    page_count = page_cache.get((file_hash, 'count'))
+    if index < 0 or (page_count is not None and index >= page_count):
+        return None, page_count
+    failed = page_cache.get((file_hash, index, 'failed'))
+    if failed:
+        raise PdfSandboxError(failed)
+    if text is None or page_count is None:
+        text, page_count = _extract(file_hash, path, index)
+
+    if text is not None:
+        schedule_prefetch(file_hash, path, index, page_count)
+    return text, page_count
+
+
+def seed_page_cache(file_hash, extraction):
+    """
+    Caches the first pages of a PdfExtraction made elsewhere (e.g. during
+    upload). The page count is the one the PDF reports, not the number of
+    pages extracted, so pages after a partial extraction are still read.
+    """
+    for index in sorted(extraction.pages)[:PAGE_CACHE_SIZE // 4]:
+        page_cache.put((file_hash, index), extraction.pages[index] or "")
+    if extraction.page_count is not None:
+        page_cache.put((file_hash, 'count'), extraction.page_count)
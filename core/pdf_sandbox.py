@@ -0,0 +1,212 @@
+# core/pdf_sandbox.py
+import atexit
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+from django.conf import settings
+
+# ----------------------------------------------------------------------
+# Sandboxed PDF Extraction
+# ----------------------------------------------------------------------
+# Uploaded PDFs are untrusted. Deeply nested objects or huge content
+# streams can make pypdf use gigabytes of memory or spin for minutes, so
+# parsing never happens in the web worker. Extraction runs in
+# core/pdf_worker.py child processes with three limits:
+# - RLIMIT_AS caps their address space
+# - RLIMIT_CPU caps the CPU time of each request
+# - a wall-clock timer kills one that stalls
+# Pages are streamed back as they finish, so a limit only costs the pages
+# that were not reached. A per-worker semaphore caps concurrent extractions,
+# so one bad upload cannot starve everyone else's requests.
+#
+# Starting an interpreter and importing pypdf takes a few hundred
+# milliseconds, far more than extracting a page, so the children are kept
+# running (--serve) and reused: each web worker keeps up to MAX_CONCURRENT
+# idle readers, and a request to one is a pipe round-trip. A reader is
+# replaced after any failed request and after READER_MAX_REQUESTS requests.
+#
+# The children run with -E -s (and -P on Python 3.11+), so PYTHON* variables,
+# the user site-packages and the script's own directory are ignored. They
+# are given this process's sys.path instead, so pypdf imports the same way
+# from a virtualenv, a system install, a user-site install or PYTHONPATH.
+
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdf_worker.py')
+MAX_MEMORY_MB = getattr(settings, 'PDF_SANDBOX_MAX_MEMORY_MB', 512)
+CPU_SECONDS = getattr(settings, 'PDF_SANDBOX_CPU_SECONDS', 20)
+TIMEOUT_S = getattr(settings, 'PDF_SANDBOX_TIMEOUT_S', 30)
+MAX_CONCURRENT = getattr(settings, 'PDF_SANDBOX_MAX_CONCURRENT', 2)
+READER_MAX_REQUESTS = getattr(settings, 'PDF_SANDBOX_READER_MAX_REQUESTS', 200)
+
+EXIT_MEMORY = 3  # pdf_worker.EXIT_MEMORY
+INTERPRETER_FLAGS = ['-E', '-s'] + (['-P'] if sys.version_info >= (3, 11) else [])
+
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+_idle = []  # running readers not serving a request
+_idle_lock = threading.Lock()
+_idle_pid = os.getpid()
+
+
+class PdfSandboxError(Exception):
+    """Raised when a requested page could not be extracted."""
+
+
+class PdfExtraction:
+    """
+    Result of one sandboxed run: the pages extracted (index -> text), the page
+    count and why it stopped early, if it did. `transient` is set when it
+    stopped for a reason that says nothing about the file (busy, timed out).
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.page_count = None
+        self.error = None
+        self.transient = False
+
+    @property
+    def complete(self):
+        return self.error is None
+
+    def texts(self):
+        """Extracted page texts in page order."""
+        return [self.pages[i] for i in sorted(self.pages)]
+
+
+def _exit_reason(returncode, timed_out):
+    if timed_out:
+        return "PDF extraction timed out."
+    if returncode == EXIT_MEMORY:
+        return "PDF extraction exceeded its memory limit."
+    if hasattr(signal, 'SIGXCPU') and returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+        return "PDF extraction exceeded its CPU time limit."
+    if returncode < 0:
+        return f"PDF extraction was killed by signal {-returncode}."
+    return f"PDF extraction failed (exit code {returncode})."
+
+
+class _Reader:
+    """One long-lived pdf_worker --serve process."""
+
+    def __init__(self):
+        command = [
+            sys.executable, *INTERPRETER_FLAGS, WORKER_PATH, '--serve',
+            '--max-memory-mb', str(MAX_MEMORY_MB), '--cpu-seconds', str(CPU_SECONDS),
+            f'--sys-path={os.pathsep.join(p for p in sys.path if p)}',
+        ]
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding='utf-8',
+        )
+        self.requests = 0
+
+    def run(self, path, page_numbers, result, timeout):
+        """Streams one request's records into `result`. Returns True if the reader can serve another."""
+        request = {'path': os.fspath(path), 'pages': None if page_numbers is None else list(page_numbers)}
+        self.requests += 1
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            self.process.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+            for line in self.process.stdout:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # truncated by a kill
+                if record.get('done'):
+                    return result.complete
+                if 'page' in record:
+                    result.pages[record['page']] = record['text']
+                elif 'page_count' in record:
+                    result.page_count = record['page_count']
+                elif 'error' in record:
+                    result.error = record['error']
+        except OSError:
+            pass  # the reader died; its exit status says why
+        finally:
+            timer.cancel()
+
+        try:
+            returncode = self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            returncode = self.process.wait()
+        if timed_out.is_set():
+            result.transient = True
+        if result.error is None or timed_out.is_set():
+            result.error = _exit_reason(returncode, timed_out.is_set())
+        return False
+
+    def close(self):
+        self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+
+def _take_reader():
+    global _idle_pid
+    with _idle_lock:
+        if _idle_pid != os.getpid():
+            # Forked after readers were started: they belong to the parent.
+            _idle.clear()
+            _idle_pid = os.getpid()
+        while _idle:
+            reader = _idle.pop()
+            if reader.process.poll() is None:
+                return reader
+            reader.close()
+    return _Reader()
+
+
+def close_readers():
+    """Stops this process's idle readers; new ones are started on demand."""
+    with _idle_lock:
+        readers = list(_idle)
+        _idle.clear()
+    for reader in readers:
+        reader.close()
+
+
+def extract_pages(path, page_numbers=None, timeout=TIMEOUT_S):
+    """
+    Extracts the text of `page_numbers` (zero-based; default all pages) in a
+    sandboxed reader process. Always returns a PdfExtraction; on failure its
+    `error` is set and `pages` holds whatever was extracted before.
+    """
+    result = PdfExtraction()
+    if not _slots.acquire(timeout=timeout):
+        result.error = "Too many PDFs are being processed; try again shortly."
+        result.transient = True
+        return result
+    try:
+        reader = _take_reader()
+        reusable = reader.run(path, page_numbers, result, timeout)
+        if reusable and reader.requests < READER_MAX_REQUESTS:
+            with _idle_lock:
+                _idle.append(reader)
+        else:
+            reader.close()
+    except OSError as e:
+        result.error = f"Could not start PDF extraction: {e}"
+        result.transient = True
+        return result
+    finally:
+        _slots.release()
+
+    if not result.complete:
+        print(f"PDF extraction of {path} stopped early after {len(result.pages)} pages: {result.error}")
+    return result
+
+
+atexit.register(close_readers)
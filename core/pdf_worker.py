@@ -0,0 +1,151 @@
+# core/pdf_worker.py
+"""
+Extracts the text of PDFs inside a resource-limited child process. Started
+by core.pdf_sandbox; imports nothing from Django, so a hostile file can
+only exhaust this process.
+
+The address-space, file-size and core-dump limits are set before pypdf is
+imported; the CPU-time limit is re-armed for each request. Progress is
+streamed to stdout as JSON lines, so the parent keeps every page finished
+before a limit was hit:
+
+    {"page_count": N}
+    {"page": i, "text": "..."}     one line per extracted page, in order
+    {"error": "..."}               only if extraction stopped early
+
+With --serve the process stays up and reads one JSON request per line from
+stdin, {"path": "...", "pages": [0, 1, 2] or null}, answering each with the
+records above followed by {"done": true}. It exits on EOF, after a memory
+error, or when a limit kills it. Without --serve it extracts one file:
+
+    python core/pdf_worker.py notes.pdf --pages 0,1,2 --max-memory-mb 512 --cpu-seconds 20
+
+core.pdf_sandbox starts it with -E -s (-P) and passes its own sys.path as
+--sys-path, which is prepended before pypdf is imported.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:  # Windows: only the parent's wall-clock timeout applies
+    resource = None
+
+EXIT_ERROR = 2
+EXIT_MEMORY = 3
+OPEN_READERS = 4  # parsed documents kept by a serving worker, so paging through one note re-reads no xref
+
+
+def apply_limits(max_memory_mb):
+    if resource is None:
+        return
+    if max_memory_mb:
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))  # never needs to write a file
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def arm_cpu_limit(cpu_seconds):
+    """Allows `cpu_seconds` more CPU time from now; SIGXCPU (which kills the process) past that."""
+    if resource is None or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def emit(record):
+    sys.stdout.write(json.dumps(record) + "\n")
+    sys.stdout.flush()
+
+
+_readers = OrderedDict()  # (path, mtime, size) -> PdfReader
+
+
+def open_reader(path):
+    from pypdf import PdfReader
+
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    reader = _readers.get(key)
+    if reader is None:
+        reader = _readers[key] = PdfReader(path)
+        while len(_readers) > OPEN_READERS:
+            _readers.popitem(last=False)
+    _readers.move_to_end(key)
+    return reader
+
+
+def extract(path, pages):
+    reader = open_reader(path)
+    page_count = len(reader.pages)
+    emit({'page_count': page_count})
+    indices = range(page_count) if pages is None else [i for i in pages if 0 <= i < page_count]
+    for i in indices:
+        emit({'page': i, 'text': reader.pages[i].extract_text() or ""})
+
+
+def run(path, pages, cpu_seconds):
+    """Extracts one request; returns the exit code it would end a one-shot run with."""
+    arm_cpu_limit(cpu_seconds)
+    try:
+        extract(path, pages)
+    except MemoryError:
+        emit({'error': "Memory limit exceeded."})
+        return EXIT_MEMORY
+    except RecursionError:
+        emit({'error': "PDF structure is nested too deeply."})
+        return EXIT_ERROR
+    except Exception as e:
+        emit({'error': f"{type(e).__name__}: {e}"})
+        return EXIT_ERROR
+    return 0
+
+
+def serve(cpu_seconds):
+    # Imported once, under the limits, before the first request. If it fails, each request reports why.
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        pass
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        code = run(request['path'], request.get('pages'), cpu_seconds)
+        if code == EXIT_MEMORY:
+            return code  # the heap may be in any state; let the parent start a fresh worker
+        emit({'done': True})
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sandboxed PDF text extraction.")
+    parser.add_argument('path', nargs='?')
+    parser.add_argument('--serve', action='store_true', help="Answer requests from stdin until EOF.")
+    parser.add_argument('--pages', help="Comma-separated zero-based page numbers (default: all pages).")
+    parser.add_argument('--max-memory-mb', type=int, default=0)
+    parser.add_argument('--cpu-seconds', type=int, default=0)
+    parser.add_argument('--sys-path', default='', help="os.pathsep-separated import path (the parent's sys.path).")
+    args = parser.parse_args()
+
+    if args.sys_path:
+        sys.path[:0] = [p for p in args.sys_path.split(os.pathsep) if p not in sys.path]
+
+    apply_limits(args.max_memory_mb)
+    if args.serve:
+        return serve(args.cpu_seconds)
+    if args.path is None:
+        parser.error("a path is required without --serve")
+    pages = [int(p) for p in args.pages.split(',') if p] if args.pages is not None else None
+    return run(args.path, pages, args.cpu_seconds)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# core/popularity.py
+import atexit
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .ai_utils import topic_index
+from .models import TopicPopularity
+
+# ----------------------------------------------------------------------
+# Topic Popularity Counters
+# ----------------------------------------------------------------------
+# Requests are counted per normalized topic in process memory, so a page
+# view costs a dict increment instead of a DB write. A background thread in
+# each worker writes them as one batch every FLUSH_INTERVAL_S (sooner once
+# FLUSH_MAX_PENDING requests are waiting); whatever is left is written when
+# the worker exits. The counters live in the worker, so a cron job could
+# not flush them.
+#
+# Topics are free text, so the tracked keys are bounded: keys are the
+# normalized topic cut to MAX_KEY_LENGTH, a worker buffers at most
+# MAX_PENDING_KEYS distinct topics between flushes, and topics that resolve
+# to no canonical topic only get a new row while the table holds fewer than
+# MAX_TRACKED_TOPICS rows. Canonical topics are always counted.
+
+FLUSH_INTERVAL_S = getattr(settings, 'TOPIC_POPULARITY_FLUSH_S', 60)
+FLUSH_MAX_PENDING = getattr(settings, 'TOPIC_POPULARITY_MAX_PENDING', 500)
+MAX_PENDING_KEYS = getattr(settings, 'TOPIC_POPULARITY_MAX_PENDING_KEYS', 1000)
+MAX_TRACKED_TOPICS = getattr(settings, 'TOPIC_POPULARITY_MAX_TOPICS', 5000)
+MAX_KEY_LENGTH = 100
+KINDS = ('explanation', 'quiz')
+
+_lock = threading.Lock()
+_pending = Counter()   # (topic_key, kind) -> count
+_labels = {}           # topic_key -> label
+_canonical = set()     # pending topic keys that resolved to a canonical topic
+_pending_total = 0
+_wake = threading.Event()
+_flusher = None
+
+
+def record_topic_request(topic, kind):
+    """Counts one request for `topic` ('explanation' or 'quiz'). Never touches the database."""
+    global _pending_total
+    key = topic_index.analytics_key(topic)[:MAX_KEY_LENGTH].strip()
+    if not key or kind not in KINDS:
+        return
+    match = topic_index.resolve(topic)
+
+    with _lock:
+        if key not in _labels:
+            if len(_labels) >= MAX_PENDING_KEYS and not match:
+                return
+            _labels[key] = (match.name if match else topic.strip())[:200]
+            if match:
+                _canonical.add(key)
+        _pending[(key, kind)] += 1
+        _pending_total += 1
+        if _pending_total >= FLUSH_MAX_PENDING:
+            _wake.set()
+        _start_flusher()
+
+
+def _start_flusher():
+    """Starts this worker's flush thread on first use (and again after a fork). Call with _lock held."""
+    global _flusher
+    if _flusher is None or not _flusher.is_alive():
+        _flusher = threading.Thread(target=_flush_loop, name='topic-popularity-flush', daemon=True)
+        _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        _wake.wait(FLUSH_INTERVAL_S)
+        _wake.clear()
+        try:
+            flush_topic_counts()
+        finally:
+            connection.close()
+
+
+def flush_topic_counts():
+    """Writes pending counts to TopicPopularity. Returns the number of requests written."""
+    global _pending, _labels, _canonical, _pending_total
+    with _lock:
+        if not _pending:
+            return 0
+        pending, labels, canonical, total = _pending, _labels, _canonical, _pending_total
+        _pending, _labels, _canonical, _pending_total = Counter(), {}, set(), 0
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            existing = set(TopicPopularity.objects.filter(topic_key__in=labels).values_list('topic_key', flat=True))
+            room = MAX_TRACKED_TOPICS - TopicPopularity.objects.count()
+            new_keys = [key for key in labels if key not in existing and key in canonical]
+            new_keys += [key for key in labels if key not in existing and key not in canonical][:max(0, room - len(new_keys))]
+            TopicPopularity.objects.bulk_create(
+                [TopicPopularity(topic_key=key, label=labels[key], last_requested_at=now) for key in new_keys],
+                ignore_conflicts=True,
+            )
+            for key in existing.union(new_keys):
+                increments = {
+                    f'{kind}_requests': F(f'{kind}_requests') + pending[(key, kind)]
+                    for kind in KINDS if pending[(key, kind)]
+                }
+                TopicPopularity.objects.filter(topic_key=key).update(
+                    label=labels[key], last_requested_at=now, **increments
+                )
+    except Exception as e:
+        # Popularity is best-effort: put the counts back for the next flush rather than failing a request.
+        print(f"Topic popularity flush failed: {e}")
+        with _lock:
+            _pending.update(pending)
+            for key, label in labels.items():
+                _labels.setdefault(key, label)
+            _canonical.update(canonical)
+            _pending_total += total
+        return 0
+    return total
+
+
+def most_popular_topics(limit):
+    """Top topics by total requests, most popular first."""
+    return list(
+        TopicPopularity.objects
+        .annotate(total_requests=F('explanation_requests') + F('quiz_requests'))
+        .order_by('-total_requests', '-last_requested_at')[:limit]
+    )
+
+
+atexit.register(flush_topic_counts)
@@ -0,0 +1,179 @@
+# core/review.py
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Question, Quiz, ReviewItem, ReviewQueueEntry
+
+# ----------------------------------------------------------------------
+# Spaced Repetition (SM-2)
+# ----------------------------------------------------------------------
+# Every graded answer updates that question's SM-2 state for the user
+# (easiness, streak, interval, due date) in a couple of bulk queries. Only
+# the first answer of a day counts, so retaking a quiz straight away does
+# not push questions months out.
+#
+# Picking what to revise means scanning every due item, so that work runs
+# nightly (`manage.py build_review_queues`). It writes each user's top
+# REVIEW_QUEUE_SIZE questions for the day to ReviewQueueEntry. The "Today's
+# review" page reads that with one indexed query and copies the questions
+# into a quiz. No model calls are made.
+
+REVIEW_QUEUE_SIZE = getattr(settings, 'REVIEW_QUEUE_SIZE', 10)
+WRITE_BATCH_SIZE = 1000
+
+# SM-2 answer quality (0-5) for a multiple-choice answer.
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 1
+QUALITY_UNANSWERED = 0
+MIN_EASINESS = 1.3
+
+
+def apply_sm2(item, quality, today):
+    """Updates `item` in place for an answer of the given quality (0-5) on `today`."""
+    if quality >= 3:
+        if item.repetitions == 0:
+            item.interval_days = 1
+        elif item.repetitions == 1:
+            item.interval_days = 6
+        else:
+            item.interval_days = round(item.interval_days * item.easiness)
+        item.repetitions += 1
+    else:
+        if item.repetitions:
+            item.lapses += 1
+        item.repetitions = 0
+        item.interval_days = 1
+
+    miss = 5 - quality
+    item.easiness = max(MIN_EASINESS, item.easiness + 0.1 - miss * (0.08 + miss * 0.02))
+    item.due_on = today + timedelta(days=item.interval_days)
+    item.last_reviewed_on = today
+
+
+def correct_option_index(data):
+    """The question's correct option index, or None if its data has no valid one."""
+    index = data.get('correct_answer_index')
+    valid = isinstance(index, int) and not isinstance(index, bool) and 0 <= index < len(data.get('options') or [])
+    return index if valid else None
+
+
+def answer_quality(submitted, correct):
+    """
+    Maps a submitted option index (None or -1 if unanswered) to an SM-2
+    quality. Returns None when `correct` is None: a question without an
+    answer key cannot be graded and is not reviewed.
+    """
+    if correct is None:
+        return None
+    if submitted is None or submitted == -1 or submitted == '':
+        return QUALITY_UNANSWERED
+    return QUALITY_CORRECT if str(submitted) == str(correct) else QUALITY_WRONG
+
+
+def record_reviews(reviews, today=None):
+    """
+    Applies graded answers, given as (user_id, question_id, quality), to the
+    users' review items. Answers to review-quiz copies count for the
+    original question. Returns the number of items updated or created.
+    """
+    today = today or timezone.localdate()
+    reviews = list(reviews)
+    if not reviews:
+        return 0
+
+    question_ids = {question_id for _, question_id, _ in reviews}
+    sources = dict(
+        Question.objects.filter(pk__in=question_ids, source__isnull=False).values_list('pk', 'source_id')
+    )
+    reviews = [(user_id, sources.get(qid, qid), quality) for user_id, qid, quality in reviews]
+    question_ids = {question_id for _, question_id, _ in reviews}
+    user_ids = sorted({user_id for user_id, _, _ in reviews})
+
+    items = {}
+    for i in range(0, len(user_ids), WRITE_BATCH_SIZE):
+        for item in ReviewItem.objects.filter(user_id__in=user_ids[i:i + WRITE_BATCH_SIZE], question_id__in=question_ids):
+            items[(item.user_id, item.question_id)] = item
+
+    changed, created = {}, {}
+    for user_id, question_id, quality in reviews:
+        key = (user_id, question_id)
+        item = items.get(key)
+        if item is None:
+            item = items[key] = created[key] = ReviewItem(user_id=user_id, question_id=question_id)
+        elif item.last_reviewed_on >= today:
+            continue
+        else:
+            changed[key] = item
+        apply_sm2(item, quality, today)
+
+    with transaction.atomic():
+        ReviewItem.objects.bulk_update(
+            changed.values(),
+            ['easiness', 'repetitions', 'interval_days', 'lapses', 'due_on', 'last_reviewed_on'],
+            batch_size=WRITE_BATCH_SIZE,
+        )
+        # A concurrent grading of the same new question keeps whichever row landed first.
+        ReviewItem.objects.bulk_create(created.values(), batch_size=WRITE_BATCH_SIZE, ignore_conflicts=True)
+    return len(changed) + len(created)
+
+
+def build_review_queues(today=None, size=REVIEW_QUEUE_SIZE):
+    """
+    Rebuilds every user's review queue for `today`: the most overdue, then
+    hardest, due questions, at most `size` per user. Older queues are
+    dropped. Returns (users, entries).
+    """
+    today = today or timezone.localdate()
+    due = (
+        ReviewItem.objects
+        .filter(due_on__lte=today)
+        .order_by('user_id', 'due_on', 'easiness', 'question_id')
+        .values_list('user_id', 'question_id')
+    )
+
+    per_user = Counter()
+    batch = []
+    with transaction.atomic():
+        ReviewQueueEntry.objects.filter(day__lte=today).delete()
+        for user_id, question_id in due.iterator(chunk_size=WRITE_BATCH_SIZE):
+            position = per_user[user_id]
+            if position >= size:
+                continue
+            per_user[user_id] += 1
+            batch.append(ReviewQueueEntry(user_id=user_id, day=today, position=position, question_id=question_id))
+            if len(batch) >= WRITE_BATCH_SIZE:
+                ReviewQueueEntry.objects.bulk_create(batch)
+                batch = []
+        ReviewQueueEntry.objects.bulk_create(batch)
+    return len(per_user), sum(per_user.values())
+
+
+def todays_review(user, today=None):
+    """The user's precomputed queue for today, with each question and its quiz (one query)."""
+    return list(
+        ReviewQueueEntry.objects
+        .filter(user=user, day=today or timezone.localdate())
+        .select_related('question__quiz')
+    )
+
+
+def get_or_create_review_quiz(user, entries, today=None):
+    """Returns today's review quiz for the user, copying the queued questions into it on first use."""
+    today = today or timezone.localdate()
+    quiz = Quiz.objects.filter(user=user, review_day=today).first()
+    if quiz is not None:
+        return quiz
+    try:
+        with transaction.atomic():
+            quiz = Quiz.objects.create(user=user, topic=f"Review for {today:%B %d, %Y}", review_day=today)
+            Question.objects.bulk_create([
+                Question(quiz=quiz, data=entry.question.data, source=entry.question) for entry in entries
+            ])
+    except IntegrityError:
+        # A concurrent request (e.g. a double-clicked "Start review") created it first.
+        quiz = Quiz.objects.get(user=user, review_day=today)
+    return quiz
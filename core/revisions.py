@@ -0,0 +1,126 @@
+# core/revisions.py
+import hashlib
+import re
+
+from django.db.models import Count
+
+from .ai_utils import update_study_summary
+from .models import NotePage, UserNote
+from .pdf_sandbox import extract_pages
+
+# ----------------------------------------------------------------------
+# Note Versioning & Incremental Re-Summarization
+# ----------------------------------------------------------------------
+# Every upload stores one text hash per page. A re-upload is linked to the
+# previous version of the same notes (same title, or most pages shared),
+# and only the pages whose hash changed are sent to the model together
+# with the previous summary, so a revision costs in proportion to the edit.
+
+WHITESPACE_RE = re.compile(r'\s+')
+EMPTY_PAGE_HASH = hashlib.sha1(b'').hexdigest()
+
+NEAR_DUPLICATE_MIN_SHARE = 0.6   # share of new pages that must match an older upload
+MAX_CHANGED_SHARE = 0.5          # above this, a full re-summary is cheaper and better
+
+# summary_text values written when AI processing failed; never build on these
+FAILED_SUMMARY_PREFIXES = ('ERROR:', 'AI API Error', 'AI Quota Error', 'AI service is not configured', 'An unexpected error')
+
+
+def page_text_hash(text):
+    """Hash of a page's text, insensitive to whitespace and case differences."""
+    normalized = WHITESPACE_RE.sub(' ', text or '').strip().lower()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def save_page_hashes(note, hashes):
+    NotePage.objects.bulk_create([
+        NotePage(note=note, page_number=i, text_hash=h) for i, h in enumerate(hashes)
+    ])
+
+
+def find_previous_version(note, hashes):
+    """Returns the most likely earlier upload of the same notes, or None."""
+    candidates = UserNote.objects.filter(user=note.user, summary_text__isnull=False).exclude(pk=note.pk)
+
+    same_title = candidates.filter(title__iexact=note.title.strip(), pages__isnull=False).distinct().first()
+    if same_title:
+        return same_title
+
+    content_hashes = set(hashes) - {EMPTY_PAGE_HASH}
+    if not content_hashes:
+        return None
+
+    best = (
+        NotePage.objects
+        .filter(note__in=candidates, text_hash__in=content_hashes)
+        .values('note')
+        .annotate(shared=Count('text_hash', distinct=True))
+        .order_by('-shared', '-note')
+        .first()
+    )
+    if best and best['shared'] >= NEAR_DUPLICATE_MIN_SHARE * len(content_hashes):
+        return candidates.get(pk=best['note'])
+    return None
+
+
+def _page_runs(indices):
+    """Groups sorted page indices into contiguous (first, last) runs."""
+    runs = []
+    for i in indices:
+        if runs and i == runs[-1][1] + 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return runs
+
+
+def _sections(runs, page_texts):
+    """Builds (label, text) sections; `page_texts` maps page index to text."""
+    sections = []
+    for first, last in runs:
+        label = f"page {first + 1}" if first == last else f"pages {first + 1}-{last + 1}"
+        sections.append((label, "\n".join(page_texts.get(i, '') for i in range(first, last + 1))))
+    return sections
+
+
+def summarize_revision(note, previous, pages, hashes):
+    """
+    Summarizes `note` as a revision of `previous`, sending only changed pages.
+    Returns True on success, False if a full summary should be generated instead.
+    """
+    previous_hashes = list(previous.pages.values_list('text_hash', flat=True))
+    if not previous_hashes or not previous.summary_text or \
+            previous.summary_text.startswith(FAILED_SUMMARY_PREFIXES):
+        return False
+
+    previous_set, new_set = set(previous_hashes), set(hashes)
+    added = [i for i, h in enumerate(hashes) if h not in previous_set]
+    removed = [i for i, h in enumerate(previous_hashes) if h not in new_set]
+
+    if len(added) > MAX_CHANGED_SHARE * len(hashes):
+        return False
+
+    if not added and not removed:
+        # Identical content: reuse the previous result without a model call.
+        result = {'summary': previous.summary_text, 'key_concepts': previous.key_concepts}
+    else:
+        # Keyed by page index: a partial extraction may skip any of the removed pages.
+        removed_texts = extract_pages(previous.pdf_file.path, removed).pages if removed else {}
+        removed_runs = _page_runs([i for i in removed if i in removed_texts])
+
+        result, error = update_study_summary(
+            note.title,
+            previous.summary_text,
+            previous.key_concepts,
+            _sections(_page_runs(added), dict(enumerate(pages))),
+            _sections(removed_runs, removed_texts),
+            user=note.user,
+        )
+        if result is None:
+            print(f"Incremental summary failed, falling back to full summary: {error}")
+            return False
+
+    note.summary_text = result['summary']
+    note.key_concepts = result['key_concepts']
+    note.save(update_fields=['summary_text', 'key_concepts'])
+    return True
@@ -0,0 +1,163 @@
+# core/singleflight.py
+import hashlib
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+# ----------------------------------------------------------------------
+# Single-Flight Request Coalescing
+# ----------------------------------------------------------------------
+# When many students ask for the same thing at once, only the first caller
+# for a given fingerprint calls the model. Callers in the same process wait
+# on a threading.Event; callers in other workers find the AIRequestFlight
+# row created by the leader and poll it until the result is written.
+
+WAIT_TIMEOUT_S = getattr(settings, 'AI_SINGLEFLIGHT_WAIT_S', 120)
+RESULT_TTL_S = getattr(settings, 'AI_SINGLEFLIGHT_RESULT_TTL_S', 10)
+CROSS_WORKER = getattr(settings, 'AI_SINGLEFLIGHT_CROSS_WORKER', True)
+POLL_MIN_S = 0.05
+POLL_MAX_S = 0.5
+CLEANUP_AFTER = timedelta(hours=1)
+
+
+class SingleFlightError(Exception):
+    """Raised in waiting workers when the leader's upstream call failed."""
+
+
+class _LocalFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_local_flights = {}
+_local_lock = threading.Lock()
+
+
+def fingerprint(*parts):
+    """Stable SHA-256 fingerprint of the parts that determine a model response."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def single_flight(key, fn):
+    """
+    Returns fn() for `key`, running it at most once across concurrent
+    callers in this process and (through the database) in other workers.
+    `fn` must return a string.
+    """
+    with _local_lock:
+        flight = _local_flights.get(key)
+        is_leader = flight is None
+        if is_leader:
+            flight = _local_flights[key] = _LocalFlight()
+
+    if not is_leader:
+        if not flight.event.wait(WAIT_TIMEOUT_S):
+            return fn()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _cross_worker_flight(key, fn)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        flight.event.set()
+        with _local_lock:
+            _local_flights.pop(key, None)
+
+
+def _cross_worker_flight(key, fn):
+    from .models import AIRequestFlight
+
+    # Rows written inside an outer transaction are invisible to other workers.
+    if not CROSS_WORKER or transaction.get_connection().in_atomic_block:
+        return fn()
+
+    # Only the claim is guarded. An error raised by fn() itself must reach
+    # the caller; retrying it here would call the model a second time.
+    try:
+        is_leader = _claim(AIRequestFlight, key)
+    except Exception as e:
+        # Coordination is an optimisation; never fail the request because of it.
+        print(f"Single-flight coordination failed, calling directly: {e}")
+        return fn()
+
+    if is_leader:
+        return _lead(AIRequestFlight, key, fn)
+    return _wait(AIRequestFlight, key, fn)
+
+
+def _claim(AIRequestFlight, key):
+    """Returns True if this worker became the leader for `key`."""
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            AIRequestFlight.objects.create(fingerprint=key, started_at=now)
+        return True
+    except IntegrityError:
+        pass
+
+    existing = AIRequestFlight.objects.filter(fingerprint=key).first()
+    if existing is None:
+        return False
+    if existing.status == 'done' and existing.completed_at >= now - timedelta(seconds=RESULT_TTL_S):
+        return False
+    if existing.status == 'running' and existing.started_at >= now - timedelta(seconds=WAIT_TIMEOUT_S):
+        return False
+
+    # Stale result, failed flight or abandoned lease: take it over atomically.
+    return AIRequestFlight.objects.filter(
+        pk=existing.pk, started_at=existing.started_at, status=existing.status
+    ).update(status='running', started_at=now, completed_at=None, result=None) == 1
+
+
+def _lead(AIRequestFlight, key, fn):
+    try:
+        result = fn()
+    except Exception as e:
+        _finish(AIRequestFlight, key, status='failed', result=str(e))
+        raise
+
+    _finish(AIRequestFlight, key, status='done', result=result)
+    return result
+
+
+def _finish(AIRequestFlight, key, **fields):
+    # The caller already has its result (or error); a failed write only delays waiters.
+    now = timezone.now()
+    try:
+        AIRequestFlight.objects.filter(fingerprint=key).update(completed_at=now, **fields)
+        AIRequestFlight.objects.filter(completed_at__lt=now - CLEANUP_AFTER).delete()
+    except Exception as e:
+        print(f"Single-flight bookkeeping failed: {e}")
+
+
+def _wait(AIRequestFlight, key, fn):
+    deadline = time.monotonic() + WAIT_TIMEOUT_S
+    delay = POLL_MIN_S
+    while time.monotonic() < deadline:
+        row = AIRequestFlight.objects.filter(fingerprint=key).values('status', 'result').first()
+        if row is None:
+            break
+        if row['status'] == 'done':
+            return row['result']
+        if row['status'] == 'failed':
+            raise SingleFlightError(row['result'])
+        time.sleep(delay)
+        delay = min(delay * 2, POLL_MAX_S)
+
+    # Leader vanished or timed out: make the call ourselves.
+    return fn()
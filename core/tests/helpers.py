@@ -0,0 +1,148 @@
+import shutil
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from google import genai
+from google.genai import types
+from loadtest.fake_gemini import FakeGeminiConfig, start_fake_gemini
+
+from .. import ai_utils, usage
+from ..ai_router import ModelRouter
+from ..models import Question, Quiz, UserNote
+
+
+def make_pdf(page_texts):
+    """Builds a minimal PDF with one page per string; newlines start new text lines."""
+    objects = {3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    page_ids = []
+    for i, text in enumerate(page_texts):
+        lines = " ".join(f"({line}) '" for line in text.split("\n"))
+        stream = f"BT /F1 10 Tf 40 800 Td 12 TL {lines} ET".encode('latin-1')
+        content_id, page_id = 4 + 2 * i, 5 + 2 * i
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R >>" % content_id
+        page_ids.append(page_id)
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d /Resources << /Font << /F1 3 0 R >> >> >>" % (kids, len(page_ids))
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, objects[number])
+    xref = len(out)
+    size = max(objects) + 1
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    out += b"".join(b"%010d 00000 n \n" % offsets[number] for number in range(1, size))
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref)
+    return bytes(out)
+
+
+def page_text(label, lines=5):
+    return "\n".join(f"{label} line {i}: the quick brown fox jumps over the lazy dog" for i in range(lines))
+
+
+def make_note(user, pages=(), title='Notes', body=None, **fields):
+    """Saves a note whose PDF has one page per text in `pages`, or whose file is `body`."""
+    note = UserNote(user=user, title=title, **fields)
+    note.pdf_file.save('notes.pdf', ContentFile(make_pdf(pages) if body is None else body))
+    return note
+
+
+def patch_for_test(test, target, **values):
+    """Replaces attributes of `target` until the end of `test`."""
+    for name, value in values.items():
+        patcher = mock.patch.object(target, name, value)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+def reset_for_test(test, *caches):
+    """Empties process-wide caches before `test` and again after it."""
+    for shared in caches:
+        shared.clear()
+        test.addCleanup(shared.clear)
+
+
+def discard_buffered_usage():
+    """
+    Use as a module's tearDownModule when its tests call the model: the calls
+    stay in core.usage's buffer, for users whose test transactions were rolled
+    back, and its atexit flush would run after the test database is gone.
+    """
+    with usage._lock:
+        usage._records.clear()
+
+
+class MediaTestCase(TestCase):
+    """Runs each test against an empty, throwaway MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+
+def fake_response(text, prompt_tokens=10, output_tokens=5):
+    usage = SimpleNamespace(
+        prompt_token_count=prompt_tokens, candidates_token_count=output_tokens,
+        thoughts_token_count=0, cached_content_token_count=0,
+    )
+    return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class FakeClient:
+    """Stands in for genai.Client: `outcomes` maps a model name to a response or an exception to raise."""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.calls = []
+        self.prompts = []
+        self.models = SimpleNamespace(generate_content=self.generate_content)
+
+    def generate_content(self, model, contents, config=None):
+        self.calls.append(model)
+        self.prompts.append(contents)
+        outcome = self.outcomes[model]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class FakeGeminiMixin:
+    """
+    Points the app's Gemini client at a local loadtest.fake_gemini server.
+    `fake_config` holds the server's FakeGeminiConfig keyword arguments.
+    """
+    fake_config = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fake = start_fake_gemini(FakeGeminiConfig(**{'latency': 'fixed:0', 'seed': 1, **cls.fake_config}))
+        cls.addClassCleanup(cls.fake.server_close)
+        cls.addClassCleanup(cls.fake.shutdown)
+
+    def setUp(self):
+        super().setUp()
+        client = genai.Client(api_key='test-key', http_options=types.HttpOptions(base_url=self.fake.base_url))
+        self.fake_client = client
+        patch_for_test(self, ai_utils, client=client, router=ModelRouter(ai_utils.model_flash, ai_utils.model_pro))
+
+
+def make_quiz(user, correct_indices, topic='Foxes', options=3):
+    """A quiz with one question per entry of `correct_indices` (None: no answer key)."""
+    quiz = Quiz.objects.create(user=user, topic=topic)
+    for i, index in enumerate(correct_indices):
+        data = {'text': f'Question {i + 1}?', 'options': [f'Option {j}' for j in range(options)]}
+        if index is not None:
+            data['correct_answer_index'] = index
+        Question.objects.create(quiz=quiz, data=data)
+    return quiz
@@ -0,0 +1,108 @@
+from unittest import mock
+
+import httpx
+
+from django.test import TestCase
+from google.genai.errors import APIError
+
+from .. import ai_utils
+from ..ai_router import ModelRouter, estimate_tokens, truncate_to_tokens
+from .helpers import FakeClient, discard_buffered_usage, fake_response, patch_for_test
+
+
+tearDownModule = discard_buffered_usage
+
+
+class ModelRouterTests(TestCase):
+
+    def setUp(self):
+        self.router = ModelRouter(fast_model='fast', strong_model='strong')
+
+    def degrade(self, model):
+        for _ in range(10):
+            self.router.record(model, 100, ok=False)
+
+    def test_prefers_the_task_model(self):
+        self.assertEqual(self.router.candidates('summary', 100), ['fast', 'strong'])
+        self.assertEqual(self.router.candidates('quiz', 100), ['strong', 'fast'])
+
+    def test_prompts_over_the_strong_budget_never_reach_the_strong_model(self):
+        self.assertEqual(self.router.candidates('quiz', 9000), ['fast'])
+        self.assertEqual(self.router.candidates('summary', 5000), ['fast'])
+        self.degrade('fast')
+        self.assertEqual(self.router.candidates('summary', 5000), ['fast'])
+
+    def test_degraded_primary_swaps_with_healthy_fallback(self):
+        self.degrade('fast')
+        self.assertEqual(self.router.candidates('summary', 100), ['strong', 'fast'])
+        self.degrade('strong')
+        self.assertEqual(self.router.candidates('summary', 100), ['fast', 'strong'])
+
+    def test_slow_model_is_degraded(self):
+        for _ in range(10):
+            self.router.record('strong', 60000, ok=True)
+        self.assertEqual(self.router.candidates('quiz', 100), ['fast', 'strong'])
+
+
+class TokenEstimateTests(TestCase):
+
+    def test_estimate(self):
+        self.assertEqual(estimate_tokens(''), 0)
+        self.assertEqual(estimate_tokens('a cat sat.'), 4)
+        self.assertEqual(estimate_tokens('internationalization'), 5)
+
+    def test_truncate_keeps_whole_sentences(self):
+        text = 'One two three. Four five six. Seven eight nine.'
+        self.assertEqual(truncate_to_tokens(text, 9), 'One two three. Four five six.')
+        self.assertEqual(truncate_to_tokens(text, 100), text)
+
+    def test_truncate_falls_back_to_words(self):
+        self.assertEqual(truncate_to_tokens('one two three four five six', 4), 'one two three')
+
+
+class GenerateFallbackTests(TestCase):
+
+    def setUp(self):
+        self.router = ModelRouter(fast_model='fast', strong_model='strong')
+        patch_for_test(self, ai_utils, router=self.router)
+
+    def generate(self, outcomes, task='summary'):
+        self.client = FakeClient(outcomes)
+        with mock.patch.object(ai_utils, 'initialize_client', return_value=self.client):
+            return ai_utils._generate(task, 'Summarize this.')
+
+    def errors(self, model):
+        return self.router.health[model].snapshot()[1]
+
+    def test_server_error_falls_back_to_other_model(self):
+        response = self.generate({'fast': APIError(503, {}), 'strong': fake_response('ok')})
+        self.assertEqual(response.text, 'ok')
+        self.assertEqual(self.client.calls, ['fast', 'strong'])
+        self.assertEqual(self.errors('fast'), 1.0)
+
+    def test_timeout_falls_back_to_other_model(self):
+        response = self.generate({'fast': httpx.ReadTimeout('slow'), 'strong': fake_response('ok')})
+        self.assertEqual(response.text, 'ok')
+        self.assertEqual(self.errors('fast'), 1.0)
+
+    def test_client_errors_are_raised_without_fallback(self):
+        with self.assertRaises(APIError):
+            self.generate({'fast': APIError(400, {}), 'strong': fake_response('ok')})
+        self.assertEqual(self.client.calls, ['fast'])
+
+    def test_programming_errors_do_not_count_against_model_health(self):
+        with self.assertRaises(TypeError):
+            self.generate({'fast': TypeError('bad argument'), 'strong': fake_response('ok')})
+        self.assertEqual(self.client.calls, ['fast'])
+        self.assertEqual(self.router.health['fast'].snapshot()[0], 0)
+
+    def test_missing_client_raises_before_any_call(self):
+        with mock.patch.object(ai_utils, 'initialize_client', return_value=None):
+            with self.assertRaises(RuntimeError):
+                ai_utils._generate('summary', 'Summarize this.')
+        self.assertEqual(self.router.health['fast'].snapshot()[0], 0)
+
+    def test_last_error_is_raised_when_every_model_fails(self):
+        with self.assertRaises(APIError):
+            self.generate({'fast': APIError(503, {}), 'strong': APIError(429, {})})
+        self.assertEqual(self.client.calls, ['fast', 'strong'])
@@ -0,0 +1,126 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from .. import ai_router, batch
+from ..batch import (
+    acquire_run_lock, collect_finished, enqueue_note_job, release_run_lock, renew_run_lock, submit_pending,
+)
+from ..models import AIBatchJob
+from .helpers import (
+    FakeGeminiMixin, MediaTestCase, discard_buffered_usage, make_note, page_text, patch_for_test, reset_for_test,
+)
+
+
+tearDownModule = discard_buffered_usage
+
+
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        reset_for_test(self, cache)
+        patch_for_test(self, ai_router, RATE_LIMIT_RPM=10)
+
+    def test_unshared_cache_is_not_used_for_counting(self):
+        self.assertFalse(ai_router.rate_limit_enforced())
+        ai_router.count_calls('interactive', 8)
+        self.assertEqual(ai_router.calls_last_minute('interactive'), 0)
+        self.assertEqual(ai_router.batch_capacity(100), 100)
+
+    def test_shared_counters_leave_room_for_interactive_calls(self):
+        with mock.patch.object(ai_router, 'SHARED_COUNTER_BACKENDS', ('LocMemCache',)):
+            self.assertTrue(ai_router.rate_limit_enforced())
+            ai_router.count_calls('interactive', 4)
+            self.assertEqual(ai_router.batch_capacity(100), 6)
+            self.assertEqual(ai_router.batch_capacity(3), 3)
+            ai_router.count_calls('batch', 6)
+            self.assertEqual(ai_router.batch_capacity(100), 0)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://x'}})
+    def test_redis_counts_as_shared(self):
+        self.assertTrue(ai_router.rate_limit_enforced())
+        with mock.patch.object(ai_router, 'RATE_LIMIT_RPM', 0):
+            self.assertFalse(ai_router.rate_limit_enforced())
+
+
+class BatchLaneTests(FakeGeminiMixin, MediaTestCase):
+    fake_config = {'batch_seconds': 0}
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('owner')
+        self.note = make_note(self.user, [page_text('Alpha')], title='Foxes')
+
+    def test_jobs_are_submitted_and_written_back(self):
+        summary = enqueue_note_job(self.note, 'summary')
+        self.assertEqual(enqueue_note_job(self.note, 'summary'), summary)
+        self.assertEqual(submit_pending(10), (1, None))
+        summary.refresh_from_db()
+        self.assertEqual((summary.status, summary.attempts), ('submitted', 1))
+
+        self.assertEqual(collect_finished(), (1, 0, 0))
+        summary.refresh_from_db()
+        self.note.refresh_from_db()
+        self.assertEqual(summary.status, 'done')
+        self.assertIn('Fake response', self.note.summary_text)
+
+    def test_rejected_submissions_use_up_attempts(self):
+        job = enqueue_note_job(self.note, 'summary')
+        with mock.patch.object(batch, 'submit_batch', return_value=(None, 'AI API Error: bad request')):
+            for attempt in range(1, batch.MAX_ATTEMPTS + 1):
+                self.assertEqual(submit_pending(10), (0, 'AI API Error: bad request'))
+                job.refresh_from_db()
+                self.assertEqual(job.attempts, attempt)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(submit_pending(10), (0, None))
+        self.note.refresh_from_db()
+        self.assertTrue(self.note.summary_text.startswith('ERROR: Off-peak processing failed.'))
+
+    def test_run_lock_is_exclusive_until_released_or_expired(self):
+        token = acquire_run_lock()
+        self.assertIsNotNone(token)
+        self.assertIsNone(acquire_run_lock())
+        self.assertTrue(renew_run_lock(token))
+        release_run_lock(token)
+
+        stale = acquire_run_lock(ttl=timedelta(seconds=-1))
+        token = acquire_run_lock()
+        self.assertIsNotNone(token)
+        self.assertFalse(renew_run_lock(stale))
+        release_run_lock(stale)
+        self.assertIsNone(acquire_run_lock())
+
+    def test_submission_renews_the_lease_and_stops_once_it_is_lost(self):
+        for title in ['One', 'Two']:
+            enqueue_note_job(make_note(self.user, [page_text(title)], title=title), 'summary')
+        token = acquire_run_lock()
+        renewals = []
+
+        def renew(token, ttl=batch.RUN_LOCK_TTL):
+            renewals.append(token)
+            if len(renewals) == 2:
+                # The lease ran out while the first PDF was read and another run took it.
+                batch.AIBatchRunLock.objects.update(owner='other-run')
+            return renew_run_lock(token, ttl)
+
+        with mock.patch.object(batch, 'renew_run_lock', side_effect=renew):
+            self.assertEqual(submit_pending(10, lock_token=token), (0, batch.LOST_RUN_LOCK))
+        self.assertEqual(len(renewals), 2)
+        self.assertFalse(AIBatchJob.objects.exclude(status='pending').exists())
+
+    def test_command_submits_and_releases_the_lock(self):
+        enqueue_note_job(self.note, 'study_pack')
+        out, err = StringIO(), StringIO()
+        with mock.patch.object(ai_router, 'RATE_LIMIT_RPM', 10):
+            call_command('run_ai_batch', '--now', '--wait', '--poll-interval', '0', stdout=out, stderr=err)
+        self.assertIn('Submitted 1 requests.', out.getvalue())
+        self.assertIn('AI_RATE_LIMIT_RPM is not enforced', err.getvalue())
+        self.assertEqual(AIBatchJob.objects.get().status, 'done')
+        self.assertIsNotNone(acquire_run_lock())
+        with self.assertRaises(CommandError):
+            call_command('run_ai_batch', '--now', stdout=StringIO())
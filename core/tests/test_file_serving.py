@@ -0,0 +1,106 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from ..file_serving import parse_range_header, serve_protected_file
+from .helpers import MediaTestCase, make_note
+
+
+class ParseRangeHeaderTests(TestCase):
+
+    def test_single_and_open_ended_ranges(self):
+        self.assertEqual(parse_range_header('bytes=0-99', 1000), [(0, 99)])
+        self.assertEqual(parse_range_header('bytes=900-', 1000), [(900, 999)])
+        self.assertEqual(parse_range_header('bytes=950-2000', 1000), [(950, 999)])
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range_header('bytes=-100', 1000), [(900, 999)])
+        self.assertEqual(parse_range_header('bytes=-5000', 1000), [(0, 999)])
+
+    def test_overlapping_and_adjacent_ranges_are_merged(self):
+        self.assertEqual(parse_range_header('bytes=0-10,5-20,21-30,100-110', 1000), [(0, 30), (100, 110)])
+
+    def test_unsatisfiable_ranges(self):
+        self.assertEqual(parse_range_header('bytes=1000-1100', 1000), [])
+        self.assertEqual(parse_range_header('bytes=-0', 1000), [])
+
+    def test_invalid_headers_are_ignored(self):
+        for header in [None, '', 'items=0-1', 'bytes=abc', 'bytes=-', 'bytes=20-10']:
+            self.assertIsNone(parse_range_header(header, 1000), header)
+
+    def test_too_many_ranges_are_ignored(self):
+        header = 'bytes=' + ','.join(f'{i * 10}-{i * 10 + 1}' for i in range(30))
+        self.assertIsNone(parse_range_header(header, 1000))
+
+
+class NotePdfViewTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.body = bytes(range(256)) * 8
+        self.user = User.objects.create_user('owner')
+        self.note = make_note(self.user, body=self.body)
+        self.url = reverse('note_pdf', kwargs={'pk': self.note.pk})
+        self.client.force_login(self.user)
+
+    def test_full_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+
+    def test_filename_is_escaped(self):
+        request = RequestFactory().get(self.url)
+        for filename, expected in [
+            ('say "hi".pdf', 'inline; filename="say \\"hi\\".pdf"'),
+            ('résumé.pdf', "inline; filename*=utf-8''r%C3%A9sum%C3%A9.pdf"),
+        ]:
+            with self.subTest(filename=filename):
+                response = serve_protected_file(request, self.note.pdf_file, filename=filename)
+                self.assertEqual(response['Content-Disposition'], expected)
+                response.close()
+
+    def test_single_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.body)}')
+        self.assertEqual(b''.join(response.streaming_content), self.body[10:20])
+
+    def test_multiple_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3,100-103')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges'))
+        content = b''.join(response.streaming_content)
+        self.assertEqual(len(content), int(response['Content-Length']))
+        self.assertIn(self.body[0:4], content)
+        self.assertIn(self.body[100:104], content)
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.body)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.body)}')
+
+    def test_stale_if_range_sends_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_users_get_404(self):
+        self.client.force_login(User.objects.create_user('other'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @override_settings(NOTE_FILE_OFFLOAD='nginx', NOTE_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_nginx_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.note.pdf_file.name)
+        self.assertEqual(response.content, b'')
+
+    @override_settings(NOTE_FILE_OFFLOAD='apache')
+    def test_apache_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.note.pdf_file.path)
+
+    @override_settings(NOTE_FILE_OFFLOAD='ngnix')
+    def test_unknown_offload_mode_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.client.get(self.url)
@@ -0,0 +1,107 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import grading
+from ..grading import SubmissionFormatError, grade_submissions, load_answer_key, parse_submissions
+from ..models import LeaderboardEntry, QuizAttempt, QuizMembership, ReviewItem
+from .helpers import make_quiz
+
+
+class BatchGradingTests(TestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher')
+        self.quiz = make_quiz(self.teacher, [0, 1, 2])
+        self.question_ids, _, _ = load_answer_key(self.quiz)
+        for name in ['ann', 'bob']:
+            QuizMembership.objects.create(quiz=self.quiz, user=User.objects.create_user(name))
+
+    def test_csv_by_position_and_by_question_id(self):
+        q1, q2, q3 = self.question_ids
+        text = f"username,q1,question_{q2},{q3}\nann,A,1,2\nbob,,c,0\n"
+        self.assertEqual(parse_submissions(text, self.question_ids), {'ann': [0, 1, 2], 'bob': [-1, 2, 0]})
+
+    def test_json_lists_and_objects(self):
+        q1, q2, q3 = self.question_ids
+        text = json.dumps([
+            {'username': 'ann', 'answers': [0, 'B', None, 5]},
+            {'username': 'bob', 'answers': {f'question_{q3}': 2, str(q1): 'a'}},
+        ])
+        self.assertEqual(parse_submissions(text, self.question_ids), {'ann': [0, 1, -1], 'bob': [0, -1, 2]})
+
+    def test_malformed_submissions_are_rejected(self):
+        for text, fmt in [('', 'csv'), ('name,q1\nann,0', 'csv'), ('{bad', 'json'), ('"text"', 'json'),
+                          ('[{"username": "ann", "answers": 3}]', 'json')]:
+            with self.assertRaises(SubmissionFormatError, msg=text):
+                parse_submissions(text, self.question_ids, fmt)
+
+    def test_grades_known_students_and_reports_unknown_ones(self):
+        result = grade_submissions(self.quiz, {'ann': [0, 1, 2], 'bob': [0, 0, -1], 'zed': [0, 1, 2]}, with_feedback=False)
+        self.assertEqual(result['graded'], 2)
+        self.assertEqual(result['unknown_usernames'], ['zed'])
+        self.assertEqual(result['score_distribution'], {1: 1, 3: 1})
+        scores = dict(QuizAttempt.objects.filter(quiz=self.quiz).values_list('user__username', 'score'))
+        self.assertEqual(scores, {'ann': 3, 'bob': 1})
+
+    def test_only_owner_and_members_are_graded(self):
+        outsider = User.objects.create_user('eve')
+        other_quiz = make_quiz(self.teacher, [0, 1, 2])
+        QuizMembership.objects.create(quiz=other_quiz, user=outsider)
+        result = grade_submissions(self.quiz, {'teacher': [0, 1, 2], 'eve': [0, 1, 2]}, with_feedback=False)
+        self.assertEqual(result['unknown_usernames'], ['eve'])
+        self.assertEqual(list(QuizAttempt.objects.values_list('user__username', flat=True)), ['teacher'])
+        self.assertFalse(ReviewItem.objects.filter(user=outsider).exists())
+        self.assertFalse(LeaderboardEntry.objects.filter(user=outsider).exists())
+
+    def test_regrading_replaces_earlier_attempts(self):
+        grade_submissions(self.quiz, {'ann': [0, 0, 0]}, with_feedback=False)
+        grade_submissions(self.quiz, {'ann': [0, 1, 2]}, with_feedback=False)
+        self.assertEqual(list(QuizAttempt.objects.filter(quiz=self.quiz).values_list('score', flat=True)), [3])
+
+    def test_out_of_range_answers_are_rejected_before_writing(self):
+        for answers in [[0, 1, 3], [0, 1, -2], [0, 1, 99999], [0, 1, 10 ** 30]]:
+            with self.assertRaises(SubmissionFormatError, msg=answers):
+                grade_submissions(self.quiz, {'ann': [0, 1, 2], 'bob': answers}, with_feedback=False)
+        self.assertFalse(QuizAttempt.objects.exists())
+
+    def test_questions_without_a_key_score_for_nobody(self):
+        quiz = make_quiz(self.teacher, [0, None])
+        for user in User.objects.filter(username__in=['ann', 'bob']):
+            QuizMembership.objects.create(quiz=quiz, user=user)
+        grade_submissions(quiz, {'ann': [0, -1], 'bob': [-1, -1]}, with_feedback=False)
+        scores = dict(QuizAttempt.objects.filter(quiz=quiz).values_list('user__username', 'score'))
+        self.assertEqual(scores, {'ann': 1, 'bob': 0})
+        unkeyed = quiz.questions.order_by('pk').last()
+        self.assertFalse(ReviewItem.objects.filter(question=unkeyed).exists())
+
+    def test_feedback_once_per_bucket_and_pool_connections_closed(self):
+        with mock.patch.object(grading, 'generate_feedback', side_effect=lambda topic, score, total, user: f'{score}/{total}') as feedback, \
+                mock.patch.object(grading, 'connection') as pool_connection:
+            grade_submissions(self.quiz, {'ann': [0, 1, 2], 'bob': [0, 1, 2]})
+        self.assertEqual(feedback.call_count, 1)
+        self.assertEqual(pool_connection.close.call_count, 1)
+        self.assertEqual(set(QuizAttempt.objects.values_list('feedback_message', flat=True)), {'3/3'})
+
+    def test_api_reports_bad_answers_as_400(self):
+        self.client.force_login(self.teacher)
+        url = reverse('batch_grade', kwargs={'pk': self.quiz.pk})
+        body = json.dumps([{'username': 'ann', 'answers': ['99999', 0, 0]}])
+        response = self.client.post(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('question 1', response.json()['error'])
+
+        response = self.client.post(url, b'\xff\xfe', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_form_upload(self):
+        self.client.force_login(self.teacher)
+        upload = SimpleUploadedFile('class.csv', b'username,q1,q2,q3\nann,0,1,2\n', 'text/csv')
+        with mock.patch.object(grading, 'generate_feedback', return_value='Well done'):
+            response = self.client.post(reverse('batch_grade', kwargs={'pk': self.quiz.pk}), {'submissions': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result']['graded'], 1)
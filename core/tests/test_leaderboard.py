@@ -0,0 +1,97 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import leaderboard
+from ..leaderboard import FenwickTree, Leaderboard, ensure_join_code, get_leaderboard, record_scores
+from ..models import Quiz
+from .helpers import make_quiz, reset_for_test
+
+
+class LeaderboardTests(TestCase):
+
+    def setUp(self):
+        reset_for_test(self, leaderboard._boards)
+        self.owner = User.objects.create_user('teacher')
+        self.quiz = make_quiz(self.owner, [0, 0, 0, 0])
+        self.users = [User.objects.create_user(name) for name in ['ann', 'bob', 'cat', 'dan']]
+
+    def test_fenwick_prefix_sums(self):
+        tree = FenwickTree(5)
+        for index, delta in [(0, 1), (2, 3), (4, 2), (2, -1)]:
+            tree.add(index, delta)
+        self.assertEqual([tree.prefix(i) for i in range(5)], [1, 1, 3, 3, 5])
+        self.assertEqual(tree.prefix(10), 5)
+
+    def test_ranks_share_ties_and_top_orders_by_time(self):
+        now = timezone.now()
+        board = Leaderboard(self.quiz.pk, 4)
+        board.apply([
+            (1, 'ann', 3, now, 1), (2, 'bob', 4, now + timedelta(seconds=1), 1),
+            (3, 'cat', 3, now - timedelta(seconds=1), 1), (4, 'dan', 1, now, 1),
+        ], 1)
+        self.assertEqual([board.rank(i) for i in [1, 2, 3, 4, 5]], [2, 1, 2, 4, None])
+        self.assertEqual(board.top(3), [(1, 'bob', 4), (2, 'cat', 3), (2, 'ann', 3)])
+
+    def test_stale_rows_do_not_overwrite_newer_scores(self):
+        now = timezone.now()
+        board = Leaderboard(self.quiz.pk, 4)
+        board.apply([(1, 'ann', 4, now, 5)], 5)
+        board.apply([(1, 'ann', 2, now, 3)], 3)
+        self.assertEqual(board.top(1), [(1, 'ann', 4)])
+        self.assertEqual(board.version, 5)
+
+    def test_more_questions_than_expected_grow_the_board(self):
+        board = Leaderboard(self.quiz.pk, 2)
+        board.apply([(1, 'ann', 2, timezone.now(), 1), (2, 'bob', 5, timezone.now(), 2)], 2)
+        self.assertEqual(board.top(2), [(1, 'bob', 5), (2, 'ann', 2)])
+        board.apply([(1, 'ann', 1, timezone.now(), 1)], 3)
+        self.assertEqual(board.rank(1), 2)
+
+    def test_record_scores_keeps_best_score_and_bumps_version_once(self):
+        ann, bob = self.users[:2]
+        record_scores(self.quiz, [(ann.pk, 2, 4), (bob.pk, 3, 4)])
+        record_scores(self.quiz, [(ann.pk, 1, 4)])
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.leaderboard_version, 1)
+        record_scores(self.quiz, [(ann.pk, 4, 4)])
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.leaderboard_version, 2)
+        self.assertEqual(get_leaderboard(self.quiz).top(2), [(1, 'ann', 4), (2, 'bob', 3)])
+
+    def test_board_only_fetches_newer_entries(self):
+        ann, bob, cat = self.users[:3]
+        record_scores(self.quiz, [(ann.pk, 2, 4), (bob.pk, 3, 4)])
+        board = get_leaderboard(self.quiz)
+        with self.assertNumQueries(1):
+            self.assertIs(get_leaderboard(self.quiz), board)
+        record_scores(self.quiz, [(cat.pk, 4, 4)])
+        with self.assertNumQueries(2):
+            get_leaderboard(self.quiz)
+        self.assertEqual(board.rank(cat.pk), 1)
+        self.assertEqual(len(board), 3)
+
+    def test_join_code_is_created_once(self):
+        code = ensure_join_code(self.quiz)
+        self.assertEqual(len(code), leaderboard.JOIN_CODE_LENGTH)
+        self.assertEqual(ensure_join_code(Quiz.objects.get(pk=self.quiz.pk)), code)
+
+    def test_join_code_collision_draws_again(self):
+        Quiz.objects.filter(pk=make_quiz(self.owner, [0]).pk).update(join_code='AAAAAAAA')
+        draws = iter('A' * 8 + 'B' * 8)
+        with mock.patch.object(leaderboard.secrets, 'choice', side_effect=lambda alphabet: next(draws)):
+            self.assertEqual(ensure_join_code(self.quiz), 'BBBBBBBB')
+
+    def test_join_and_leaderboard_views(self):
+        ensure_join_code(self.quiz)
+        student = self.users[0]
+        self.client.force_login(student)
+        response = self.client.post(reverse('join_quiz'), {'code': self.quiz.join_code.lower()})
+        self.assertRedirects(response, reverse('take_quiz', kwargs={'pk': self.quiz.pk}))
+        record_scores(self.quiz, [(student.pk, 3, 4)])
+        response = self.client.get(reverse('quiz_leaderboard', kwargs={'pk': self.quiz.pk}))
+        self.assertEqual(response.context['my_rank'], 1)
@@ -0,0 +1,67 @@
+from django.test import TestCase
+from google.genai.errors import APIError
+from loadtest.fake_gemini import parse_latency
+from loadtest.run import find_saturation, percentile, summarize
+
+from .. import ai_utils
+from .helpers import FakeGeminiMixin, discard_buffered_usage
+
+
+tearDownModule = discard_buffered_usage
+
+
+class FakeGeminiServerTests(FakeGeminiMixin, TestCase):
+
+    def test_text_and_json_responses(self):
+        self.assertIn('Fake response', ai_utils._generate_text('summary', 'Summarize this.'))
+        pack, error = ai_utils.generate_study_pack('Some notes.', 'Title')
+        self.assertIsNone(error)
+        self.assertEqual(len(pack['quiz_questions']), 5)
+
+    def test_usage_is_reported(self):
+        response = ai_utils._generate('summary', 'Summarize this.')
+        self.assertGreater(response.usage_metadata.prompt_token_count, 0)
+        self.assertGreater(response.usage_metadata.candidates_token_count, 0)
+
+    def test_error_rate_fails_every_model(self):
+        self.fake.config.error_rate = 1.0
+        self.addCleanup(setattr, self.fake.config, 'error_rate', 0.0)
+        self.assertTrue(ai_utils.summarize_notes('Some notes.', 'Title').startswith('AI API Error'))
+        self.assertEqual(ai_utils.router.health[ai_utils.model_flash].snapshot()[1], 1.0)
+
+    def test_rpm_limit_returns_429(self):
+        self.fake.config.rpm_limit = 1
+        self.fake.config.recent_calls.clear()
+        self.addCleanup(setattr, self.fake.config, 'rpm_limit', 0)
+        ai_utils._generate('feedback', 'First call.', model=ai_utils.model_flash)
+        with self.assertRaises(APIError) as raised:
+            ai_utils._generate('feedback', 'Second call.', model=ai_utils.model_flash)
+        self.assertEqual(raised.exception.code, 429)
+
+
+class LoadTestReportTests(TestCase):
+
+    def test_parse_latency(self):
+        self.assertEqual(parse_latency('fixed:250')(), 0.25)
+        self.assertTrue(0.1 <= parse_latency('uniform:100:200')() <= 0.2)
+        with self.assertRaises(ValueError):
+            parse_latency('gaussian:1')
+
+    def test_percentiles_and_summary(self):
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(percentile([1, 2, 3, 4, 5, 6], 50), 3)
+        self.assertEqual(percentile(list(range(1, 101)), 99), 99)
+        samples = [('home', 200, 0.1), ('home', 500, 0.3), ('quiz_list', 200, 0.2)]
+        result = summarize(samples, duration=2)
+        self.assertEqual(result['overall']['requests'], 3)
+        self.assertEqual(result['overall']['errors'], 1)
+        self.assertEqual(result['urls']['home']['rps'], 1.0)
+
+    def test_saturation_is_the_last_level_that_still_scaled(self):
+        def level(rps, errors=0):
+            return {'overall': {'rps': rps, 'errors': errors, 'requests': 100}}
+
+        self.assertEqual(find_saturation([(1, level(10)), (2, level(19)), (4, level(20))]), 2)
+        self.assertEqual(find_saturation([(1, level(10)), (2, level(19)), (4, level(30, errors=5))]), 2)
+        self.assertIsNone(find_saturation([(1, level(10)), (2, level(20)), (4, level(40))]))
@@ -0,0 +1,77 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from .. import note_chat
+from ..models import NoteContextCache
+from ..note_chat import ask_note
+from .helpers import (
+    FakeGeminiMixin, MediaTestCase, discard_buffered_usage, make_note, page_text, patch_for_test, reset_for_test,
+)
+
+
+tearDownModule = discard_buffered_usage
+
+
+class NoteChatTests(FakeGeminiMixin, MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        reset_for_test(self, note_chat._text_cache.data)
+        self.fake.config.caches.clear()
+        self.user = User.objects.create_user('owner')
+        self.note = make_note(self.user, [page_text('Alpha'), page_text('Beta')], title='Foxes')
+        self.extract = mock.Mock(wraps=note_chat.extract_pages_from_pdf)
+        patch_for_test(self, note_chat, extract_pages_from_pdf=self.extract)
+
+    def live_caches(self):
+        return set(self.fake.config.caches)
+
+    def test_inline_note_is_parsed_once(self):
+        for question in ['What is Alpha?', 'And Beta?']:
+            answer, error = ask_note(self.note, question, user=self.user)
+            self.assertIsNone(error)
+            self.assertIn('Fake response', answer)
+        self.assertEqual(self.extract.call_count, 1)
+        self.assertEqual(NoteContextCache.objects.get(note=self.note).cache_name, '')
+        self.assertEqual(self.live_caches(), set())
+        self.assertEqual(
+            list(self.note.chat_messages.order_by('pk').values_list('role', flat=True)),
+            ['user', 'model', 'user', 'model'],
+        )
+
+    def test_long_note_is_answered_from_one_context_cache(self):
+        with mock.patch.object(note_chat, 'NOTE_CONTEXT_MIN_TOKENS', 10):
+            ask_note(self.note, 'What is Alpha?')
+            name = NoteContextCache.objects.get(note=self.note).cache_name
+            self.assertEqual(self.live_caches(), {name})
+            answer, error = ask_note(self.note, 'And Beta?')
+        self.assertIsNone(error)
+        self.assertEqual(self.live_caches(), {name})
+        self.assertEqual(self.extract.call_count, 1)
+
+    def test_expired_cache_is_rebuilt(self):
+        with mock.patch.object(note_chat, 'NOTE_CONTEXT_MIN_TOKENS', 10):
+            ask_note(self.note, 'What is Alpha?')
+            old = NoteContextCache.objects.get(note=self.note).cache_name
+            self.fake.config.caches.clear()  # expired early on the server side
+            answer, error = ask_note(self.note, 'And Beta?')
+        self.assertIsNone(error)
+        new = NoteContextCache.objects.get(note=self.note).cache_name
+        self.assertNotEqual(new, old)
+        self.assertEqual(self.live_caches(), {new})
+
+    def test_deleting_the_note_deletes_its_remote_cache(self):
+        with mock.patch.object(note_chat, 'NOTE_CONTEXT_MIN_TOKENS', 10):
+            ask_note(self.note, 'What is Alpha?')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.note.delete()
+        self.assertEqual(self.live_caches(), set())
+
+    def test_chat_view(self):
+        self.client.force_login(self.user)
+        url = reverse('note_chat', kwargs={'pk': self.note.pk})
+        self.assertRedirects(self.client.post(url, {'question': 'What is Alpha?'}), url)
+        response = self.client.get(url)
+        self.assertEqual([m['role'] for m in response.context['chat_messages']], ['user', 'model'])
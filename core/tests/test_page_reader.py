@@ -0,0 +1,51 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from .. import page_reader
+from ..page_reader import get_note_page
+from ..pdf_sandbox import PdfExtraction
+from .helpers import MediaTestCase, make_note, page_text, reset_for_test
+
+
+class NotePageViewTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        reset_for_test(self, page_reader.page_cache.data)
+        self.user = User.objects.create_user('owner')
+        self.note = make_note(self.user, [page_text('Alpha'), page_text('Beta')])
+        self.client.force_login(self.user)
+
+    def get(self, page):
+        return self.client.get(reverse('note_page', kwargs={'pk': self.note.pk, 'page': page}))
+
+    def test_reads_pages_and_caches_the_count(self):
+        with mock.patch.object(page_reader, 'schedule_prefetch'):
+            response = self.get(2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['page_count'], 2)
+        self.assertIn('Beta line 0', response.json()['text'])
+        with mock.patch.object(page_reader, 'extract_pages') as extract:
+            self.assertEqual(self.get(3).status_code, 404)
+        extract.assert_not_called()
+
+    def test_page_zero_is_not_found_without_extracting(self):
+        with mock.patch.object(page_reader, 'extract_pages') as extract:
+            response = self.get(0)
+        self.assertEqual(response.status_code, 404)
+        extract.assert_not_called()
+        self.assertIsNone(get_note_page(self.note, 0)[0])
+        self.assertEqual(self.get(1).status_code, 200)
+
+    def test_busy_or_timed_out_extraction_is_retried_but_parse_failures_are_remembered(self):
+        busy = PdfExtraction()
+        busy.error, busy.transient = "Too many PDFs are being processed; try again shortly.", True
+        broken = PdfExtraction()
+        broken.error = "PdfReadError: EOF marker not found"
+        with mock.patch.object(page_reader, 'extract_pages', side_effect=[busy, broken]) as extract:
+            self.assertEqual(self.get(1).status_code, 500)
+            self.assertEqual(self.get(1).status_code, 500)
+            self.assertEqual(self.get(1).status_code, 500)
+        self.assertEqual(extract.call_count, 2)
@@ -0,0 +1,94 @@
+import os
+import sys
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from .. import page_reader, pdf_sandbox
+from ..models import UserNote
+from ..pdf_sandbox import PdfExtraction, extract_pages
+from .helpers import MediaTestCase, make_pdf, page_text, reset_for_test
+
+
+FAKE_PYPDF = '''
+class _Page:
+    def __init__(self, i):
+        self.i = i
+
+    def extract_text(self):
+        return f"fake page {self.i}"
+
+
+class PdfReader:
+    def __init__(self, path):
+        self.pages = [_Page(0), _Page(1)]
+'''
+
+
+class PdfSandboxTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        reset_for_test(self, page_reader.page_cache.data)
+        pdf_sandbox.close_readers()
+        self.addCleanup(pdf_sandbox.close_readers)
+        self.body = make_pdf([page_text('Alpha'), page_text('Beta'), page_text('Gamma')])
+        self.path = os.path.join(self.media_root, 'notes.pdf')
+        with open(self.path, 'wb') as f:
+            f.write(self.body)
+
+    def test_extracts_pages_and_count(self):
+        extraction = extract_pages(self.path, [1, 7])
+        self.assertTrue(extraction.complete)
+        self.assertEqual(extraction.page_count, 3)
+        self.assertEqual(list(extraction.pages), [1])
+        self.assertIn('Beta line 0', extraction.pages[1])
+
+    def test_reader_process_is_reused_until_a_request_fails(self):
+        extract_pages(self.path, [0])
+        reader = pdf_sandbox._idle[-1]
+        self.assertIn('Gamma line 0', extract_pages(self.path, [2]).pages[2])
+        self.assertEqual(pdf_sandbox._idle, [reader])
+
+        missing = extract_pages(os.path.join(self.media_root, 'missing.pdf'))
+        self.assertIn('FileNotFoundError', missing.error)
+        self.assertFalse(missing.transient)
+        self.assertEqual(pdf_sandbox._idle, [])
+        self.assertIsNotNone(reader.process.poll())
+
+    def test_timeout_is_transient(self):
+        extraction = extract_pages(self.path, timeout=0.01)
+        self.assertEqual(extraction.error, "PDF extraction timed out.")
+        self.assertTrue(extraction.transient)
+        self.assertEqual(pdf_sandbox._idle, [])
+
+    def test_worker_imports_from_the_parent_sys_path_not_the_environment(self):
+        packages = os.path.join(self.media_root, 'site')
+        os.makedirs(os.path.join(packages, 'pypdf'))
+        with open(os.path.join(packages, 'pypdf', '__init__.py'), 'w') as f:
+            f.write(FAKE_PYPDF)
+        with mock.patch.object(sys, 'path', [packages, *sys.path]):
+            self.assertEqual(extract_pages(self.path).texts(), ['fake page 0', 'fake page 1'])
+        pdf_sandbox.close_readers()
+        with mock.patch.dict(os.environ, {'PYTHONPATH': packages}):
+            self.assertIn('Alpha line 0', extract_pages(self.path, [0]).pages[0])
+
+    def test_partial_upload_extraction_keeps_the_true_page_count(self):
+        partial = PdfExtraction()
+        partial.pages, partial.page_count, partial.error = {0: page_text('Alpha')}, 3, "PDF extraction timed out."
+        user = User.objects.create_user('owner')
+        self.client.force_login(user)
+        upload = SimpleUploadedFile('notes.pdf', self.body, 'application/pdf')
+        with mock.patch('core.views.extract_pages', return_value=partial), \
+                mock.patch('core.views.generate_study_pack', return_value=(None, 'offline')), \
+                mock.patch('core.views.summarize_notes', return_value='Summary'):
+            self.client.post(reverse('pdf_summarizer'), {'title': 'Notes', 'pdf_file': upload})
+        note = UserNote.objects.get(user=user)
+
+        with mock.patch.object(page_reader, 'schedule_prefetch'):
+            response = self.client.get(reverse('note_page', kwargs={'pk': note.pk, 'page': 3}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['page_count'], 3)
+        self.assertIn('Gamma line 0', response.json()['text'])
@@ -0,0 +1,126 @@
+import json
+import threading
+from collections import Counter
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import ai_utils, popularity, singleflight
+from ..management.commands import warm_ai_cache
+from ..models import TopicPopularity
+from ..popularity import flush_topic_counts, record_topic_request
+from .helpers import FakeGeminiMixin, discard_buffered_usage, patch_for_test, reset_for_test
+
+
+tearDownModule = discard_buffered_usage
+
+
+class TopicPopularityTests(TestCase):
+
+    def setUp(self):
+        fresh_state = {
+            '_pending': Counter(), '_labels': {}, '_canonical': set(), '_pending_total': 0,
+            '_wake': threading.Event(), '_start_flusher': mock.Mock(),
+        }
+        patch_for_test(self, popularity, **fresh_state)
+
+    def counts(self):
+        return {
+            row.topic_key: (row.label, row.explanation_requests, row.quiz_requests)
+            for row in TopicPopularity.objects.all()
+        }
+
+    def test_requests_are_counted_without_touching_the_database(self):
+        with self.assertNumQueries(0):
+            record_topic_request('Quantum Computing', 'explanation')
+            record_topic_request('quantum computing basics', 'quiz')
+            record_topic_request('ML', 'quiz')
+        popularity._start_flusher.assert_called()
+        self.assertEqual(flush_topic_counts(), 3)
+        self.assertEqual(self.counts(), {
+            'quantum computing': ('Quantum Computing', 1, 1),
+            'machine learning': ('Machine Learning', 0, 1),
+        })
+        record_topic_request('Quantum computing', 'quiz')
+        flush_topic_counts()
+        self.assertEqual(self.counts()['quantum computing'], ('Quantum computing', 1, 2))
+
+    def test_full_buffer_wakes_the_flusher(self):
+        with mock.patch.object(popularity, 'FLUSH_MAX_PENDING', 2):
+            record_topic_request('Robotics', 'quiz')
+            self.assertFalse(popularity._wake.is_set())
+            record_topic_request('Robotics', 'quiz')
+        self.assertTrue(popularity._wake.is_set())
+
+    def test_keys_are_normalized_and_truncated(self):
+        record_topic_request('x' * 500, 'quiz')
+        record_topic_request('   ', 'quiz')
+        record_topic_request('Robotics', 'homework')
+        flush_topic_counts()
+        self.assertEqual([len(key) for key in self.counts()], [popularity.MAX_KEY_LENGTH])
+
+    def test_pending_topics_are_capped_per_worker(self):
+        with mock.patch.object(popularity, 'MAX_PENDING_KEYS', 1):
+            for topic in ['Robotics', 'Quantum Computing', 'Turing Test', 'Robotics']:
+                record_topic_request(topic, 'quiz')
+        flush_topic_counts()
+        self.assertEqual(set(self.counts()), {'robotic', 'turing test'})
+        self.assertEqual(self.counts()['robotic'][2], 2)
+
+    def test_free_text_topics_stop_at_the_table_cap(self):
+        record_topic_request('Robotics', 'quiz')
+        flush_topic_counts()
+        with mock.patch.object(popularity, 'MAX_TRACKED_TOPICS', 3):
+            for topic in ['Quantum Computing', 'Cryptography', 'Robotics', 'Turing Test']:
+                record_topic_request(topic, 'quiz')
+            flush_topic_counts()
+        self.assertEqual(set(self.counts()), {'robotic', 'quantum computing', 'turing test'})
+        self.assertEqual(self.counts()['robotic'][2], 2)
+
+    def test_failed_flush_keeps_counts(self):
+        record_topic_request('Robotics', 'quiz')
+        with mock.patch.object(TopicPopularity.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+            self.assertEqual(flush_topic_counts(), 0)
+        self.assertEqual(flush_topic_counts(), 1)
+        self.assertEqual(self.counts(), {'robotic': ('Robotics', 0, 1)})
+
+
+class WarmAICacheTests(FakeGeminiMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        reset_for_test(self, cache)
+        # The command calls the model from a thread pool, outside this test's transaction.
+        patch_for_test(self, singleflight, CROSS_WORKER=False)
+        now = timezone.now()
+        TopicPopularity.objects.create(
+            topic_key='quantum computing', label='Quantum Computing', explanation_requests=3, quiz_requests=2,
+            last_requested_at=now,
+        )
+        TopicPopularity.objects.create(
+            topic_key='machine learning', label='Machine Learning', quiz_requests=5, last_requested_at=now,
+        )
+
+    def warm(self):
+        out = StringIO()
+        call_command('warm_ai_cache', '--concurrency', '1', stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_warms_explanations_and_pools_for_popular_topics(self):
+        self.assertIn('Warmed 2/2 entries', self.warm())
+        self.assertIn('Fake response', cache.get(ai_utils.explanation_cache_key('quantum computing basics')))
+        self.assertIsNone(cache.get(ai_utils.quiz_pool_cache_key('Machine Learning')))
+
+        quiz_json, error = ai_utils.generate_quiz_json('Quantum Computing', num_questions=3)
+        self.assertIsNone(error)
+        self.assertEqual(len(json.loads(quiz_json)['quiz_questions']), 3)
+        self.assertIn('Nothing to warm.', self.warm())
+
+    def test_pool_threads_close_their_connections(self):
+        with mock.patch.object(warm_ai_cache, 'connection') as thread_connection:
+            self.warm()
+        self.assertEqual(thread_connection.close.call_count, 2)
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Quiz, QuizAttempt, ReviewItem
+from ..review import (
+    QUALITY_CORRECT, QUALITY_UNANSWERED, QUALITY_WRONG, answer_quality, apply_sm2, build_review_queues,
+    correct_option_index, get_or_create_review_quiz, record_reviews,
+)
+from .helpers import make_quiz
+
+
+class ReviewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('ann')
+        self.quiz = make_quiz(self.user, [0, None, 1])
+        self.questions = list(self.quiz.questions.order_by('pk'))
+        self.today = timezone.localdate()
+
+    def test_sm2_intervals_grow_with_correct_answers_and_reset_on_a_miss(self):
+        item = ReviewItem(user=self.user, question=self.questions[0])
+        intervals = []
+        for day, quality in enumerate([QUALITY_CORRECT] * 3 + [QUALITY_WRONG]):
+            apply_sm2(item, quality, self.today + timedelta(days=day))
+            intervals.append(item.interval_days)
+        self.assertEqual(intervals[:2], [1, 6])
+        self.assertGreater(intervals[2], 6)
+        self.assertEqual((intervals[3], item.repetitions, item.lapses), (1, 0, 1))
+
+    def test_answer_quality(self):
+        self.assertEqual(answer_quality('1', 1), QUALITY_CORRECT)
+        self.assertEqual(answer_quality('2', 1), QUALITY_WRONG)
+        self.assertEqual(answer_quality(None, 1), QUALITY_UNANSWERED)
+        self.assertIsNone(answer_quality(None, None))
+        self.assertIsNone(correct_option_index({'options': ['a'], 'correct_answer_index': 3}))
+        self.assertIsNone(correct_option_index({'options': ['a', 'b'], 'correct_answer_index': True}))
+
+    def test_unkeyed_questions_score_for_nobody_and_are_not_reviewed(self):
+        self.client.force_login(self.user)
+        answers = {f'question_{self.questions[0].pk}': '0'}  # unkeyed and third question left blank
+        with mock.patch('core.views.generate_feedback', return_value='Well done'):
+            self.client.post(reverse('grade_quiz', kwargs={'pk': self.quiz.pk}), answers)
+        attempt = QuizAttempt.objects.get(user=self.user, quiz=self.quiz)
+        self.assertEqual((attempt.score, attempt.total_questions), (1, 3))
+        reviewed = set(ReviewItem.objects.filter(user=self.user).values_list('question_id', flat=True))
+        self.assertEqual(reviewed, {self.questions[0].pk, self.questions[2].pk})
+
+    def test_review_quiz_is_created_once_per_day(self):
+        yesterday = self.today - timedelta(days=1)
+        record_reviews([(self.user.pk, q.pk, QUALITY_WRONG) for q in self.questions], today=yesterday)
+        self.assertEqual(build_review_queues(self.today), (1, 3))
+        self.client.force_login(self.user)
+        first = self.client.post(reverse('review'))
+        second = self.client.post(reverse('review'))
+        self.assertEqual(first['Location'], second['Location'])
+        quiz = Quiz.objects.get(user=self.user, review_day=self.today)
+        self.assertEqual(quiz.questions.count(), 3)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Quiz.objects.create(user=self.user, topic='Again', review_day=self.today)
+
+    def test_concurrent_creation_returns_the_existing_quiz(self):
+        existing = Quiz.objects.create(user=self.user, topic='Review', review_day=self.today)
+        with mock.patch('django.db.models.query.QuerySet.first', return_value=None):
+            quiz = get_or_create_review_quiz(self.user, [], today=self.today)
+        self.assertEqual(quiz, existing)
+        self.assertEqual(Quiz.objects.filter(review_day=self.today).count(), 1)
@@ -0,0 +1,84 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+
+from .. import ai_utils, revisions
+from ..models import UserNote
+from ..pdf_sandbox import PdfExtraction
+from ..revisions import find_previous_version, page_text_hash, save_page_hashes, summarize_revision
+from .helpers import FakeClient, MediaTestCase, discard_buffered_usage, fake_response, make_note, page_text
+
+
+tearDownModule = discard_buffered_usage
+
+
+REVISION = {'summary': 'Updated summary.', 'key_concepts': ['Foxes']}
+
+
+class RevisionTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('student')
+        self.old_pages = [page_text(f'Page {i}') for i in range(1, 7)]
+        self.previous = self.make_note('Foxes', self.old_pages, summary='Old summary.')
+
+    def make_note(self, title, pages, summary=None):
+        note = make_note(self.user, pages, title=title, summary_text=summary, key_concepts=['Dogs'])
+        save_page_hashes(note, [page_text_hash(page) for page in pages])
+        return note
+
+    def revise(self, new_pages, client=None):
+        note = self.make_note('Foxes', new_pages)
+        hashes = [page_text_hash(page) for page in new_pages]
+        client = client or FakeClient({ai_utils.model_flash: fake_response(json.dumps(REVISION))})
+        with mock.patch.object(ai_utils, 'initialize_client', return_value=client):
+            ok = summarize_revision(note, self.previous, new_pages, hashes)
+        return note, ok, client
+
+    def test_page_hash_ignores_whitespace_and_case(self):
+        self.assertEqual(page_text_hash('Foo  Bar\n'), page_text_hash('foo bar'))
+
+    def test_previous_version_found_by_title_or_shared_pages(self):
+        hashes = [page_text_hash(page) for page in self.old_pages]
+        renamed = UserNote.objects.create(user=self.user, title='Renamed', pdf_file='x.pdf')
+        self.assertEqual(find_previous_version(renamed, hashes), self.previous)
+        unrelated = UserNote.objects.create(user=self.user, title='Other', pdf_file='y.pdf')
+        self.assertIsNone(find_previous_version(unrelated, [page_text_hash('something else')]))
+
+    def test_identical_reupload_makes_no_model_call(self):
+        note, ok, client = self.revise(self.old_pages)
+        self.assertTrue(ok)
+        self.assertEqual(client.calls, [])
+        note.refresh_from_db()
+        self.assertEqual(note.summary_text, 'Old summary.')
+
+    def test_only_changed_pages_are_sent(self):
+        new_pages = self.old_pages[:2] + [page_text('Rewritten')] + self.old_pages[3:]
+        note, ok, client = self.revise(new_pages)
+        self.assertTrue(ok)
+        self.assertEqual(len(client.calls), 1)
+        prompt = client.prompts[0]
+        self.assertIn('Rewritten line 0', prompt)
+        self.assertIn('Page 3 line 0', prompt)
+        self.assertNotIn('Page 1 line 0', prompt)
+        note.refresh_from_db()
+        self.assertEqual(note.summary_text, 'Updated summary.')
+
+    def test_large_changes_fall_back_to_a_full_summary(self):
+        note, ok, client = self.revise([page_text(f'New {i}') for i in range(6)])
+        self.assertFalse(ok)
+        self.assertEqual(client.calls, [])
+
+    def test_removed_texts_are_keyed_by_page_index(self):
+        # Pages 2 and 3 were removed, but only page 3 could be re-extracted from the old PDF.
+        partial = PdfExtraction()
+        partial.pages = {2: 'old page three'}
+        partial.error = 'PDF extraction exceeded its CPU time limit.'
+        new_pages = [self.old_pages[0]] + self.old_pages[3:]
+        with mock.patch.object(revisions, 'extract_pages', return_value=partial), \
+                mock.patch.object(revisions, 'update_study_summary', return_value=(REVISION, None)) as update:
+            self.revise(new_pages)
+        removed_sections = update.call_args.args[4]
+        self.assertEqual(removed_sections, [('page 3', 'old page three')])
@@ -0,0 +1,51 @@
+import importlib
+import os
+import sys
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+
+
+PRODUCTION_ENV = {'SECRET_KEY': 'test-secret', 'ALLOWED_HOSTS': 'studyai.example.com, www.studyai.example.com'}
+
+
+class ProductionSettingsTests(TestCase):
+
+    def load(self, **env):
+        clean = {name: '' for name in ['SECRET_KEY', 'ALLOWED_HOSTS', 'REDIS_URL', 'MEMCACHED_LOCATION', 'SESSION_ENGINE']}
+        with mock.patch.dict(os.environ, {**clean, **env}):
+            sys.modules.pop('StudyAI_Project.settings_production', None)
+            try:
+                return importlib.import_module('StudyAI_Project.settings_production')
+            finally:
+                sys.modules.pop('StudyAI_Project.settings_production', None)
+
+    def test_secret_key_and_hosts_are_required(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.load(ALLOWED_HOSTS='studyai.example.com')
+        with self.assertRaises(ImproperlyConfigured):
+            self.load(SECRET_KEY='default-insecure-key-for-local-use-only', ALLOWED_HOSTS='studyai.example.com')
+        with self.assertRaises(ImproperlyConfigured):
+            self.load(SECRET_KEY='test-secret')
+
+    def test_hosts_come_from_the_environment(self):
+        production = self.load(**PRODUCTION_ENV)
+        self.assertEqual(production.ALLOWED_HOSTS, ['studyai.example.com', 'www.studyai.example.com'])
+        self.assertFalse(production.DEBUG)
+
+    def test_sessions_skip_the_database(self):
+        self.assertEqual(self.load(**PRODUCTION_ENV).SESSION_ENGINE, 'django.contrib.sessions.backends.signed_cookies')
+        with_redis = self.load(REDIS_URL='redis://localhost:6379/0', **PRODUCTION_ENV)
+        self.assertEqual(with_redis.SESSION_ENGINE, 'django.contrib.sessions.backends.cached_db')
+        self.assertEqual(with_redis.CACHES['default']['BACKEND'], 'django.core.cache.backends.redis.RedisCache')
+
+    def test_development_settings_are_not_modified(self):
+        from StudyAI_Project import settings as development
+
+        production = self.load(**PRODUCTION_ENV)
+        self.assertTrue(development.TEMPLATES[0]['APP_DIRS'])
+        self.assertNotIn('loaders', development.TEMPLATES[0]['OPTIONS'])
+        self.assertNotIn('CONN_MAX_AGE', development.DATABASES['default'])
+        self.assertIn('loaders', production.TEMPLATES[0]['OPTIONS'])
+        self.assertNotIn('django_browser_reload', production.INSTALLED_APPS)
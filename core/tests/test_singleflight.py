@@ -0,0 +1,89 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from .. import singleflight
+from ..models import AIRequestFlight
+from ..singleflight import SingleFlightError, fingerprint, single_flight
+
+
+class SingleFlightTests(TransactionTestCase):
+    """Not wrapped in a transaction: cross-worker coordination is skipped inside atomic blocks."""
+
+    def test_fingerprint_is_stable_and_order_sensitive(self):
+        self.assertEqual(fingerprint('quiz', 'topic', None), fingerprint('quiz', 'topic', None))
+        self.assertNotEqual(fingerprint('quiz', 'a', 'b'), fingerprint('quiz', 'b', 'a'))
+
+    def test_concurrent_callers_share_one_call(self):
+        calls = []
+        results = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'answer'
+
+        def worker():
+            try:
+                results.append(single_flight('same-key', fn))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['answer'] * 5)
+        self.assertEqual(AIRequestFlight.objects.get(fingerprint='same-key').status, 'done')
+
+    def test_upstream_failure_is_not_retried(self):
+        calls = []
+
+        def fn():
+            calls.append(1)
+            raise ValueError('model failed')
+
+        with self.assertRaises(ValueError):
+            single_flight('failing-key', fn)
+        self.assertEqual(len(calls), 1)
+        flight = AIRequestFlight.objects.get(fingerprint='failing-key')
+        self.assertEqual((flight.status, flight.result), ('failed', 'model failed'))
+
+    def test_coordination_failure_calls_directly(self):
+        with mock.patch.object(singleflight, '_claim', side_effect=RuntimeError('db down')):
+            self.assertEqual(single_flight('key', lambda: 'direct'), 'direct')
+
+    def test_recent_result_from_another_worker_is_reused(self):
+        now = timezone.now()
+        AIRequestFlight.objects.create(
+            fingerprint='shared', status='done', result='from other worker', started_at=now, completed_at=now,
+        )
+        self.assertEqual(single_flight('shared', lambda: self.fail('should not call the model')), 'from other worker')
+
+    def test_waiter_sees_leader_failure(self):
+        AIRequestFlight.objects.create(fingerprint='running', started_at=timezone.now())
+
+        def leader_fails():
+            time.sleep(0.2)
+            AIRequestFlight.objects.filter(fingerprint='running').update(status='failed', result='upstream 500')
+            connection.close()
+
+        thread = threading.Thread(target=leader_fails)
+        thread.start()
+        with self.assertRaises(SingleFlightError):
+            single_flight('running', lambda: self.fail('should not call the model'))
+        thread.join()
+
+    def test_stale_result_is_taken_over(self):
+        old = timezone.now() - timedelta(minutes=5)
+        AIRequestFlight.objects.create(fingerprint='stale', status='done', result='old', started_at=old, completed_at=old)
+        self.assertEqual(single_flight('stale', lambda: 'new'), 'new')
+        self.assertEqual(AIRequestFlight.objects.get(fingerprint='stale').result, 'new')
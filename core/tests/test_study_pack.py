@@ -0,0 +1,68 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from .. import ai_utils
+from ..models import Quiz, UserNote
+from .helpers import FakeClient, MediaTestCase, discard_buffered_usage, fake_response, make_pdf, page_text
+
+
+tearDownModule = discard_buffered_usage
+
+
+STUDY_PACK = {
+    'summary': 'Foxes jump over dogs.',
+    'key_concepts': ['Foxes', ' Dogs ', ''],
+    'quiz_questions': [
+        {'text': 'Who jumps?', 'options': ['Fox', 'Dog'], 'correct_answer_index': 0},
+        {'text': 'Broken', 'options': ['Only one'], 'correct_answer_index': 0},
+        {'text': 'Out of range', 'options': ['A', 'B'], 'correct_answer_index': 2},
+    ],
+}
+
+
+class StudyPackTests(MediaTestCase):
+
+    def test_validate_keeps_only_well_formed_questions(self):
+        pack = ai_utils.validate_study_pack(STUDY_PACK)
+        self.assertEqual(pack['key_concepts'], ['Foxes', 'Dogs'])
+        self.assertEqual([q['text'] for q in pack['quiz_questions']], ['Who jumps?'])
+
+    def test_validate_rejects_unusable_packs(self):
+        for data in [[], {'summary': '', 'quiz_questions': STUDY_PACK['quiz_questions']}, {'summary': 'x', 'quiz_questions': []}]:
+            with self.assertRaises(ValueError):
+                ai_utils.validate_study_pack(data)
+
+    def test_one_model_call_returns_summary_concepts_and_quiz(self):
+        client = FakeClient({ai_utils.model_flash: fake_response(json.dumps(STUDY_PACK))})
+        with mock.patch.object(ai_utils, 'initialize_client', return_value=client):
+            pack, error = ai_utils.generate_study_pack('Some notes.', 'Foxes')
+        self.assertIsNone(error)
+        self.assertEqual(pack['summary'], 'Foxes jump over dogs.')
+        self.assertEqual(len(client.calls), 1)
+
+    def test_invalid_json_is_reported(self):
+        client = FakeClient({ai_utils.model_flash: fake_response('not json')})
+        with mock.patch.object(ai_utils, 'initialize_client', return_value=client):
+            pack, error = ai_utils.generate_study_pack('Some notes.', 'Foxes')
+        self.assertIsNone(pack)
+        self.assertIn('invalid study pack', error)
+
+    def test_upload_saves_summary_and_quiz_from_one_call(self):
+        user = User.objects.create_user('student')
+        self.client.force_login(user)
+        client = FakeClient({ai_utils.model_flash: fake_response(json.dumps(STUDY_PACK))})
+        upload = SimpleUploadedFile('foxes.pdf', make_pdf([page_text('Page 1'), page_text('Page 2')]), 'application/pdf')
+        with mock.patch.object(ai_utils, 'initialize_client', return_value=client):
+            response = self.client.post(reverse('pdf_summarizer'), {'title': 'Foxes', 'pdf_file': upload})
+
+        note = UserNote.objects.get(user=user)
+        self.assertRedirects(response, reverse('note_detail', kwargs={'pk': note.pk}))
+        self.assertEqual(note.summary_text, 'Foxes jump over dogs.')
+        self.assertEqual(note.key_concepts, ['Foxes', 'Dogs'])
+        quiz = Quiz.objects.get(source_note=note)
+        self.assertEqual(quiz.questions.count(), 1)
+        self.assertEqual(len(client.calls), 1)
@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from .. import ai_utils
+from ..topics import normalize_topic
+from .helpers import FakeClient, discard_buffered_usage, fake_response, reset_for_test
+
+
+tearDownModule = discard_buffered_usage
+
+
+class TopicTests(TestCase):
+
+    def setUp(self):
+        reset_for_test(self, cache)
+        self.index = ai_utils.topic_index
+
+    def explain(self, topic):
+        client = FakeClient({model: fake_response(f'About {topic}') for model in [ai_utils.model_flash, ai_utils.model_pro]})
+        with mock.patch.object(ai_utils, 'initialize_client', return_value=client):
+            return ai_utils.explain_topic_and_focus(topic), client
+
+    def test_aliases_share_one_canonical_key(self):
+        keys = {self.index.canonical_key(t) for t in ['ML', 'machine-learning', 'Machine Learning basics']}
+        self.assertEqual(keys, {'machine learning'})
+        self.assertEqual(self.index.exact_match('LLMs').name, 'Large Language Models (LLMs)')
+
+    def test_near_topics_are_not_rewritten(self):
+        for topic in ['Vision Transformers', 'Deep Reinforcement Learning',
+                      'Natural Language Generation', 'Neural Network Pruning']:
+            with self.subTest(topic=topic):
+                self.assertIsNone(self.index.exact_match(topic))
+                self.assertIsNone(self.index.resolve(topic))
+                self.assertEqual(self.index.canonical_key(topic), normalize_topic(topic))
+                self.assertIsNone(ai_utils.generate_quiz_json(topic)[0])
+
+    def test_typos_are_only_an_analytics_hint(self):
+        self.assertEqual(self.index.resolve('artifical intelligence').method, 'trigram')
+        self.assertEqual(self.index.analytics_key('artifical intelligence'), 'artificial intelligence')
+        self.assertEqual(self.index.canonical_key('artifical intelligence'), 'artifical intelligence')
+        self.assertIsNone(ai_utils.generate_quiz_json('artifical intelligence')[0])
+
+    def test_explanation_prompt_keeps_unmatched_topic(self):
+        text, client = self.explain('Neural Network Pruning')
+        self.assertEqual(text, 'About Neural Network Pruning')
+        self.assertIn("'Neural Network Pruning'", client.prompts[0])
+        _, client = self.explain('Neural Networks')
+        self.assertIn("'Neural Networks'", client.prompts[0])
+
+    def test_alias_shares_the_cache_but_keeps_its_prompt(self):
+        text, client = self.explain('neural nets')
+        self.assertIn("'neural nets'", client.prompts[0])
+        again, client = self.explain('Neural Networks intro')
+        self.assertEqual(again, text)
+        self.assertEqual(client.calls, [])
+
+    def test_spelling_variant_gets_the_canonical_prompt(self):
+        _, client = self.explain('neural-networks')
+        self.assertIn("'Neural Networks'", client.prompts[0])
+
+    def test_distinct_subjects_keep_distinct_keys(self):
+        topics = ['C', 'C++', 'C#', 'Vitamin A', 'Vitamin C', 'A* search', 'search', 'IS-LM model', 'LM model']
+        keys = [self.index.canonical_key(topic) for topic in topics]
+        self.assertEqual(len(set(keys)), len(topics), keys)
+        self.assertEqual(normalize_topic('Introduction'), 'introduction')
+        self.assertEqual(normalize_topic("What's an intro to ML?"), 'ml')
+
+    def test_broad_subjects_are_not_aliases(self):
+        for topic in ['Transformers', 'Image Processing', 'Data Analysis', 'Text Processing', 'ChatGPT']:
+            with self.subTest(topic=topic):
+                self.assertIsNone(self.index.exact_match(topic))
+                _, client = self.explain(topic)
+                self.assertIn(f"'{topic}'", client.prompts[0])
@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import usage
+from ..models import AIUsageDaily, AIUsageRecord
+from .helpers import patch_for_test
+
+
+class UsageTests(TestCase):
+
+    def setUp(self):
+        patch_for_test(self, usage, _records=[], _totals_cache={})
+        self.user = User.objects.create_user('ann')
+
+    def record(self, user_id, prompt=100, output=50, ok=True):
+        with mock.patch.object(usage, 'FLUSH_MAX_PENDING', 1000):
+            usage.record_usage(user_id, 'summary', 'fast', prompt, output, 20, ok=ok)
+
+    def test_flushes_add_to_one_row_per_key(self):
+        for user_id in [self.user.pk, None]:
+            self.record(user_id)
+            self.record(user_id, ok=False)
+        self.assertEqual(usage.flush_usage(), 4)
+        self.record(self.user.pk)
+        self.record(None)
+        usage.flush_usage()
+
+        self.assertEqual(AIUsageRecord.objects.count(), 6)
+        rows = {row.user_id: row for row in AIUsageDaily.objects.all()}
+        self.assertEqual(len(rows), 2)
+        for row in rows.values():
+            self.assertEqual((row.calls, row.errors, row.prompt_tokens, row.output_tokens), (3, 1, 300, 150))
+
+    def test_flush_adds_to_a_row_created_by_another_worker(self):
+        AIUsageDaily.objects.create(day=timezone.localdate(), user=None, feature='summary', model='fast', calls=5)
+        self.record(None)
+        usage.flush_usage()
+        self.assertEqual(list(AIUsageDaily.objects.values_list('calls', flat=True)), [6])
+
+    def test_duplicate_rollups_are_rejected(self):
+        for user in [self.user, None]:
+            AIUsageDaily.objects.create(day=timezone.localdate(), user=user, feature='summary', model='fast')
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                AIUsageDaily.objects.create(day=timezone.localdate(), user=user, feature='summary', model='fast')
+
+    def test_failed_flush_keeps_calls(self):
+        self.record(self.user.pk)
+        with mock.patch.object(AIUsageRecord.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+            self.assertEqual(usage.flush_usage(), 0)
+        self.assertEqual(usage.flush_usage(), 1)
+
+    @override_settings(AI_USER_DAILY_TOKEN_QUOTA=400)
+    def test_quota_counts_flushed_and_pending_usage(self):
+        self.record(self.user.pk)
+        usage.flush_usage()
+        self.record(self.user.pk)
+        usage.check_quota(self.user.pk, 'summary', estimated_prompt_tokens=100)
+        with self.assertRaises(usage.QuotaExceededError):
+            usage.check_quota(self.user.pk, 'summary', estimated_prompt_tokens=101)
+        usage.check_quota(None, 'summary', estimated_prompt_tokens=10000)
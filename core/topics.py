@@ -0,0 +1,203 @@
+# core/topics.py
+import re
+import threading
+import unicodedata
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+
+# ----------------------------------------------------------------------
+# Topic Normalization Index
+# ----------------------------------------------------------------------
+# Maps free-text topics ("ML", "machine-learning", "Machine Learning basics")
+# onto canonical topic IDs so quiz lookup, explanation caching and analytics
+# all agree on one key per topic. Resolution order:
+#   1. exact hit on a normalized name or alias,
+#   2. character-trigram similarity (Dice coefficient) above a threshold,
+#      clearly ahead of the runner-up topic.
+# Only exact hits may change what a student is shown (prompts, built-in
+# quizzes, cache keys): "Neural Network Pruning" is trigram-close to Neural
+# Networks but is a different subject. Trigram matches are a hint for
+# analytics only. Anything else is keyed by its normalized text instead.
+
+TopicMatch = namedtuple('TopicMatch', ['topic_id', 'name', 'confidence', 'method'])
+
+# Extra spellings per canonical topic ID, on top of each topic's own names
+# and initials. Only true synonyms belong here: an exact hit serves the
+# topic's built-in quiz and cached explanation, so a broader or neighbouring
+# subject ("Transformers", "Image Processing") must not be listed.
+# Extend with settings.TOPIC_ALIASES = {topic_id: [...]}.
+TOPIC_ALIASES = {
+    'artificial intelligence': ['ai', 'a.i.', 'machine intelligence'],
+    'deep learning': ['deep neural networks', 'dnn'],
+    'neural networks': ['neural nets', 'neural net', 'ann', 'artificial neural networks'],
+    'large language models': ['llm', 'llms'],
+    'nlp': ['natural language processing'],
+    'turing test': ['imitation game', 'the imitation game'],
+}
+
+# Words that describe the level or format of the request rather than its subject
+FILLER_WORDS = frozenset("""
+    an and basic basics beginner beginners concept concepts course crash explain explained
+    for fundamental fundamentals guide in intro introduction into of on overview primer the
+    to tutorial what whats is are about 101
+""".split())
+
+# "+", "#" and "*" tell subjects apart: "C", "C++" and "C#"; "A*" search.
+TOKEN_SPLIT_RE = re.compile(r"[^a-z0-9+#*]+")
+PARENTHETICAL_RE = re.compile(r"\(([^)]*)\)")
+DEFAULT_MATCH_THRESHOLD = 0.85
+AMBIGUITY_MARGIN = 0.1
+MIN_FUZZY_LENGTH = 4
+
+
+def _singular(token):
+    if len(token) > 3 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]
+    return token
+
+
+def normalize_topic(text):
+    """
+    Lowercases, strips accents/punctuation/filler words and singularizes tokens.
+    A filler word is only dropped when it stands alone and something else is
+    left: single letters ("Vitamin A") and parts of a compound ("IS-LM") stay.
+    """
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii').lower()
+    text = re.sub(r"[.']", '', text)  # "A.I." -> "ai", "what's" -> "whats"
+    tokens, subject = [], []
+    for word in text.split():
+        parts = [t for t in TOKEN_SPLIT_RE.split(word) if t]
+        for part in parts:
+            token = _singular(part)
+            tokens.append(token)
+            if len(parts) > 1 or part not in FILLER_WORDS:
+                subject.append(token)
+    return ' '.join(subject or tokens)
+
+
+def _trigrams(normalized):
+    padded = f"  {normalized} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _initials(normalized):
+    words = normalized.split()
+    return ''.join(w[0] for w in words) if len(words) > 1 else None
+
+
+class TopicIndex:
+    """
+    In-memory index of canonical topics. Exact lookups are a dict hit;
+    fuzzy lookups only score aliases sharing at least one trigram with the query.
+    """
+
+    def __init__(self, threshold=DEFAULT_MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.names = {}       # topic_id -> display name
+        self.exact = {}       # normalized alias -> topic_id
+        self.alias_grams = {}  # normalized alias -> (trigram Counter, total trigram count)
+        self.postings = {}    # trigram -> set of normalized aliases
+        self.lock = threading.Lock()
+        self._resolve = lru_cache(maxsize=4096)(self._resolve_uncached)
+
+    def add(self, topic_id, name, aliases=()):
+        """Registers a canonical topic under its ID, display name and aliases."""
+        with self.lock:
+            self.names[topic_id] = name
+            spellings = [topic_id, name, *aliases]
+            # "Large Language Models (LLMs)" also registers "Large Language Models" and "LLMs"
+            for spelling in list(spellings):
+                inner = PARENTHETICAL_RE.findall(spelling)
+                if inner:
+                    spellings.append(PARENTHETICAL_RE.sub(' ', spelling))
+                    spellings.extend(inner)
+
+            for position, spelling in enumerate(spellings):
+                normalized = normalize_topic(spelling)
+                if not normalized:
+                    continue
+                self._add_alias(normalized, topic_id)
+                initials = _initials(normalized) if position < 2 else None
+                if initials:
+                    # Initials of the ID/name only, and exact-only: fuzzy-matching two letters is noise.
+                    self.exact.setdefault(initials, topic_id)
+            self._resolve.cache_clear()
+
+    def _add_alias(self, normalized, topic_id):
+        self.exact[normalized] = topic_id
+        if len(normalized) < MIN_FUZZY_LENGTH or normalized in self.alias_grams:
+            return
+        grams = _trigrams(normalized)
+        self.alias_grams[normalized] = (grams, sum(grams.values()))
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(normalized)
+
+    def resolve(self, text):
+        """
+        Returns the best TopicMatch for free text, or None below the confidence threshold.
+        A 'trigram' match is only a hint; use exact_match() for anything shown to the student.
+        """
+        return self._resolve(normalize_topic(text))
+
+    def exact_match(self, text):
+        """Returns the TopicMatch when `text` is a name or alias of a canonical topic, else None."""
+        match = self.resolve(text)
+        return match if match and match.method == 'exact' else None
+
+    def _resolve_uncached(self, normalized):
+        if not normalized:
+            return None
+
+        topic_id = self.exact.get(normalized)
+        if topic_id is not None:
+            return TopicMatch(topic_id, self.names[topic_id], 1.0, 'exact')
+
+        if len(normalized) < MIN_FUZZY_LENGTH:
+            return None
+
+        query = _trigrams(normalized)
+        query_total = sum(query.values())
+        shared = Counter()
+        for gram, count in query.items():
+            for alias in self.postings.get(gram, ()):
+                shared[alias] += min(count, self.alias_grams[alias][0][gram])
+
+        best_by_topic = {}
+        for alias, overlap in shared.items():
+            score = 2.0 * overlap / (query_total + self.alias_grams[alias][1])
+            topic_id = self.exact[alias]
+            if score > best_by_topic.get(topic_id, 0.0):
+                best_by_topic[topic_id] = score
+
+        ranked = sorted(best_by_topic.items(), key=lambda item: (-item[1], item[0]))
+        if not ranked or ranked[0][1] < self.threshold:
+            return None
+        topic_id, score = ranked[0]
+        if len(ranked) > 1 and score - ranked[1][1] < AMBIGUITY_MARGIN:
+            # "machine" is as close to Machine Learning as to Machine Vision: don't guess.
+            return None
+        return TopicMatch(topic_id, self.names[topic_id], round(score, 3), 'trigram')
+
+    def canonical_key(self, text):
+        """Stable cache key: the topic ID for an exact match, otherwise the normalized text."""
+        match = self.exact_match(text)
+        return match.topic_id if match else normalize_topic(text)
+
+    def analytics_key(self, text):
+        """Like canonical_key, but also folds near-misses ("machin learning") onto their topic."""
+        match = self.resolve(text)
+        return match.topic_id if match else normalize_topic(text)
+
+
+def build_topic_index(quiz_data_map):
+    """Builds the index from QUIZ_DATA_MAP's topics plus TOPIC_ALIASES and settings.TOPIC_ALIASES."""
+    index = TopicIndex(getattr(settings, 'TOPIC_MATCH_THRESHOLD', DEFAULT_MATCH_THRESHOLD))
+    extra = getattr(settings, 'TOPIC_ALIASES', {})
+    for topic_id, data in quiz_data_map.items():
+        aliases = TOPIC_ALIASES.get(topic_id, []) + list(extra.get(topic_id, []))
+        index.add(topic_id, data.get('topic', topic_id), aliases)
+    return index
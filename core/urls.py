@@ -10,6 +10,10 @@ urlpatterns = [
     # Summarization
     path('summarize/', views.pdf_upload_view, name='pdf_summarizer'), 
     path('notes/<int:pk>/', views.note_detail_view, name='note_detail'), 
+    path('notes/<int:pk>/pdf/', views.note_pdf_view, name='note_pdf'), 
+    path('notes/<int:pk>/read/', views.note_reader_view, name='note_reader'), 
+    path('notes/<int:pk>/pages/<int:page>/', views.note_page_view, name='note_page'), 
+    path('notes/<int:pk>/chat/', views.note_chat_view, name='note_chat'), 
     
     # Explanation
     path('explain/', views.topic_explanation_view, name='topic_explanation'), 
@@ -18,5 +22,12 @@ urlpatterns = [
     path('quizzes/', views.quiz_list_view, name='quiz_list'),           
     path('quiz/<int:pk>/take/', views.take_quiz_view, name='take_quiz'), 
     path('quiz/<int:pk>/grade/', views.grade_quiz_view, name='grade_quiz'), 
+    path('quiz/<int:pk>/grade/batch/', views.batch_grade_view, name='batch_grade'), 
     path('quiz/results/<int:pk>/', views.quiz_results_view, name='quiz_results'), 
+    path('review/', views.review_view, name='review'), 
+    
+    # Shared quizzes
+    path('quiz/join/', views.join_quiz_view, name='join_quiz'), 
+    path('quiz/<int:pk>/share/', views.share_quiz_view, name='share_quiz'), 
+    path('quiz/<int:pk>/leaderboard/', views.leaderboard_view, name='quiz_leaderboard'), 
 ]
\ No newline at end of file
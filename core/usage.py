@@ -0,0 +1,174 @@
+# core/usage.py
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import AIUsageDaily, AIUsageRecord
+
+# ----------------------------------------------------------------------
+# LLM Usage Ledger & Quotas
+# ----------------------------------------------------------------------
+# Every model call is appended to an in-process buffer. The buffer is
+# written in one batch (ledger rows via bulk_create, plus increments to the
+# per day/user/feature/model rollup) when it is full, when the flush interval
+# has passed, and at exit.
+#
+# Quotas are checked before a call is made against today's rollups (read at
+# most every QUOTA_REFRESH_S per key) plus this worker's unflushed usage, so
+# other workers' usage is seen with at most one flush interval of delay.
+# Quotas count uncached input plus output tokens; context-cache hits are
+# recorded separately as cached_tokens.
+
+FLUSH_INTERVAL_S = getattr(settings, 'AI_USAGE_FLUSH_S', 30)
+FLUSH_MAX_PENDING = getattr(settings, 'AI_USAGE_MAX_PENDING', 200)
+QUOTA_REFRESH_S = getattr(settings, 'AI_USAGE_QUOTA_REFRESH_S', 15)
+WRITE_BATCH_SIZE = 1000
+MAX_BUFFERED = 10000  # calls kept across failed flushes before the oldest are dropped
+
+
+class QuotaExceededError(Exception):
+    """Raised before a model call that would exceed a configured daily token quota."""
+
+
+_lock = threading.Lock()
+_records = []          # unsaved AIUsageRecord instances
+_last_flush = time.monotonic()
+_totals_cache = {}     # (day, scope, value) -> (fetched_at, tokens)
+
+
+def record_usage(user_id, feature, model, prompt_tokens, output_tokens, latency_ms, ok=True, cached_tokens=0):
+    """Adds one model call to the ledger buffer; flushes when due."""
+    record = AIUsageRecord(
+        user_id=user_id,
+        feature=feature[:32],
+        model=model[:64],
+        prompt_tokens=prompt_tokens or 0,
+        output_tokens=output_tokens or 0,
+        cached_tokens=cached_tokens or 0,
+        latency_ms=int(latency_ms),
+        ok=ok,
+        created_at=timezone.now(),
+    )
+    with _lock:
+        _records.append(record)
+        due = len(_records) >= FLUSH_MAX_PENDING or time.monotonic() - _last_flush >= FLUSH_INTERVAL_S
+    if due:
+        flush_usage()
+
+
+def flush_usage():
+    """Writes buffered calls to the ledger and the daily rollups. Returns the number of calls written."""
+    global _records, _last_flush
+    with _lock:
+        records, _records = _records, []
+        _last_flush = time.monotonic()
+    if not records:
+        return 0
+
+    rollups = {}
+    for r in records:
+        key = (timezone.localdate(r.created_at), r.user_id, r.feature, r.model)
+        totals = rollups.setdefault(key, Counter())
+        totals['calls'] += 1
+        totals['errors'] += 0 if r.ok else 1
+        totals['prompt_tokens'] += r.prompt_tokens
+        totals['output_tokens'] += r.output_tokens
+        totals['cached_tokens'] += r.cached_tokens
+        totals['total_latency_ms'] += r.latency_ms
+
+    try:
+        with transaction.atomic():
+            AIUsageRecord.objects.bulk_create(records, batch_size=WRITE_BATCH_SIZE)
+            # Upsert: make sure each rollup row exists (the unique key turns a row another
+            # worker just created into a no-op), then add this batch's totals to it in place.
+            # bulk_create skips save(), so user_key is set here.
+            AIUsageDaily.objects.bulk_create(
+                [AIUsageDaily(day=day, user_id=user_id, user_key=user_id or 0, feature=feature, model=model)
+                 for day, user_id, feature, model in rollups],
+                ignore_conflicts=True,
+            )
+            for (day, user_id, feature, model), totals in rollups.items():
+                AIUsageDaily.objects.filter(day=day, user_key=user_id or 0, feature=feature, model=model).update(
+                    **{field: F(field) + value for field, value in totals.items()}
+                )
+    except Exception as e:
+        # Metering must never fail a request: keep the calls for the next flush.
+        print(f"AI usage flush failed: {e}")
+        with _lock:
+            if len(_records) + len(records) <= MAX_BUFFERED:
+                _records[:0] = records
+        return 0
+    return len(records)
+
+
+def _tokens_today(scope, value):
+    """Today's prompt+output tokens for scope 'user', 'feature' or 'global', including unflushed calls."""
+    today = timezone.localdate()
+    cache_key = (today, scope, value)
+    with _lock:
+        cached = _totals_cache.get(cache_key)
+    if cached is None or time.monotonic() - cached[0] > QUOTA_REFRESH_S:
+        # Queried outside the lock: two threads may both refresh, but neither blocks record_usage.
+        rows = AIUsageDaily.objects.filter(day=today)
+        if scope == 'user':
+            rows = rows.filter(user_id=value)
+        elif scope == 'feature':
+            rows = rows.filter(feature=value)
+        totals = rows.aggregate(prompt=Sum('prompt_tokens'), output=Sum('output_tokens'))
+        cached = (time.monotonic(), (totals['prompt'] or 0) + (totals['output'] or 0))
+        with _lock:
+            if len(_totals_cache) > MAX_BUFFERED:
+                _totals_cache.clear()
+            _totals_cache[cache_key] = cached
+
+    with _lock:
+        pending = sum(
+            r.prompt_tokens + r.output_tokens for r in _records
+            if timezone.localdate(r.created_at) == today
+            and (scope == 'global' or (scope == 'user' and r.user_id == value) or (scope == 'feature' and r.feature == value))
+        )
+    return cached[1] + pending
+
+
+def check_quota(user_id, feature, estimated_prompt_tokens=0):
+    """
+    Raises QuotaExceededError if the call would push the user, the feature or
+    the whole site over its daily token quota. Unset quotas are unlimited.
+    """
+    user_quota = getattr(settings, 'AI_USER_DAILY_TOKEN_QUOTA', None)
+    if user_quota and user_id is not None:
+        if _tokens_today('user', user_id) + estimated_prompt_tokens > user_quota:
+            raise QuotaExceededError("You have reached your daily AI usage limit. Please try again tomorrow.")
+
+    feature_quota = getattr(settings, 'AI_FEATURE_DAILY_TOKEN_QUOTAS', {}).get(feature)
+    if feature_quota and _tokens_today('feature', feature) + estimated_prompt_tokens > feature_quota:
+        raise QuotaExceededError("This AI feature has reached its daily usage limit. Please try again tomorrow.")
+
+    global_quota = getattr(settings, 'AI_GLOBAL_DAILY_TOKEN_QUOTA', None)
+    if global_quota and _tokens_today('global', None) + estimated_prompt_tokens > global_quota:
+        raise QuotaExceededError("The AI service has reached its daily usage limit. Please try again tomorrow.")
+
+
+def heaviest_consumers(queryset, limit=10):
+    """Aggregates AIUsageDaily rows into the top users by total tokens."""
+    return list(
+        queryset
+        .values('user__username')
+        .annotate(
+            calls=Sum('calls'),
+            errors=Sum('errors'),
+            prompt=Sum('prompt_tokens'),
+            output=Sum('output_tokens'),
+            tokens=Sum(F('prompt_tokens') + F('output_tokens')),
+        )
+        .order_by('-tokens')[:limit]
+    )
+
+
+atexit.register(flush_usage)
@@ -4,17 +4,33 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth import login 
 from django.contrib.auth.views import LoginView
+from django.db import transaction
+from django.db.models import Q
+from django.http import JsonResponse
 from markdown import markdown
+from collections import Counter
 import json # <--- JSON IS CORRECTLY IMPORTED HERE (Module Level)
 
 # Imports rely on other files being correct
-from .forms import PDFUploadForm, TopicForm 
-from .models import UserNote, Quiz, Question, QuizAttempt
+from .forms import PDFUploadForm, TopicForm, BatchGradeForm, JoinQuizForm, NoteQuestionForm
+from .models import UserNote, Quiz, Question, QuizAttempt, QuizMembership
+from .batch import enqueue_note_job
+from .file_serving import serve_protected_file
+from .grading import SubmissionFormatError, grade_submissions, load_answer_key, parse_submissions
+from .leaderboard import ensure_join_code, get_leaderboard, record_scores
+from .note_chat import ask_note
+from .page_reader import compute_file_hash, get_note_page, seed_page_cache
+from .pdf_sandbox import extract_pages
+from .popularity import record_topic_request
+from .review import answer_quality, correct_option_index, get_or_create_review_quiz, record_reviews, todays_review
+from .revisions import find_previous_version, page_text_hash, save_page_hashes, summarize_revision
 from .ai_utils import (
-    extract_text_from_pdf, summarize_notes, explain_topic_and_focus, 
-    generate_quiz_json, generate_feedback
+    summarize_notes, explain_topic_and_focus, 
+    generate_quiz_json, generate_feedback, generate_study_pack
 )
 
+LEADERBOARD_SIZE = 10
+
 # ----------------------------------------------------------------------
 # Core & Custom Authentication Views (Public)
 # ----------------------------------------------------------------------
@@ -54,7 +70,7 @@ def pdf_upload_view(request):
     """Handles PDF file upload, text extraction, and AI summarization."""
     
     # Ensure necessary imports are available at the top of views.py:
-    # from .ai_utils import extract_text_from_pdf, summarize_notes
+    # from .pdf_sandbox import extract_pages; from .ai_utils import summarize_notes
     
     if request.method == 'POST':
         form = PDFUploadForm(request.POST, request.FILES)
@@ -63,22 +79,47 @@ def pdf_upload_view(request):
             note = form.save(commit=False)
             note.user = request.user 
             note.save() # Save the object, which saves the file to MEDIA_ROOT
+            note.file_hash = compute_file_hash(note.pdf_file)
+            note.save(update_fields=['file_hash'])
             
             # --- AI PROCESSING LOGIC ADDED HERE ---
             
             # 2. Get the absolute path to the saved PDF file
             pdf_path = note.pdf_file.path 
             
-            # 3. Extract text from the PDF using the helper function
-            pdf_text = extract_text_from_pdf(pdf_path)
+            # 3. Extract text from the PDF page by page (sandboxed; may stop early on a hostile file)
+            extraction = extract_pages(pdf_path)
+            pages = extraction.texts()
+            pdf_text = "".join(pages) if pages else None
+            seed_page_cache(note.file_hash, extraction)
             
             if pdf_text and len(pdf_text) > 100: # Ensure enough text was extracted
-                # 4. Generate the summary using the AI utility
-                summary = summarize_notes(pdf_text, note.title)
+                # 4. Link to an earlier upload of the same notes and record page hashes
+                hashes = [page_text_hash(page) for page in pages]
+                previous = find_previous_version(note, hashes)
+                save_page_hashes(note, hashes)
+                if previous:
+                    note.previous_version = previous
+                    note.save(update_fields=['previous_version'])
                 
-                # 5. Save the summary back to the database model
-                note.summary_text = summary
-                note.save() 
+                # 5. Not urgent: queue for the off-peak batch lane (core.batch)
+                if form.cleaned_data['process_later']:
+                    enqueue_note_job(note, 'study_pack')
+                # 6. Re-upload: only the changed pages are summarized again
+                elif previous and summarize_revision(note, previous, pages, hashes):
+                    pass
+                else:
+                    # 7. Generate summary, key concepts and quiz in a single AI call
+                    study_pack, error = generate_study_pack(pdf_text, note.title, user=request.user)
+                    
+                    if study_pack:
+                        # 8. Save summary, concepts and quiz together
+                        save_study_pack(note, study_pack)
+                    else:
+                        # Fall back to the plain summary so the upload is still useful
+                        print(f"Study pack generation failed: {error}")
+                        note.summary_text = summarize_notes(pdf_text, note.title, user=request.user)
+                        note.save() 
             else:
                 note.summary_text = "ERROR: Could not extract sufficient text from PDF. File may be encrypted or empty."
                 note.save()
@@ -110,6 +151,60 @@ def note_detail_view(request, pk):
         print(f"Note detail view crashed: {e}")
         return redirect('home')
 
+@login_required 
+def note_pdf_view(request, pk):
+    """Serves the note's PDF to its owner, with HTTP Range support for in-browser viewers."""
+    note = get_object_or_404(UserNote, pk=pk, user=request.user)
+    return serve_protected_file(request, note.pdf_file, content_type='application/pdf')
+
+@login_required 
+def note_reader_view(request, pk):
+    """Paged reader for the note's text; pages are fetched one at a time from note_page_view."""
+    note = get_object_or_404(UserNote, pk=pk, user=request.user)
+    try:
+        page_number = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page_number = 1
+    context = {'note': note, 'page_number': page_number, 'title': f'Read: {note.title}'}
+    return render(request, 'core/note_reader.html', context)
+
+@login_required 
+def note_page_view(request, pk, page):
+    """JSON text of one page of the note's PDF, extracted on demand and cached."""
+    note = get_object_or_404(UserNote, pk=pk, user=request.user)
+    if page < 1:
+        # Pages are 1-based; <int:page> also matches 0.
+        return JsonResponse({'error': 'Page not found.'}, status=404)
+    try:
+        text, page_count = get_note_page(note, page)
+    except Exception as e:
+        print(f"Page extraction failed: {e}")
+        return JsonResponse({'error': 'Could not read this page of the PDF.'}, status=500)
+    if text is None:
+        return JsonResponse({'error': 'Page not found.', 'page_count': page_count}, status=404)
+    return JsonResponse({'page': page, 'page_count': page_count, 'text': text})
+
+@login_required 
+def note_chat_view(request, pk):
+    """Follow-up questions about a note, answered from its cached document context."""
+    note = get_object_or_404(UserNote, pk=pk, user=request.user)
+    form = NoteQuestionForm()
+    error = None
+
+    if request.method == 'POST':
+        form = NoteQuestionForm(request.POST)
+        if form.is_valid():
+            answer, error = ask_note(note, form.cleaned_data['question'], user=request.user)
+            if answer is not None:
+                return redirect('note_chat', pk=note.pk)
+
+    messages = [
+        {'role': m.role, 'html': markdown(m.text) if m.role == 'model' else None, 'text': m.text}
+        for m in note.chat_messages.all()
+    ]
+    context = {'note': note, 'form': form, 'chat_messages': messages, 'error': error, 'title': f'Chat: {note.title}'}
+    return render(request, 'core/note_chat.html', context)
+
 @login_required 
 def topic_explanation_view(request):
     """Handles topic input, calls AI for explanation, and renders result."""
@@ -122,8 +217,9 @@ def topic_explanation_view(request):
         form = TopicForm(request.POST)
         if form.is_valid():
             topic = form.cleaned_data['topic_name']
+            record_topic_request(topic, 'explanation')
 
-            raw_explanation = explain_topic_and_focus(topic)
+            raw_explanation = explain_topic_and_focus(topic, user=request.user)
             explanation_html = markdown(raw_explanation)
 
     context = {
@@ -139,12 +235,14 @@ def topic_explanation_view(request):
 def quiz_list_view(request):
     """Displays user's existing quizzes and handles new quiz generation request."""
     user_quizzes = Quiz.objects.filter(user=request.user)
+    joined_quizzes = Quiz.objects.filter(memberships__user=request.user).exclude(user=request.user).select_related('user')
     form = TopicForm() 
     
     if request.method == 'POST':
         form = TopicForm(request.POST)
         if form.is_valid():
             topic = form.cleaned_data['topic_name']
+            record_topic_request(topic, 'quiz')
             
             quiz_id = generate_and_save_quiz(request.user, topic)
             
@@ -154,17 +252,42 @@ def quiz_list_view(request):
                 context = {
                     'form': form, 
                     'user_quizzes': user_quizzes, 
+                    'joined_quizzes': joined_quizzes,
+                    'join_form': JoinQuizForm(),
                     'error': 'Quiz generation failed! The AI may have timed out or returned invalid data. Please try a simpler topic.'
                 }
                 return render(request, 'core/quiz_list.html', context)
     
-    context = {'form': form, 'user_quizzes': user_quizzes, 'title': 'My Quizzes'}
+    context = {
+        'form': form, 'user_quizzes': user_quizzes, 'joined_quizzes': joined_quizzes,
+        'join_form': JoinQuizForm(), 'title': 'My Quizzes'
+    }
     return render(request, 'core/quiz_list.html', context)
 
+@login_required
+def review_view(request):
+    """Today's spaced-repetition review, read from the queue built nightly; starting it makes no model calls."""
+    entries = todays_review(request.user)
+    if request.method == 'POST' and entries:
+        quiz = get_or_create_review_quiz(request.user, entries)
+        return redirect('take_quiz', pk=quiz.pk)
+
+    topics = Counter(entry.question.quiz.topic for entry in entries)
+    context = {
+        'entries': entries,
+        'topics': topics.most_common(),
+        'title': "Today's Review",
+    }
+    return render(request, 'core/review.html', context)
+
 # ----------------------------------------------------------------------
 # Quiz Redirection Views
 # ----------------------------------------------------------------------
 
+def get_accessible_quiz(user, pk):
+    """Returns a quiz the user owns or has joined with its code, or raises 404."""
+    return get_object_or_404(Quiz.objects.filter(Q(user=user) | Q(memberships__user=user)).distinct(), pk=pk)
+
 # core/views.py (Find and REPLACE the take_quiz_view function)
 
 @login_required
@@ -174,7 +297,7 @@ def take_quiz_view(request, pk):
 
     # 1. Fetch the Quiz object and its Questions
     # NOTE: pk is the Quiz ID passed from the 'Retake Quiz' button
-    quiz = get_object_or_404(Quiz, pk=pk, user=request.user)
+    quiz = get_accessible_quiz(request.user, pk)
     questions = quiz.questions.all()
     
     # Structure the data for the template
@@ -212,11 +335,12 @@ def grade_quiz_view(request, pk):
         return redirect('take_quiz', pk=pk) 
 
     # 1. Fetch the Quiz and Questions
-    quiz = get_object_or_404(Quiz, pk=pk, user=request.user)
+    quiz = get_accessible_quiz(request.user, pk)
     questions = quiz.questions.all()
     
     score = 0
     total_questions = questions.count()
+    reviews = []
     
     # 2. Iterate through submitted answers and grade them
     for question in questions:
@@ -224,7 +348,11 @@ def grade_quiz_view(request, pk):
         submitted_answer_index = request.POST.get(f'question_{question.pk}')
         
         # The correct answer index is stored in the Question model's JSON data
-        correct_index = question.data.get('correct_answer_index')
+        correct_index = correct_option_index(question.data)
+        if correct_index is None:
+            # No valid answer key: the question scores for nobody and is not scheduled for review
+            continue
+        reviews.append((request.user.pk, question.pk, answer_quality(submitted_answer_index, correct_index)))
         
         # Compare submitted answer (as a string) to the correct index (as an int/str)
         try:
@@ -236,7 +364,7 @@ def grade_quiz_view(request, pk):
             pass 
 
     # 3. Generate Encouraging Message (via AI utility)
-    feedback_message = generate_feedback(quiz.topic, score, total_questions)
+    feedback_message = generate_feedback(quiz.topic, score, total_questions, user=request.user)
 
     # 4. Save the Quiz Attempt to the database
     # This records the final result and feedback
@@ -245,9 +373,89 @@ def grade_quiz_view(request, pk):
         quiz=quiz,
         defaults={'score': score, 'total_questions': total_questions, 'feedback_message': feedback_message}
     )
+    record_scores(quiz, [(request.user.pk, score, total_questions)])
+    record_reviews(reviews)
 
     # 5. CRITICAL FIX: Redirect to the RESULTS page, not the list page.
     return redirect('quiz_results', pk=attempt.pk)
+@login_required
+def share_quiz_view(request, pk):
+    """Gives one of the user's quizzes a join code so a class can take it."""
+    quiz = get_object_or_404(Quiz, pk=pk, user=request.user)
+    if request.method == 'POST':
+        ensure_join_code(quiz)
+    return redirect('quiz_leaderboard', pk=quiz.pk)
+
+
+@login_required
+def join_quiz_view(request):
+    """Joins a shared quiz by its code and starts it."""
+    form = JoinQuizForm(request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        quiz = Quiz.objects.filter(join_code=form.cleaned_data['code']).first()
+        if quiz is not None:
+            if quiz.user_id != request.user.pk:
+                QuizMembership.objects.get_or_create(quiz=quiz, user=request.user)
+            return redirect('take_quiz', pk=quiz.pk)
+        form.add_error('code', 'No quiz uses that code.')
+
+    context = {'form': form, 'title': 'Join a Quiz'}
+    return render(request, 'core/join_quiz.html', context)
+
+
+@login_required
+def leaderboard_view(request, pk):
+    """Shows the best score of everyone who has taken a shared quiz."""
+    quiz = get_accessible_quiz(request.user, pk)
+    board = get_leaderboard(quiz)
+    context = {
+        'quiz': quiz,
+        'top_entries': board.top(LEADERBOARD_SIZE),
+        'my_rank': board.rank(request.user.pk),
+        'participants': len(board),
+        'total_questions': quiz.questions.count(),
+        'is_owner': quiz.user_id == request.user.pk,
+        'title': f'Leaderboard: {quiz.topic}',
+    }
+    return render(request, 'core/leaderboard.html', context)
+
+
+@login_required
+def batch_grade_view(request, pk):
+    """
+    Grades a whole class's submissions for one of the teacher's quizzes.
+    Accepts a CSV/JSON file upload (HTML form) or a raw JSON body (API; returns JSON).
+    """
+    quiz = get_object_or_404(Quiz, pk=pk, user=request.user)
+    form = BatchGradeForm()
+    result = None
+    error = None
+
+    if request.method == 'POST':
+        is_api = request.content_type == 'application/json'
+        if not is_api:
+            form = BatchGradeForm(request.POST, request.FILES)
+            if not form.is_valid():
+                return render(request, 'core/batch_grade.html', {'quiz': quiz, 'form': form, 'title': f'Batch Grade: {quiz.topic}'})
+
+        try:
+            if is_api:
+                text, fmt = request.body.decode('utf-8'), 'json'
+            else:
+                upload = form.cleaned_data['submissions']
+                text = upload.read().decode('utf-8-sig')
+                fmt = 'json' if upload.name.lower().endswith('.json') else None
+            question_ids, _, _ = load_answer_key(quiz)
+            result = grade_submissions(quiz, parse_submissions(text, question_ids, fmt))
+        except (SubmissionFormatError, UnicodeDecodeError) as e:
+            error = f"Could not read submissions: {e}"
+
+        if is_api:
+            return JsonResponse({'error': error}, status=400) if error else JsonResponse(result)
+
+    context = {'quiz': quiz, 'form': form, 'result': result, 'error': error, 'title': f'Batch Grade: {quiz.topic}'}
+    return render(request, 'core/batch_grade.html', context)
+
 # core/views.py (Find and REPLACE the quiz_results_view function)
 
 @login_required
@@ -332,4 +540,23 @@ def generate_and_save_quiz(user, topic):
         return None
     except Exception as e:
         print(f"Error saving quiz to DB: {e}")
-        return None
\ No newline at end of file
+        return None
+
+# --- Study Pack Helper Function ---
+
+def save_study_pack(note, study_pack):
+    """Saves a validated study pack to the note, a new Quiz and its Questions atomically."""
+    with transaction.atomic():
+        note.summary_text = study_pack['summary']
+        note.key_concepts = study_pack['key_concepts']
+        note.save(update_fields=['summary_text', 'key_concepts'])
+
+        quiz = Quiz.objects.create(
+            user=note.user,
+            topic=note.title,
+            source_note=note
+        )
+        Question.objects.bulk_create([
+            Question(quiz=quiz, data=q_data) for q_data in study_pack['quiz_questions']
+        ])
+    return quiz
\ No newline at end of file
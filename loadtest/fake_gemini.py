@@ -0,0 +1,405 @@
+# loadtest/fake_gemini.py
+"""
+Local stand-in for the Gemini REST API used by the load-test harness.
+
+Serves `POST /<version>/models/<model>:generateContent` with configurable
+per-model latency distributions and error rates, so worker sizing can be
+measured without spending quota. Point the app at it with
+GEMINI_BASE_URL=http://127.0.0.1:<port>.
+
+Also implements the context-caching endpoints (`/<version>/cachedContents`,
+create/get/update/delete with TTLs). Requests that reference a cache are
+billed only for their uncached tokens, and `--ms-per-1k-tokens` adds
+latency per uncached input token, so the effect of caching is visible.
+
+Batch mode: `POST .../models/<model>:batchGenerateContent` accepts inline
+requests and `GET .../batches/<id>` reports the batch as running until
+`--batch-seconds` have passed, then returns every response. With
+`--rpm-limit`, generateContent calls beyond that many per minute get a 429,
+and a finished batch uses up one slot per request it ran, so batch work and
+interactive traffic compete for the same allowance as they would upstream.
+
+Latency specs:
+    fixed:<ms>                 every call takes <ms>
+    uniform:<lo_ms>:<hi_ms>    uniformly distributed
+    lognormal:<median_ms>:<sigma>   long-tailed, like real LLM latency
+
+Run standalone:
+    python -m loadtest.fake_gemini --port 8765 --latency lognormal:1200:0.5 --error-rate 0.02
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PATH_RE = re.compile(r'^/[^/]+/models/(?P<model>[^:/]+):generateContent$')
+CACHES_RE = re.compile(r'^/[^/]+/cachedContents/?$')
+CACHE_RE = re.compile(r'^/[^/]+/(?P<name>cachedContents/[^/?]+)$')
+BATCH_CREATE_RE = re.compile(r'^/[^/]+/models/(?P<model>[^:/]+):batchGenerateContent$')
+BATCH_RE = re.compile(r'^/[^/]+/(?P<name>batches/[^/?]+)$')
+TTL_RE = re.compile(r'^(?P<seconds>\d+(?:\.\d+)?)s$')
+
+FAKE_STUDY_PACK = {
+    'summary': 'These notes introduce the core ideas of the topic and work through examples.',
+    'key_concepts': ['Definitions', 'Worked examples', 'Common pitfalls'],
+    'quiz_questions': [
+        {'text': f'Sample question {i + 1}?', 'options': ['A', 'B', 'C'], 'correct_answer_index': i % 3}
+        for i in range(5)
+    ],
+}
+
+
+def parse_latency(spec, rng=random):
+    """Returns a zero-argument callable producing a latency in seconds."""
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(':') if v]
+    if kind == 'fixed':
+        return lambda: values[0] / 1000
+    if kind == 'uniform':
+        return lambda: rng.uniform(values[0], values[1]) / 1000
+    if kind == 'lognormal':
+        mu, sigma = math.log(values[0]), values[1]
+        return lambda: rng.lognormvariate(mu, sigma) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class FakeGeminiConfig:
+    def __init__(self, latency='lognormal:800:0.5', error_rate=0.0, model_latency=None, seed=None,
+                 ms_per_1k_tokens=0.0, rpm_limit=0, batch_seconds=2.0):
+        self.random = random.Random(seed)
+        self.default_latency = parse_latency(latency, self.random)
+        self.model_latency = {m: parse_latency(s, self.random) for m, s in (model_latency or {}).items()}
+        self.error_rate = error_rate
+        self.ms_per_1k_tokens = ms_per_1k_tokens
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.caches = {}  # name -> {'model', 'tokens', 'expire', 'display_name'}
+        self.rpm_limit = rpm_limit
+        self.recent_calls = deque()  # monotonic times of calls in the last minute
+        self.rate_limited = 0
+        self.batch_seconds = batch_seconds
+        self.batches = {}  # name -> {'model', 'display_name', 'requests', 'created', 'ready_at', 'responses'}
+        self.batch_requests = 0
+
+    def sample(self, model, input_tokens=0):
+        with self.lock:
+            self.calls += 1
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            latency = self.model_latency.get(model, self.default_latency)()
+        return latency + input_tokens / 1000 * self.ms_per_1k_tokens / 1000, failed
+
+    def admit(self, n=1, force=False):
+        """Takes `n` slots of the per-minute allowance; False if the limit is reached (unless forced)."""
+        with self.lock:
+            now = time.monotonic()
+            while self.recent_calls and self.recent_calls[0] <= now - 60:
+                self.recent_calls.popleft()
+            if self.rpm_limit and not force and len(self.recent_calls) + n > self.rpm_limit:
+                self.rate_limited += 1
+                return False
+            self.recent_calls.extend([now] * n)
+            return True
+
+    def live_cache(self, name):
+        with self.lock:
+            entry = self.caches.get(name)
+            if entry and entry['expire'] <= datetime.now(timezone.utc):
+                del self.caches[name]
+                entry = None
+            return entry
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _request_text(body):
+    parts = []
+    for content in body.get('contents', []):
+        for part in content.get('parts', []):
+            parts.append(part.get('text', ''))
+    for part in (body.get('systemInstruction') or {}).get('parts', []):
+        parts.append(part.get('text', ''))
+    return ''.join(parts)
+
+
+def _response_payload(model, body, cached_tokens=0):
+    generation_config = body.get('generationConfig') or {}
+    if generation_config.get('responseMimeType') == 'application/json':
+        text = json.dumps(FAKE_STUDY_PACK)
+    else:
+        text = f"## Fake response from {model}\n\nThis text was generated by the load-test stand-in."
+
+    prompt_tokens = _estimate_tokens(_request_text(body)) + cached_tokens
+    output_tokens = _estimate_tokens(text)
+    usage = {
+        'promptTokenCount': prompt_tokens,
+        'candidatesTokenCount': output_tokens,
+        'totalTokenCount': prompt_tokens + output_tokens,
+    }
+    if cached_tokens:
+        usage['cachedContentTokenCount'] = cached_tokens
+    return {
+        'candidates': [{
+            'content': {'role': 'model', 'parts': [{'text': text}]},
+            'finishReason': 'STOP',
+            'index': 0,
+        }],
+        'usageMetadata': usage,
+        'modelVersion': model,
+    }
+
+
+def _ttl_seconds(body, default=3600):
+    match = TTL_RE.match(body.get('ttl') or '')
+    return float(match.group('seconds')) if match else default
+
+
+def _timestamp(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _batch_payload(name, batch, state, output=None):
+    metadata = {
+        '@type': 'type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatch',
+        'name': name,
+        'displayName': batch['display_name'],
+        'model': f"models/{batch['model']}",
+        'state': state,
+        'createTime': _timestamp(batch['created']),
+        'updateTime': _timestamp(datetime.now(timezone.utc)),
+    }
+    if output is not None:
+        metadata['endTime'] = metadata['updateTime']
+        metadata['output'] = {'inlinedResponses': {'inlinedResponses': output}}
+    return {'name': name, 'metadata': metadata, 'done': output is not None}
+
+
+def _cache_payload(name, entry):
+    return {
+        'name': name,
+        'model': entry['model'],
+        'displayName': entry['display_name'],
+        'expireTime': _timestamp(entry['expire']),
+        'usageMetadata': {'totalTokenCount': entry['tokens']},
+    }
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_missing_cache(self):
+        # Gemini reports an unknown or expired cache as PERMISSION_DENIED.
+        self._send_json(403, {'error': {
+            'code': 403, 'message': 'CachedContent not found (or permission denied)', 'status': 'PERMISSION_DENIED',
+        }})
+
+    def _get_batch(self, name):
+        config = self.server.config
+        with config.lock:
+            batch = config.batches.get(name)
+        if batch is None:
+            self._send_json(404, {'error': {'code': 404, 'message': f'Batch {name} not found', 'status': 'NOT_FOUND'}})
+            return
+        if time.monotonic() < batch['ready_at']:
+            self._send_json(200, _batch_payload(name, batch, 'BATCH_STATE_RUNNING'))
+            return
+
+        if batch['responses'] is None:
+            # The batch "runs" when first seen finished; its requests use up rate-limit slots.
+            config.admit(len(batch['requests']), force=True)
+            responses = []
+            for item in batch['requests']:
+                request = item.get('request') or {}
+                with config.lock:
+                    config.batch_requests += 1
+                    failed = config.random.random() < config.error_rate
+                entry = {'metadata': item.get('metadata') or {}}
+                if failed:
+                    entry['error'] = {'code': 503, 'message': 'The model is overloaded. Please try again later.'}
+                else:
+                    entry['response'] = _response_payload(batch['model'], request)
+                responses.append(entry)
+            batch['responses'] = responses
+        self._send_json(200, _batch_payload(name, batch, 'BATCH_STATE_SUCCEEDED', batch['responses']))
+
+    def _create_batch(self, model, body):
+        batch_body = body.get('batch') or {}
+        requests = ((batch_body.get('inputConfig') or {}).get('requests') or {}).get('requests') or []
+        name = f"batches/{uuid.uuid4().hex[:16]}"
+        config = self.server.config
+        batch = {
+            'model': model,
+            'display_name': batch_body.get('displayName', ''),
+            'requests': requests,
+            'created': datetime.now(timezone.utc),
+            'ready_at': time.monotonic() + config.batch_seconds,
+            'responses': None,
+        }
+        with config.lock:
+            config.batches[name] = batch
+        self._send_json(200, _batch_payload(name, batch, 'BATCH_STATE_PENDING'))
+
+    def do_GET(self):
+        batch_match = BATCH_RE.match(self.path.split('?')[0])
+        if batch_match:
+            self._get_batch(batch_match.group('name'))
+            return
+
+        match = CACHE_RE.match(self.path.split('?')[0])
+        entry = match and self.server.config.live_cache(match.group('name'))
+        if not entry:
+            self._send_missing_cache()
+            return
+        self._send_json(200, _cache_payload(match.group('name'), entry))
+
+    def do_PATCH(self):
+        body = self._read_body()
+        match = CACHE_RE.match(self.path.split('?')[0])
+        entry = match and self.server.config.live_cache(match.group('name'))
+        if not entry:
+            self._send_missing_cache()
+            return
+        entry['expire'] = datetime.now(timezone.utc) + timedelta(seconds=_ttl_seconds(body))
+        self._send_json(200, _cache_payload(match.group('name'), entry))
+
+    def do_DELETE(self):
+        match = CACHE_RE.match(self.path.split('?')[0])
+        config = self.server.config
+        if not match or not config.live_cache(match.group('name')):
+            self._send_missing_cache()
+            return
+        with config.lock:
+            config.caches.pop(match.group('name'), None)
+        self._send_json(200, {})
+
+    def _create_cache(self, body):
+        name = f"cachedContents/{uuid.uuid4().hex[:16]}"
+        entry = {
+            'model': body.get('model', ''),
+            'display_name': body.get('displayName', ''),
+            'tokens': _estimate_tokens(_request_text(body)),
+            'expire': datetime.now(timezone.utc) + timedelta(seconds=_ttl_seconds(body)),
+        }
+        with self.server.config.lock:
+            self.server.config.caches[name] = entry
+        self._send_json(200, _cache_payload(name, entry))
+
+    def do_POST(self):
+        body = self._read_body()
+        path = self.path.split('?')[0]
+
+        if CACHES_RE.match(path):
+            self._create_cache(body)
+            return
+
+        batch_match = BATCH_CREATE_RE.match(path)
+        if batch_match:
+            self._create_batch(batch_match.group('model'), body)
+            return
+
+        match = PATH_RE.match(path)
+        if not match:
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+            return
+
+        cached_tokens = 0
+        if body.get('cachedContent'):
+            entry = self.server.config.live_cache(body['cachedContent'])
+            if not entry:
+                self._send_missing_cache()
+                return
+            cached_tokens = entry['tokens']
+
+        if not self.server.config.admit():
+            self._send_json(429, {'error': {
+                'code': 429, 'message': 'Resource has been exhausted (e.g. check quota).', 'status': 'RESOURCE_EXHAUSTED',
+            }})
+            return
+
+        model = match.group('model')
+        uncached_tokens = _estimate_tokens(_request_text(body))
+        latency, failed = self.server.config.sample(model, uncached_tokens)
+        time.sleep(latency)
+
+        if failed:
+            self._send_json(503, {'error': {
+                'code': 503, 'message': 'The model is overloaded. Please try again later.', 'status': 'UNAVAILABLE',
+            }})
+            return
+
+        self._send_json(200, _response_payload(model, body, cached_tokens))
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, FakeGeminiHandler)
+        self.config = config
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_gemini(config, host='127.0.0.1', port=0):
+    """Starts the server on a background thread and returns it."""
+    server = FakeGeminiServer((host, port), config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini generateContent server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='lognormal:800:0.5')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--ms-per-1k-tokens', type=float, default=0.0, help="Extra latency per 1k uncached input tokens.")
+    parser.add_argument('--rpm-limit', type=int, default=0, help="generateContent calls per minute before 429s (0: none).")
+    parser.add_argument('--batch-seconds', type=float, default=2.0, help="How long a submitted batch stays running.")
+    args = parser.parse_args()
+
+    config = FakeGeminiConfig(
+        args.latency, args.error_rate, seed=args.seed, ms_per_1k_tokens=args.ms_per_1k_tokens,
+        rpm_limit=args.rpm_limit, batch_seconds=args.batch_seconds,
+    )
+    server = FakeGeminiServer((args.host, args.port), config)
+    print(f"Fake Gemini listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,431 @@
+# loadtest/run.py
+"""
+End-to-end load-test harness.
+
+Starts a fake Gemini server, migrates a throwaway SQLite database, launches
+the Django project under a WSGI (gunicorn, or runserver if gunicorn is not
+installed) and/or ASGI (uvicorn or daphne) server, then replays a seeded
+traffic mix at rising concurrency. Reports p50/p95/p99 latency and
+throughput per URL name from core/urls.py and the concurrency at which
+throughput stops growing (the saturation point).
+
+Examples:
+    python -m loadtest.run --server wsgi --workers 4 --mix default --concurrency 1,2,4,8,16
+    python -m loadtest.run --server both --mix exam --duration 60 --json results.json
+    python -m loadtest.run --latency lognormal:2500:0.6 --error-rate 0.05 --seed 7
+"""
+import argparse
+import importlib.util
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from http.cookiejar import CookieJar
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from .fake_gemini import FakeGeminiConfig, start_fake_gemini
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SETTINGS_MODULE = 'loadtest.settings'
+SAMPLE_PDF_DIR = BASE_DIR / 'media' / 'user_notes' / 'pdfs'
+PASSWORD = 'loadtest-password-123'
+
+# Relative weights of each action per traffic mix
+MIXES = {
+    'default': {'login': 5, 'home': 10, 'quiz_list': 10, 'explain': 25, 'quiz': 25, 'upload': 10, 'note_detail': 10, 'note_pdf': 5},
+    'exam': {'login': 5, 'quiz_list': 15, 'quiz': 75, 'home': 5},
+    'revision': {'upload': 40, 'note_detail': 30, 'note_pdf': 20, 'explain': 10},
+    'browse': {'home': 40, 'quiz_list': 30, 'note_detail': 20, 'login': 10},
+}
+
+EXPLAIN_TOPICS = [
+    'Machine Learning', 'Photosynthesis', 'The French Revolution', 'Neural Networks',
+    'Quantum Entanglement', 'The Water Cycle', 'Supply and Demand', 'Turing Test',
+]
+QUIZ_TOPICS = [
+    'Artificial Intelligence', 'Machine Learning', 'Deep Learning', 'Neural Networks',
+    'Data Science', 'Large Language Models', 'NLP', 'Computer Vision', 'Turing Test',
+]
+
+SATURATION_MIN_GAIN = 0.10   # throughput must grow by 10% per step to count as unsaturated
+QUESTION_RE = re.compile(r'name="question_(\d+)"')
+
+
+# ----------------------------------------------------------------------
+# Measurement
+# ----------------------------------------------------------------------
+
+class Recorder:
+    """Thread-safe collection of (url_name, status, latency) samples."""
+
+    def __init__(self):
+        self.samples = []
+        self.lock = threading.Lock()
+        self._names = {}
+
+    def url_name(self, path):
+        from django.urls import Resolver404, resolve
+
+        path = urlsplit(path).path
+        name = self._names.get(path)
+        if name is None:
+            try:
+                name = resolve(path).url_name or path
+            except Resolver404:
+                name = path
+            self._names[path] = name
+        return name
+
+    def record(self, path, status, latency):
+        name = self.url_name(path)
+        with self.lock:
+            self.samples.append((name, status, latency))
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, duration):
+    """Returns overall and per-URL-name statistics for one concurrency level."""
+    def stats(rows):
+        latencies = sorted(r[2] for r in rows)
+        errors = sum(1 for r in rows if r[1] >= 500 or r[1] == 0)
+        return {
+            'requests': len(rows),
+            'errors': errors,
+            'rps': len(rows) / duration if duration else 0.0,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+        }
+
+    by_name = {}
+    for row in samples:
+        by_name.setdefault(row[0], []).append(row)
+    return {'overall': stats(samples), 'urls': {name: stats(rows) for name, rows in sorted(by_name.items())}}
+
+
+# ----------------------------------------------------------------------
+# HTTP Client
+# ----------------------------------------------------------------------
+
+class _NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Session:
+    """One simulated student: a cookie jar plus helpers that time every hop."""
+
+    def __init__(self, base_url, recorder, username):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.username = username
+        self.jar = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.jar), _NoRedirect)
+        self.note_ids = []
+
+    def csrf_token(self):
+        for cookie in self.jar:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, method, path, data=None, headers=None, follow=True):
+        """Performs one request (timing each redirect hop separately). Returns (status, body, final_path)."""
+        while True:
+            req = Request(self.base_url + path, data=data, method=method, headers=headers or {})
+            started = time.perf_counter()
+            location = None
+            try:
+                with self.opener.open(req, timeout=120) as response:
+                    status, body = response.status, response.read()
+            except HTTPError as e:
+                status, body = e.code, e.read()
+                location = e.headers.get('Location')
+            except (URLError, OSError):
+                status, body = 0, b''
+            self.recorder.record(path, status, time.perf_counter() - started)
+
+            if follow and location and status in (301, 302, 303):
+                path, method, data, headers = urlsplit(location).path, 'GET', None, {}
+                continue
+            return status, body.decode('utf-8', 'replace'), path
+
+    def post_form(self, path, fields, follow=True):
+        fields = dict(fields, csrfmiddlewaretoken=self.csrf_token())
+        return self.request(
+            'POST', path, urlencode(fields).encode(),
+            {'Content-Type': 'application/x-www-form-urlencoded', 'X-CSRFToken': self.csrf_token()},
+            follow=follow,
+        )
+
+    def post_multipart(self, path, fields, files):
+        boundary = uuid.uuid4().hex
+        body = []
+        for name, value in dict(fields, csrfmiddlewaretoken=self.csrf_token()).items():
+            body.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        for name, (filename, content) in files.items():
+            body.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f'Content-Type: application/pdf\r\n\r\n'.encode() + content + b'\r\n'
+            )
+        body.append(f'--{boundary}--\r\n'.encode())
+        return self.request('POST', path, b''.join(body), {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+
+# ----------------------------------------------------------------------
+# Actions (one per user journey step in the traffic mix)
+# ----------------------------------------------------------------------
+
+def action_login(session, rng):
+    if session.csrf_token():
+        session.post_form('/accounts/logout/', {}, follow=False)
+    session.request('GET', '/accounts/login/')
+    session.post_form('/accounts/login/', {'username': session.username, 'password': PASSWORD})
+
+
+def action_home(session, rng):
+    session.request('GET', '/')
+
+
+def action_quiz_list(session, rng):
+    session.request('GET', '/quizzes/')
+
+
+def action_explain(session, rng):
+    session.request('GET', '/explain/')
+    session.post_form('/explain/', {'topic_name': rng.choice(EXPLAIN_TOPICS)})
+
+
+def action_quiz(session, rng):
+    """Generate a quiz, take it and submit answers for grading."""
+    status, body, path = session.post_form('/quizzes/', {'topic_name': rng.choice(QUIZ_TOPICS)})
+    if not path.endswith('/take/'):
+        return
+    answers = {f'question_{qid}': rng.randrange(3) for qid in QUESTION_RE.findall(body)}
+    session.post_form(path.replace('/take/', '/grade/'), answers)
+
+
+def action_upload(session, rng):
+    pdfs = sorted(SAMPLE_PDF_DIR.glob('*.pdf'))
+    if not pdfs:
+        return
+    pdf = rng.choice(pdfs)
+    session.request('GET', '/summarize/')
+    status, body, path = session.post_multipart(
+        '/summarize/', {'title': pdf.stem.replace('_', ' ')}, {'pdf_file': (pdf.name, pdf.read_bytes())}
+    )
+    match = re.match(r'^/notes/(\d+)/$', path)
+    if match:
+        session.note_ids.append(int(match.group(1)))
+
+
+def action_note_detail(session, rng):
+    if session.note_ids:
+        session.request('GET', f'/notes/{rng.choice(session.note_ids)}/')
+
+
+def action_note_pdf(session, rng):
+    """Simulates a PDF viewer fetching one page-sized byte range."""
+    if session.note_ids:
+        start = rng.randrange(0, 16384)
+        session.request('GET', f'/notes/{rng.choice(session.note_ids)}/pdf/',
+                        headers={'Range': f'bytes={start}-{start + 65535}'})
+
+
+ACTIONS = {
+    'login': action_login,
+    'home': action_home,
+    'quiz_list': action_quiz_list,
+    'explain': action_explain,
+    'quiz': action_quiz,
+    'upload': action_upload,
+    'note_detail': action_note_detail,
+    'note_pdf': action_note_pdf,
+}
+
+
+def virtual_user(base_url, recorder, username, mix, rng, stop_at):
+    session = Session(base_url, recorder, username)
+    action_login(session, rng)
+    names, weights = zip(*mix.items())
+    while time.monotonic() < stop_at:
+        ACTIONS[rng.choices(names, weights)[0]](session, rng)
+
+
+def run_level(base_url, concurrency, duration, mix, seed):
+    recorder = Recorder()
+    stop_at = time.monotonic() + duration
+    threads = [
+        threading.Thread(
+            target=virtual_user,
+            args=(base_url, recorder, f'loadtest{i}', mix, random.Random(f'{seed}-{concurrency}-{i}'), stop_at),
+            daemon=True,
+        )
+        for i in range(concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(recorder.samples, time.monotonic() - started)
+
+
+# ----------------------------------------------------------------------
+# Environment (database, fake Gemini, app server)
+# ----------------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+def prepare_database(env, max_users):
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'], cwd=BASE_DIR, env=env, check=True)
+
+    import django
+    django.setup()
+    from django.contrib.auth.models import User
+
+    existing = set(User.objects.filter(username__startswith='loadtest').values_list('username', flat=True))
+    for i in range(max_users):
+        if f'loadtest{i}' not in existing:
+            User.objects.create_user(f'loadtest{i}', password=PASSWORD)
+
+
+def server_command(kind, port, workers, threads):
+    bind = f'127.0.0.1:{port}'
+    if kind == 'wsgi':
+        if importlib.util.find_spec('gunicorn'):
+            return [sys.executable, '-m', 'gunicorn', 'StudyAI_Project.wsgi:application',
+                    '-b', bind, '-w', str(workers), '--threads', str(threads), '--timeout', '300']
+        print("gunicorn not installed; falling back to the single-process runserver.")
+        return [sys.executable, 'manage.py', 'runserver', bind, '--noreload']
+    if importlib.util.find_spec('uvicorn'):
+        return [sys.executable, '-m', 'uvicorn', 'StudyAI_Project.asgi:application',
+                '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers), '--no-access-log']
+    if importlib.util.find_spec('daphne'):
+        return [sys.executable, '-m', 'daphne', '-b', '127.0.0.1', '-p', str(port), 'StudyAI_Project.asgi:application']
+    raise RuntimeError("ASGI run needs uvicorn or daphne installed.")
+
+
+def print_level(kind, concurrency, result):
+    overall = result['overall']
+    print(f"\n[{kind}] concurrency={concurrency}  {overall['rps']:.1f} req/s  "
+          f"p50={overall['p50_ms']:.0f}ms p95={overall['p95_ms']:.0f}ms p99={overall['p99_ms']:.0f}ms  "
+          f"errors={overall['errors']}/{overall['requests']}")
+    print(f"  {'url name':<22}{'reqs':>7}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, stats in result['urls'].items():
+        print(f"  {name:<22}{stats['requests']:>7}{stats['errors']:>6}{stats['rps']:>9.1f}"
+              f"{stats['p50_ms']:>9.0f}{stats['p95_ms']:>9.0f}{stats['p99_ms']:>9.0f}")
+
+
+def find_saturation(levels):
+    """Returns the last concurrency level that still raised throughput meaningfully."""
+    saturation = None
+    previous_rps = 0.0
+    for concurrency, result in levels:
+        rps = result['overall']['rps']
+        errors = result['overall']['errors'] / max(result['overall']['requests'], 1)
+        if previous_rps and (rps < previous_rps * (1 + SATURATION_MIN_GAIN) or errors > 0.01):
+            return saturation
+        saturation, previous_rps = concurrency, rps
+    return None  # still scaling at the highest level tested
+
+
+def run_server(kind, args, env, fake):
+    port = free_port()
+    log = open(BASE_DIR / 'loadtest' / f'server-{kind}.log', 'w')
+    proc = subprocess.Popen(server_command(kind, port, args.workers, args.threads),
+                            cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_for_port(port, proc)
+        base_url = f'http://127.0.0.1:{port}'
+        levels = []
+        for concurrency in args.concurrency:
+            calls_before = fake.config.calls
+            result = run_level(base_url, concurrency, args.duration, MIXES[args.mix], args.seed)
+            result['gemini_calls'] = fake.config.calls - calls_before
+            levels.append((concurrency, result))
+            print_level(kind, concurrency, result)
+            print(f"  fake Gemini calls: {result['gemini_calls']}")
+        saturation = find_saturation(levels)
+        print(f"\n[{kind}] saturation point: "
+              + (f"{saturation} concurrent users" if saturation else "not reached at the levels tested"))
+        return {'levels': [{'concurrency': c, **r} for c, r in levels], 'saturation': saturation}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StudyAI end-to-end load test.")
+    parser.add_argument('--server', choices=['wsgi', 'asgi', 'both'], default='wsgi')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument('--mix', choices=sorted(MIXES), default='default')
+    parser.add_argument('--concurrency', default='1,2,4,8,16',
+                        type=lambda v: [int(x) for x in v.split(',')])
+    parser.add_argument('--duration', type=float, default=20.0, help="seconds per concurrency level")
+    parser.add_argument('--latency', default='lognormal:800:0.5', help="fake Gemini latency distribution")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fake Gemini 503 rate")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', dest='json_path', help="write the full results to this file")
+    args = parser.parse_args()
+
+    fake = start_fake_gemini(FakeGeminiConfig(args.latency, args.error_rate, seed=args.seed))
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=SETTINGS_MODULE, GEMINI_API_KEY='loadtest-fake-key',
+               GEMINI_BASE_URL=fake.base_url, PYTHONPATH=str(BASE_DIR))
+    os.environ.update(env)
+    sys.path.insert(0, str(BASE_DIR))
+
+    print(f"Fake Gemini at {fake.base_url} (latency {args.latency}, error rate {args.error_rate})")
+    prepare_database(env, max(args.concurrency))
+
+    results = {'mix': args.mix, 'seed': args.seed, 'latency': args.latency, 'error_rate': args.error_rate}
+    for kind in (['wsgi', 'asgi'] if args.server == 'both' else [args.server]):
+        results[kind] = run_server(kind, args, env, fake)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as fh:
+            json.dump(results, fh, indent=2)
+    fake.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+# loadtest/settings.py
+# Self-contained settings for the load-test harness: the project's settings
+# with a throwaway SQLite database, so a run never touches real data.
+import os
+
+from StudyAI_Project.settings import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('LOADTEST_DB', os.path.join(BASE_DIR, 'loadtest', 'loadtest.sqlite3')),
+        'OPTIONS': {
+            # Serialise writers instead of failing with "database is locked" under load
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 30,
+        },
+    }
+}
+
+MEDIA_ROOT = os.environ.get('LOADTEST_MEDIA_ROOT', os.path.join(BASE_DIR, 'loadtest', 'media'))